@@ -3,7 +3,7 @@ from fastapi.responses import RedirectResponse
 from authlib.integrations.starlette_client import OAuth
 from starlette.config import Config
 from typing import Optional
-import os
+import os, secrets
 
 router = APIRouter()
 
@@ -27,6 +27,16 @@ def require_login(request: Request) -> dict:
         raise HTTPException(status_code=307, headers={"Location": "/login"})
     return user
 
+# Monitoramento (/status, /metrics): usuário logado ou quem mandar
+# "Authorization: Bearer <STATUS_TOKEN>" (scraper do Prometheus). Sem STATUS_TOKEN, só login.
+_TOKEN_INTERNO = os.getenv("STATUS_TOKEN", "")
+
+def require_interno(request: Request) -> dict:
+    cabecalho = request.headers.get("authorization", "").encode()
+    if _TOKEN_INTERNO and secrets.compare_digest(cabecalho, f"Bearer {_TOKEN_INTERNO}".encode()):
+        return {"name": "monitoramento"}
+    return require_login(request)
+
 @router.get("/login")
 async def login(request: Request):
     redirect_uri = os.getenv("AZURE_REDIRECT_URI")
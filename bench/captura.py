@@ -0,0 +1,88 @@
+"""
+Conferência da conversão de data_captura (texto gravado pelo bot): valores
+malformados viram NULL sem abortar a consulta e horário sem fuso é UTC, nos
+três caminhos que a leem – agregação crua do dashboard, rollups e exportação.
+
+    DATABASE_PUBLIC_URL=... python bench/captura.py
+
+Cria e apaga a tabela captura_check (e os rollups dela) – use só num banco local
+de benchmark. Sai com 1 se algum caminho divergir do esperado.
+"""
+import json, sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import psycopg2  # noqa: E402
+
+from utils import chamado, db_helpers, rollups  # noqa: E402
+from utils.chamados_sql import ConsultasChamados  # noqa: E402
+from bench.dados import _DDL  # noqa: E402
+
+chamado.get_real_names = lambda uids: {}
+TABELA = "captura_check"
+ABERTURA = datetime(2025, 3, 1, 10, 0, tzinfo=timezone.utc)
+
+# data_captura → (horas desde a abertura, ISO exportado); None = sem captura
+CASOS = {
+    "2025-03-01T12:00:00Z":      (2.0, "2025-03-01T09:00:00-03:00"),
+    "2025-03-01 09:00:00-03:00": (2.0, "2025-03-01T09:00:00-03:00"),
+    "2025-03-01T13:00:00":       (3.0, "2025-03-01T10:00:00-03:00"),   # sem fuso: UTC
+    "ontem à tarde":             (None, None),
+    "2025-02-31T10:00:00":       (None, None),
+    "":                          (None, None),
+    None:                        (None, None),
+}
+
+
+def main():
+    url = db_helpers._URL
+    conn = psycopg2.connect(url)
+    conn.autocommit = True
+    cur = conn.cursor()
+    cur.execute(_DDL.format(t=TABELA).replace("data_captura          timestamptz",
+                                              "data_captura          text"))
+    for valor in CASOS:
+        cur.execute(f"""INSERT INTO {TABELA} (status, responsavel, data_abertura, data_captura)
+                        VALUES ('Fechado', 'U00000001', %s, %s)""", [ABERTURA, valor])
+    db = ConsultasChamados(url, TABELA, "em análise", "fechado")
+    erros = []
+    try:
+        horas = [h for h, _ in CASOS.values() if h is not None]
+        esperado = round(sum(horas) / len(horas), 4)
+
+        db.colunas_derivadas()   # cria data_captura_ts se faltar
+        cur.execute("SELECT data_captura, data_captura_ts(data_captura) FROM " + TABELA)
+        for valor, ts in cur.fetchall():
+            h = CASOS[valor][0]
+            obtido = None if ts is None else (ts - ABERTURA).total_seconds() / 3600
+            if obtido != h:
+                erros.append(f"data_captura_ts({valor!r}) = {ts}")
+
+        rollups.rebuild(url, TABELA, "fechado")
+        rollups.renovar(url, TABELA, "fechado", esperar=True)
+        for caminho, linhas in (("agregação crua", db._agregados_crus()),
+                                ("rollup", rollups.consultar(url, TABELA, "fechado"))):
+            kpi = [float(r[9]) for r in linhas or () if r[0] == 31]   # GROUPING () = KPIs
+            if [round(h, 4) for h in kpi] != [esperado]:
+                erros.append(f"{caminho}: {kpi} h")
+
+        exportados = [c.captura_raw for c in db.carregar_chamados(projecao="export")]
+        if len(exportados) != len(CASOS):
+            erros.append(f"exportação: {len(exportados)} linha(s)")
+        for iso, valor in zip(reversed(exportados), CASOS):   # página em id DESC
+            if iso != CASOS[valor][1]:
+                erros.append(f"exportação {valor!r}: {iso!r}")
+    finally:
+        cur.execute(f"DROP TABLE IF EXISTS {TABELA}, {TABELA}_rollup_diario, "
+                    f"{TABELA}_rollup_estado CASCADE")
+        conn.close()
+
+    print(json.dumps({"casos": len(CASOS), "sla_captura_h": esperado, "erros": erros},
+                     indent=2, ensure_ascii=False))
+    return 1 if erros else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,79 @@
+"""
+Teste de carga simples: N requisições concorrentes contra uma URL do painel.
+
+    python bench/carga.py http://localhost:8080/painel -c 20 -n 400 --cookie "session=..."
+
+Imprime p50/p95/p99 e vazão. Rode antes/depois de uma mudança com os mesmos
+parâmetros para comparar.
+"""
+import argparse, asyncio, json, statistics, time
+
+import httpx
+
+
+def percentil(valores, p):
+    if not valores:
+        return 0.0
+    valores = sorted(valores)
+    k = max(0, min(len(valores) - 1, round(p / 100 * len(valores)) - 1))
+    return valores[k]
+
+
+async def _rodar(url, concorrencia, total, cookies, timeout):
+    latencias, erros = [], 0
+    fila = asyncio.Queue()
+    for _ in range(total):
+        fila.put_nowait(None)
+
+    async with httpx.AsyncClient(cookies=cookies, timeout=timeout,
+                                 follow_redirects=False) as client:
+        async def worker():
+            nonlocal erros
+            while not fila.empty():
+                fila.get_nowait()
+                t0 = time.perf_counter()
+                try:
+                    r = await client.get(url)
+                    if r.status_code >= 400:
+                        erros += 1
+                except httpx.HTTPError:
+                    erros += 1
+                latencias.append((time.perf_counter() - t0) * 1000)
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concorrencia)))
+        duracao = time.perf_counter() - t0
+
+    return {
+        "url": url,
+        "concorrencia": concorrencia,
+        "requisicoes": total,
+        "erros": erros,
+        "rps": round(total / duracao, 1),
+        "p50_ms": round(statistics.median(latencias), 1),
+        "p95_ms": round(percentil(latencias, 95), 1),
+        "p99_ms": round(percentil(latencias, 99), 1),
+        "max_ms": round(max(latencias), 1),
+    }
+
+
+def executar(url, concorrencia=10, total=200, cookies=None, timeout=60.0) -> dict:
+    return asyncio.run(_rodar(url, concorrencia, total, cookies or {}, timeout))
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("url")
+    ap.add_argument("-c", "--concorrencia", type=int, default=10)
+    ap.add_argument("-n", "--total", type=int, default=200)
+    ap.add_argument("--cookie", action="append", default=[],
+                    help="nome=valor (ex.: o cookie 'session' de um login válido)")
+    ap.add_argument("--timeout", type=float, default=60.0)
+    a = ap.parse_args()
+
+    cookies = dict(c.split("=", 1) for c in a.cookie)
+    print(json.dumps(executar(a.url, a.concorrencia, a.total, cookies, a.timeout), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Gerador de dados sintéticos para os benchmarks: recria ordens_servico e/ou
+ordens_servico_financeiro com N chamados determinísticos (mesma semente →
+mesmas linhas), aplica colunas/índices (utils.schema) e refaz os rollups.
+
+    DATABASE_PUBLIC_URL=... DATABASE_PUBLIC_URL_FINANCEIRO=... \\
+        python bench/dados.py --linhas 100000 [--seed 42] [--base comercial|financeiro]
+
+APAGA as tabelas da base escolhida – use só num banco local de benchmark.
+Os UIDs (U00000000…) batem com os usuários do bench/slack_stub.py; alguns
+ficam de fora de propósito, para exercitar o caminho "<não capturado>".
+"""
+import argparse, io, json, random, sys, time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import psycopg2  # noqa: E402
+
+from utils import rollups, schema  # noqa: E402
+
+BASES = {
+    "comercial": {
+        "tabela": "ordens_servico", "canal": "C0COMERCIAL",
+        "status": (("Aberto", 12), ("Em análise", 10), ("Fechado", 70), ("cancelado", 8)),
+        "tipos": ("Reserva", "Cancelamento", "Alteração", "Reembolso", "Cotação",
+                  "Emissão", "Remarcação", "Outros"),
+    },
+    "financeiro": {
+        "tabela": "ordens_servico_financeiro", "canal": "C08KMCDNEFR",
+        "status": (("Aberto", 12), ("Em atendimento", 10), ("Finalizado", 70), ("cancelado", 8)),
+        "tipos": ("Pagamento", "Estorno", "Nota fiscal", "Cobrança", "Conciliação", "Outros"),
+    },
+}
+_FECHADOS = {"Fechado", "Finalizado", "cancelado"}
+
+_DDL = """
+    DROP TABLE IF EXISTS {t}, {t}_rollup_diario, {t}_rollup_estado CASCADE;
+    CREATE TABLE {t} (
+        id                    serial PRIMARY KEY,
+        tipo_ticket           text,
+        status                text,
+        responsavel           text,
+        canal_id              text,
+        thread_ts             text,
+        data_abertura         timestamptz,
+        data_fechamento       timestamptz,
+        sla_status            text,
+        capturado_por         text,
+        solicitante           text,
+        log_edicoes           text,
+        historico_reaberturas text,
+        data_captura          timestamptz
+    );"""
+_COLUNAS = ("tipo_ticket", "status", "responsavel", "canal_id", "thread_ts", "data_abertura",
+            "data_fechamento", "sla_status", "capturado_por", "solicitante", "log_edicoes",
+            "historico_reaberturas", "data_captura")
+
+
+def _uid(i: int) -> str:
+    return f"U{i:08d}"
+
+
+def linhas(base: str, n: int, seed: int, dias: int = 730, fim: datetime = None):
+    """Gera as n linhas (tuplas na ordem de _COLUNAS), em ordem de abertura."""
+    cfg = BASES[base]
+    rnd = random.Random(f"{seed}:{base}")
+    fim = fim or datetime(2026, 1, 1, tzinfo=timezone.utc)
+    inicio = fim - timedelta(days=dias)
+    status, pesos = zip(*cfg["status"])
+    responsaveis = [_uid(i) for i in range(60)]
+    capturadores = [_uid(i) for i in range(40, 90)]
+    solicitantes = [_uid(i) for i in range(100, 500)] + [_uid(900 + i) for i in range(20)]
+    passo = dias * 86400 / max(n, 1)
+    for i in range(n):
+        abertura = inicio + timedelta(seconds=i * passo + rnd.random() * passo)
+        st = rnd.choices(status, pesos)[0]
+        capturado = st != "Aberto" or rnd.random() < 0.3
+        captura = abertura + timedelta(minutes=rnd.expovariate(1 / 40)) if capturado else None
+        fechamento = (abertura + timedelta(hours=rnd.expovariate(1 / 20))
+                      if st in _FECHADOS else None)
+        yield (
+            rnd.choice(cfg["tipos"]),
+            st,
+            rnd.choice(responsaveis) if rnd.random() < 0.95 else None,
+            cfg["canal"],
+            f"{abertura.timestamp():.6f}",
+            abertura,
+            fechamento,
+            "fora" if rnd.random() < 0.15 else "dentro do sla",
+            rnd.choice(capturadores) if capturado else None,
+            rnd.choice(solicitantes),
+            "tipo alterado de Reserva para Alteração" if rnd.random() < 0.08 else "",
+            "reaberto" if rnd.random() < 0.03 else None,
+            captura,
+        )
+
+
+def _copiar(cur, tabela: str, gerador, lote: int = 50_000) -> int:
+    def campo(v):
+        if v is None:
+            return r"\N"
+        if isinstance(v, datetime):
+            return v.isoformat()
+        return str(v).replace("\\", "\\\\").replace("\t", " ").replace("\n", " ")
+
+    total, buf = 0, io.StringIO()
+    for total, linha in enumerate(gerador, 1):
+        buf.write("\t".join(map(campo, linha)) + "\n")
+        if total % lote == 0:
+            buf.seek(0)
+            cur.copy_from(buf, tabela, columns=_COLUNAS)
+            buf = io.StringIO()
+    buf.seek(0)
+    cur.copy_from(buf, tabela, columns=_COLUNAS)
+    return total
+
+
+def gerar(url: str, base: str, n: int, seed: int = 42, dias: int = 730) -> dict:
+    """Recria a tabela da base com n linhas, índices e rollups. Retorna tempos e contagens."""
+    tabela = BASES[base]["tabela"]
+    t0 = time.monotonic()
+    conn = psycopg2.connect(url)
+    conn.set_client_encoding("UTF8")
+    try:
+        with conn, conn.cursor() as cur:
+            cur.execute(_DDL.format(t=tabela))
+            inseridas = _copiar(cur, tabela, linhas(base, n, seed, dias))
+    finally:
+        conn.close()
+    t_carga = time.monotonic() - t0
+    alteracoes = schema.aplicar(url, tabela)
+    t_schema = time.monotonic() - t0 - t_carga
+    rollup = rollups.rebuild(url, tabela, rollups._bases()[base][2])
+    return {"base": base, "tabela": tabela, "linhas": inseridas, "seed": seed,
+            "carga_s": round(t_carga, 1), "schema_s": round(t_schema, 1),
+            "rollup_linhas": rollup, "alteracoes": alteracoes,
+            "total_s": round(time.monotonic() - t0, 1)}
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--linhas", type=int, default=100_000)
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--dias", type=int, default=730, help="período coberto pelas aberturas")
+    ap.add_argument("--base", choices=["comercial", "financeiro", "ambas"], default="ambas")
+    a = ap.parse_args()
+
+    urls = {n: rollups._bases()[n][0] for n in BASES}
+    for base in (BASES if a.base == "ambas" else [a.base]):
+        # em "ambas", a financeira fica com 1/3 do volume da comercial
+        n = a.linhas if base == "comercial" or a.base != "ambas" else max(1, a.linhas // 3)
+        print(json.dumps(gerar(urls[base], base, n, a.seed, a.dias), ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Datas da exportação: conversão de fuso/formatação em Python (_fmt/_to_iso por
+linha) contra to_char no Postgres, lendo todos os campos de N chamados.
+
+    DATABASE_PUBLIC_URL=... python bench/datas_sql.py --linhas 100000
+
+Mede CPU do processo Python (process_time) e tempo de parede de cada caminho,
+e confere que os valores saem iguais. Os nomes do Slack são falsos (sem rede).
+"""
+import argparse, json, sys, time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils import chamado, db_helpers  # noqa: E402
+from utils.chamado import PROJECOES, Projecao  # noqa: E402
+
+chamado.get_real_names = lambda uids: {u: f"Pessoa {u}" for u in set(uids) if u}
+PROJECOES["export_python"] = Projecao("export_python", PROJECOES["export"].campos)
+
+
+def ler(projecao: str, linhas: int):
+    campos = PROJECOES[projecao].campos
+    cpu, t0 = time.process_time(), time.perf_counter()
+    res = [[c[k] for k in campos]
+           for c in db_helpers.carregar_chamados(limit=linhas, projecao=projecao)]
+    return res, {"cpu_s": round(time.process_time() - cpu, 3),
+                 "parede_s": round(time.perf_counter() - t0, 3)}
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--linhas", type=int, default=100_000)
+    ap.add_argument("--repeticoes", type=int, default=3)
+    a = ap.parse_args()
+
+    melhor = {}
+    for _ in range(a.repeticoes):
+        for projecao in ("export_python", "export"):
+            res, t = ler(projecao, a.linhas)
+            if projecao not in melhor or t["cpu_s"] < melhor[projecao]["cpu_s"]:
+                melhor[projecao] = t
+            if projecao == "export_python":
+                referencia = res
+            elif res != referencia:
+                print("valores diferentes entre os caminhos", file=sys.stderr)
+                return 1
+
+    py, sql = melhor["export_python"], melhor["export"]
+    print(json.dumps({
+        "linhas": len(referencia),
+        "python": py,
+        "postgres": sql,
+        "cpu_python_poupada_s": round(py["cpu_s"] - sql["cpu_s"], 3),
+        "cpu_ganho": round(py["cpu_s"] / sql["cpu_s"], 2) if sql["cpu_s"] else None,
+    }, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,62 @@
+"""
+Vazão por número de workers do uvicorn (WEB_CONCURRENCY), com o cache
+compartilhado entre eles começando vazio a cada rodada.
+
+    DATABASE_PUBLIC_URL=... python bench/escala.py [--workers 1,2,4] [-n 300] [-c 16]
+
+Por rodada e cenário: req/s, p95, transações no banco e chamadas ao Slack – com a cache
+compartilhada, mais workers não devem multiplicar as chamadas. A vazão só
+escala com workers se a máquina tiver núcleos para eles (veja "nucleos").
+"""
+import argparse, json, os, sys, tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+import slack_stub, suite  # noqa: E402
+
+CENARIOS = ("painel_filtros", "painel_paginas", "dashboards", "thread")
+
+
+def rodada(workers: int, a, urls: dict) -> dict:
+    stub, servidor, slack_url = slack_stub.iniciar(0, a.latencia_ms)
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {"WEB_CONCURRENCY": str(workers),
+               "CACHE_COMPARTILHADO": str(Path(tmp) / "cache.sqlite3")}
+        porta = suite._porta_livre()
+        proc = suite.subir_app(porta, slack_url, extra_env=env)
+        banco = suite.ContadorBanco(urls.values())
+        base_url, cookies = f"http://127.0.0.1:{porta}", suite._cookie_sessao()
+        todos = suite.cenarios(suite.amostras(urls))
+        res = {}
+        try:
+            for nome in CENARIOS:
+                pedidos, _ = todos[nome]
+                r = suite.rodar_cenario(nome, pedidos, a.requisicoes, base_url, a.concorrencia,
+                                        cookies, banco, stub, proc.pid)
+                res[nome] = {k: r[k] for k in ("rps", "p95_ms", "erros", "db_transacoes", "slack_chamadas",
+                                               "rss_pico_mb")}
+        finally:
+            banco.fechar()
+            proc.terminate()
+            proc.wait()
+            servidor.shutdown()
+    return res
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--workers", default="1,2,4")
+    ap.add_argument("-n", "--requisicoes", type=int, default=300)
+    ap.add_argument("-c", "--concorrencia", type=int, default=16)
+    ap.add_argument("--latencia-ms", type=float, default=50)
+    a = ap.parse_args()
+
+    urls = {"comercial": os.environ["DATABASE_PUBLIC_URL"],
+            "financeiro": os.environ["DATABASE_PUBLIC_URL_FINANCEIRO"]}
+    print(json.dumps({"nucleos": os.cpu_count(),
+                      "rodadas": {w: rodada(int(w), a, urls) for w in a.workers.split(",")}},
+                     indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Exportação XLSX: caminho antigo (pandas + ExcelWriter em BytesIO) contra o
+write-only do export.py, com linhas sintéticas no formato de _mapear.
+
+    pip install -r bench/requirements.txt   # pandas, só para o caminho antigo
+    python bench/export_xlsx.py --linhas 100000
+
+Mede tempo de parede e pico de memória Python (tracemalloc) de cada caminho.
+"""
+import argparse, io, json, os, random, sys, tempfile, time, tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from export import COLUNAS, escrever_xlsx  # noqa: E402
+
+
+def chamados_sinteticos(n: int, seed: int = 42) -> list:
+    rnd = random.Random(seed)
+    tipos = ["Reserva", "Cancelamento", "Alteração", "Reembolso", "Dúvida"]
+    status = ["aberto", "em análise", "fechado", "cancelado"]
+    pessoas = [f"Pessoa {i:03d}" for i in range(120)]
+    res = []
+    for i in range(n, 0, -1):
+        d, h = rnd.randint(1, 28), rnd.randint(0, 23)
+        res.append({
+            "id": i,
+            "tipo_ticket": rnd.choice(tipos),
+            "status": rnd.choice(status),
+            "responsavel_uid": f"U{rnd.randint(10**9, 10**10)}",
+            "responsavel": rnd.choice(pessoas),
+            "canal_id": "C08KMCDNEFR",
+            "thread_ts": f"{1700000000 + i}.{rnd.randint(0, 999999):06d}",
+            "abertura": f"{d:02d}/03/2025 {h:02d}:15",
+            "fechamento": f"{d:02d}/03/2025 {min(h + 2, 23):02d}:40",
+            "abertura_raw": f"2025-03-{d:02d}T{h:02d}:15:00-03:00",
+            "fechamento_raw": f"2025-03-{d:02d}T{min(h + 2, 23):02d}:40:00-03:00",
+            "captura_raw": f"2025-03-{d:02d}T{h:02d}:20:00-03:00",
+            "sla": rnd.choice(["dentro do sla", "fora", "-"]),
+            "capturado_uid": f"U{rnd.randint(10**9, 10**10)}",
+            "capturado_por": rnd.choice(pessoas),
+            "solicitante": rnd.choice(pessoas),
+            "mudou_tipo": rnd.random() < 0.1,
+        })
+    return res
+
+
+def caminho_pandas(dados):
+    import pandas as pd
+    df = pd.DataFrame(dados).rename(columns=dict(COLUNAS))
+    df["Mudou Tipo?"] = df["Mudou Tipo?"].map({True: "Sim", False: "Não"})
+    buf = io.BytesIO()
+    with pd.ExcelWriter(buf, engine="openpyxl") as writer:
+        df.to_excel(writer, index=False, sheet_name="Chamados")
+    return buf.getbuffer().nbytes
+
+
+def caminho_write_only(dados, lote=2000):
+    fd, caminho = tempfile.mkstemp(suffix=".xlsx")
+    os.close(fd)
+    try:
+        escrever_xlsx((dados[i:i + lote] for i in range(0, len(dados), lote)), caminho)
+        return os.path.getsize(caminho)
+    finally:
+        os.unlink(caminho)
+
+
+def medir(fn, dados) -> dict:
+    t0 = time.perf_counter()
+    tamanho = fn(dados)
+    tempo = time.perf_counter() - t0
+
+    tracemalloc.start()
+    fn(dados)
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"segundos": round(tempo, 2), "pico_mb": round(pico / 2**20, 1),
+            "arquivo_mb": round(tamanho / 2**20, 1)}
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--linhas", type=int, default=100_000)
+    a = ap.parse_args()
+
+    dados = chamados_sinteticos(a.linhas)
+    print(json.dumps({
+        "linhas": a.linhas,
+        "pandas": medir(caminho_pandas, dados),
+        "write_only": medir(caminho_write_only, dados),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+formatar_texto_slack: versão antiga (um str.replace por emoji + dois re.sub com
+get_real_name por menção) contra a passada única, em mensagens longas sintéticas.
+
+    python bench/formatador.py --mensagens 2000
+
+Sem rede: diretório e grupos são pré-carregados com nomes falsos. Confere
+também que as duas versões produzem exatamente o mesmo texto (saída 1 se não).
+"""
+import argparse, json, random, re, sys, time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils import slack_helpers as sh  # noqa: E402
+from utils.slack_helpers import (  # noqa: E402
+    EMOJI_MAP, formatar_texto_slack, get_real_name, get_indice_grupos,
+)
+
+USUARIOS = [f"U{i:08d}" for i in range(300)]
+GRUPOS = ["S08STJCNMHR"] + [f"S{i:08d}" for i in range(20)]
+PALAVRAS = ("reserva cliente voo hotel remarcação pedido valor taxa urgente "
+            "confirmado pendente aguardando retorno bilhete data check-in").split()
+
+
+def formatar_antigo(texto: str, canal_id: str = None) -> str:
+    """Cópia do formatador anterior, para comparação."""
+    if not texto:
+        return ""
+    for e, uni in EMOJI_MAP.items():
+        texto = texto.replace(e, uni)
+    texto = re.sub(r"<@([A-Z0-9]+)>", lambda m: get_real_name(m.group(1), canal_id), texto)
+    grupos = get_indice_grupos(canal_id)
+    return re.sub(r"<!subteam\^([A-Z0-9]+)>", lambda m: grupos.nome(m.group(1)), texto)
+
+
+def preparar_slack():
+    """Diretório e grupos em memória: nenhuma chamada sai para o Slack."""
+    for d in (sh._diretorio_comercial, sh._diretorio_financeiro):
+        for i, uid in enumerate(USUARIOS):
+            d.cache.set(uid, f"Pessoa {i}" if i % 50 else None)   # alguns desconhecidos
+        d._carregado_em = time.monotonic()
+    for g in (sh._grupos_comercial, sh._grupos_financeiro):
+        g._grupos = {sid: f"grupo-{i}" for i, sid in enumerate(GRUPOS[1:])}
+        g._thread = object()
+
+
+def mensagens_sinteticas(n: int, seed: int = 7) -> list:
+    rnd = random.Random(seed)
+    emojis = list(EMOJI_MAP)
+    res = []
+    for _ in range(n):
+        partes = []
+        for _ in range(rnd.randint(80, 400)):          # ~0,5–2,5 KB
+            x = rnd.random()
+            if x < 0.03:
+                partes.append(f"<@{rnd.choice(USUARIOS)}>")
+            elif x < 0.04:
+                partes.append(f"<!subteam^{rnd.choice(GRUPOS)}>")
+            elif x < 0.06:
+                partes.append(rnd.choice(emojis))
+            else:
+                partes.append(rnd.choice(PALAVRAS))
+        res.append(" ".join(partes) + ("\n" if rnd.random() < 0.3 else ""))
+    return res
+
+
+def medir(fns: dict, msgs, repeticoes: int) -> dict:
+    """Melhor tempo de cada versão, alternando as versões a cada repetição."""
+    melhor = dict.fromkeys(fns, float("inf"))
+    for _ in range(repeticoes):
+        for nome, fn in fns.items():
+            t0 = time.perf_counter()
+            for m in msgs:
+                fn(m)
+            melhor[nome] = min(melhor[nome], time.perf_counter() - t0)
+    return melhor
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--mensagens", type=int, default=2000)
+    ap.add_argument("--repeticoes", type=int, default=9)
+    a = ap.parse_args()
+
+    preparar_slack()
+    msgs = mensagens_sinteticas(a.mensagens)
+    diferentes = [i for i, m in enumerate(msgs) if formatar_antigo(m) != formatar_texto_slack(m)]
+
+    t = medir({"antigo": formatar_antigo, "novo": formatar_texto_slack}, msgs, a.repeticoes)
+    antigo, novo = t["antigo"], t["novo"]
+    print(json.dumps({
+        "mensagens": a.mensagens,
+        "kb_medio": round(sum(map(len, msgs)) / len(msgs) / 1024, 2),
+        "antigo_us_por_msg": round(antigo / len(msgs) * 1e6, 1),
+        "novo_us_por_msg": round(novo / len(msgs) * 1e6, 1),
+        "ganho": round(antigo / novo, 2),
+        "saidas_diferentes": len(diferentes),
+    }, indent=2))
+    return 1 if diferentes else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,61 @@
+"""
+Partida a frio: quanto o processo leva para aceitar requisições, para ficar
+pronto (/pronto) e quanto demora a primeira requisição de cada página.
+
+    DATABASE_PUBLIC_URL=... python bench/partida.py [--repeticoes 5] [--raiz ../outra-copia]
+
+Sobe um uvicorn novo a cada repetição (stub do Slack com latência, como no
+suite.py) e imprime a mediana de cada medida. --raiz aponta para outra cópia
+do repositório (ex.: um git worktree do commit anterior) para comparar.
+"""
+import argparse, json, statistics, sys, time
+from pathlib import Path
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+import slack_stub, suite  # noqa: E402
+
+PAGINAS = ["/painel", "/painel-financeiro", "/api/dashboards"]
+
+
+def uma_partida(raiz: Path, slack_url: str) -> dict:
+    porta = suite._porta_livre()
+    t0 = time.perf_counter()
+    proc = suite.subir_app(porta, slack_url, raiz=raiz)      # volta quando /status responde
+    res = {"aceita_s": time.perf_counter() - t0}
+    base = f"http://127.0.0.1:{porta}"
+    try:
+        with httpx.Client(base_url=base, cookies=suite._cookie_sessao(), timeout=120) as c:
+            while True:
+                r = c.get("/pronto")
+                if r.status_code != 503:          # 404: versão sem /pronto
+                    break
+                time.sleep(0.05)
+            res["pronto_s"] = time.perf_counter() - t0
+            for pagina in PAGINAS:
+                t = time.perf_counter()
+                c.get(pagina).raise_for_status()
+                res[f"primeira {pagina} ms"] = (time.perf_counter() - t) * 1000
+    finally:
+        proc.terminate()
+        proc.wait()
+    return res
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--repeticoes", type=int, default=5)
+    ap.add_argument("--raiz", type=Path, default=suite.RAIZ)
+    ap.add_argument("--latencia-ms", type=float, default=50)
+    a = ap.parse_args()
+
+    _, servidor, slack_url = slack_stub.iniciar(0, a.latencia_ms)
+    rodadas = [uma_partida(a.raiz.resolve(), slack_url) for _ in range(a.repeticoes)]
+    servidor.shutdown()
+    print(json.dumps({k: round(statistics.median(r[k] for r in rodadas), 2) for k in rodadas[0]},
+                     indent=2))
+
+
+if __name__ == "__main__":
+    main()
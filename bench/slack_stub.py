@@ -0,0 +1,175 @@
+"""
+Stub local da Web API do Slack para os benchmarks: users.list, users.info,
+usergroups.list e conversations.replies com dados sintéticos determinísticos.
+
+    python bench/slack_stub.py --porta 8990 --latencia-ms 80 --limite-rps 50
+
+Aponte o app para ele com SLACK_API_URL=http://127.0.0.1:8990/api/.
+Latência fixa por chamada e limite por método (token bucket, 429 + Retry-After
+como o Slack). GET /__stats devolve as chamadas por método; POST /__reset zera.
+"""
+import argparse, hashlib, json, threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlparse
+
+N_USUARIOS = 500          # U00000000 … U00000499 existem; o resto é "user_not_found"
+GRUPOS = [("S08STJCNMHR", "equipe-reservas")] + [(f"S{i:08d}", f"grupo-{i}") for i in range(1, 15)]
+PALAVRAS = ("reserva cliente voo hotel remarcação pedido valor taxa urgente confirmado "
+            "pendente aguardando retorno bilhete check-in :white_check_mark: :warning:").split()
+
+
+def uid(i: int) -> str:
+    return f"U{i:08d}"
+
+
+def _usuario(i: int) -> dict:
+    return {"id": uid(i), "name": f"pessoa.{i}", "real_name": f"Pessoa {i:03d}",
+            "profile": {"real_name_normalized": f"Pessoa {i:03d}"}}
+
+
+def _mensagens(canal: str, ts: str) -> list:
+    """Thread determinística: 1–300 mensagens, com menções a usuários e grupos."""
+    h = int(hashlib.sha1(f"{canal}:{ts}".encode()).hexdigest(), 16)
+    n = 1 + h % 300 if h % 10 == 0 else 1 + h % 25      # algumas threads longas
+    base = float(ts) if ts.replace(".", "", 1).isdigit() else 1.7e9
+    res = []
+    for i in range(n):
+        k = (h >> (i % 64)) + i
+        palavras = [PALAVRAS[(k + j) % len(PALAVRAS)] for j in range(20 + k % 60)]
+        palavras.insert(k % len(palavras), f"<@{uid(k % N_USUARIOS)}>")
+        if k % 7 == 0:
+            palavras.append(f"<!subteam^{GRUPOS[k % len(GRUPOS)][0]}>")
+        res.append({"type": "message", "user": uid((h + i) % N_USUARIOS),
+                    "text": " ".join(palavras), "ts": f"{base + i * 60:.6f}"})
+    return res
+
+
+def _pagina(itens: list, params: dict, chave: str, limite_padrao: int) -> dict:
+    inicio = int(params.get("cursor") or 0)
+    limite = int(params.get("limit") or limite_padrao) or limite_padrao
+    fim = inicio + limite
+    return {"ok": True, chave: itens[inicio:fim],
+            "has_more": fim < len(itens),
+            "response_metadata": {"next_cursor": str(fim) if fim < len(itens) else ""}}
+
+
+class Stub:
+    def __init__(self, latencia_ms: float = 0, limite_rps: float = 0):
+        self.latencia = latencia_ms / 1000
+        self.limite_rps = limite_rps
+        self._lock = threading.Lock()
+        self._baldes = {}                     # método → [fichas, último]
+        self.chamadas, self.limitadas = {}, 0
+        self.usuarios = [_usuario(i) for i in range(N_USUARIOS)]
+
+    def _permitido(self, metodo: str) -> bool:
+        if not self.limite_rps:
+            return True
+        agora = time.monotonic()
+        with self._lock:
+            fichas, ultimo = self._baldes.get(metodo, (self.limite_rps, agora))
+            fichas = min(self.limite_rps, fichas + (agora - ultimo) * self.limite_rps)
+            ok = fichas >= 1
+            self._baldes[metodo] = (fichas - 1 if ok else fichas, agora)
+            if not ok:
+                self.limitadas += 1
+            return ok
+
+    def atender(self, metodo: str, params: dict):
+        with self._lock:
+            self.chamadas[metodo] = self.chamadas.get(metodo, 0) + 1
+        if self.latencia:
+            time.sleep(self.latencia)
+        if not self._permitido(metodo):
+            return 429, {"ok": False, "error": "ratelimited"}
+
+        if metodo == "users.list":
+            return 200, _pagina(self.usuarios, params, "members", 200)
+        if metodo == "users.info":
+            u = params.get("user", "")
+            i = int(u[1:]) if u[1:].isdigit() else -1
+            if 0 <= i < N_USUARIOS and u == uid(i):
+                return 200, {"ok": True, "user": self.usuarios[i]}
+            return 200, {"ok": False, "error": "user_not_found"}
+        if metodo == "usergroups.list":
+            return 200, {"ok": True, "usergroups": [{"id": g, "name": n} for g, n in GRUPOS]}
+        if metodo == "conversations.replies":
+            msgs = _mensagens(params.get("channel", ""), params.get("ts", "0"))
+            return 200, _pagina(msgs, params, "messages", 200)
+        return 200, {"ok": False, "error": "unknown_method"}
+
+    def estatisticas(self) -> dict:
+        with self._lock:
+            return {"chamadas": dict(self.chamadas), "limitadas": self.limitadas}
+
+    def zerar(self):
+        with self._lock:
+            self.chamadas, self.limitadas = {}, 0
+
+
+def _handler(stub: Stub):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _responder(self, status, corpo, extra=None):
+            dados = json.dumps(corpo).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(dados)))
+            for k, v in (extra or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(dados)
+
+        def _tratar(self, corpo: bytes = b""):
+            url = urlparse(self.path)
+            if url.path == "/__stats":
+                return self._responder(200, stub.estatisticas())
+            if url.path == "/__reset":
+                stub.zerar()
+                return self._responder(200, {"ok": True})
+            params = dict(parse_qsl(url.query))
+            if corpo:
+                tipo = self.headers.get("Content-Type", "")
+                params.update(json.loads(corpo) if "json" in tipo
+                              else dict(parse_qsl(corpo.decode())))
+            status, resp = stub.atender(url.path.rsplit("/", 1)[-1], params)
+            self._responder(status, resp, {"Retry-After": "1"} if status == 429 else None)
+
+        def do_GET(self):
+            self._tratar()
+
+        def do_POST(self):
+            self._tratar(self.rfile.read(int(self.headers.get("Content-Length") or 0)))
+
+        def log_message(self, *args):  # silencioso
+            pass
+
+    return Handler
+
+
+def iniciar(porta: int = 0, latencia_ms: float = 0, limite_rps: float = 0):
+    """Sobe o stub numa thread; retorna (stub, servidor, url_base_da_api)."""
+    stub = Stub(latencia_ms, limite_rps)
+    servidor = ThreadingHTTPServer(("127.0.0.1", porta), _handler(stub))
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, daemon=True, name="slack-stub").start()
+    return stub, servidor, f"http://127.0.0.1:{servidor.server_address[1]}/api/"
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--porta", type=int, default=8990)
+    ap.add_argument("--latencia-ms", type=float, default=0)
+    ap.add_argument("--limite-rps", type=float, default=0, help="por método; 0 = sem limite")
+    a = ap.parse_args()
+    _, servidor, url = iniciar(a.porta, a.latencia_ms, a.limite_rps)
+    print(f"SLACK_API_URL={url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        servidor.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,353 @@
+"""
+Suíte de benchmark offline: sobe o app (uvicorn) contra um Postgres local e o
+stub do Slack, roda os cenários e grava os resultados num JSON.
+
+    DATABASE_PUBLIC_URL=... DATABASE_PUBLIC_URL_FINANCEIRO=... \\
+        python bench/suite.py [--linhas 100000] [--latencia-ms 80] [--limite-rps 50] \\
+                              [--cenarios painel,thread] [--saida r.json] [--comparar antes.json]
+
+--linhas regenera os dados antes (bench/dados.py: APAGA as tabelas). Sem ele,
+usa o que já está no banco. Por cenário: latência p50/p95/p99/máx, vazão,
+consultas ao banco (pg_stat_statements se instalado; senão transações, via
+pg_stat_database), chamadas ao Slack por método (contadas pelo stub) e RSS de
+pico do servidor (VmHWM, somado entre os processos). Os cenários rodam em
+sequência e o pico de RSS é cumulativo.
+"""
+import argparse, asyncio, base64, json, os, signal, socket, statistics, subprocess, sys, time
+from datetime import timedelta
+from itertools import cycle, islice
+from pathlib import Path
+from urllib.parse import urlencode
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+
+import httpx  # noqa: E402
+import psycopg2  # noqa: E402
+from itsdangerous import TimestampSigner  # noqa: E402
+
+sys.path.insert(0, str(RAIZ / "bench"))
+import dados, slack_stub  # noqa: E402
+from carga import percentil  # noqa: E402
+
+_SEGREDO = "bench-suite"
+_TABELAS = {"comercial": "ordens_servico", "financeiro": "ordens_servico_financeiro"}
+
+
+# ── Ambiente ────────────────────────────────────────────────────
+def _porta_livre() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _cookie_sessao() -> dict:
+    """Cookie 'session' assinado como o SessionMiddleware faz, sem passar pelo login."""
+    dados_sessao = base64.b64encode(json.dumps(
+        {"user": {"email": "bench@local", "name": "Benchmark"}}).encode())
+    return {"session": TimestampSigner(_SEGREDO).sign(dados_sessao).decode()}
+
+
+def subir_app(porta: int, slack_url: str, extra_env: dict = None,
+              raiz: Path = RAIZ) -> subprocess.Popen:
+    env = dict(os.environ, SLACK_API_URL=slack_url, SESSION_SECRET_KEY=_SEGREDO,
+               SLACK_BOT_TOKEN="xoxb-bench", SLACK_BOT_TOKEN_FINANCEIRO="xoxb-bench-fin",
+               **(extra_env or {}))
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1",
+         "--port", str(porta), "--log-level", "warning"],
+        cwd=raiz, env=env)
+    limite = time.monotonic() + 60
+    while time.monotonic() < limite:
+        if proc.poll() is not None:
+            raise RuntimeError(f"uvicorn saiu com código {proc.returncode}")
+        try:
+            if httpx.get(f"http://127.0.0.1:{porta}/status", cookies=_cookie_sessao(),
+                         timeout=2).status_code == 200:
+                return proc
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError("uvicorn não respondeu em 60s")
+
+
+def _processos(pid: int) -> list:
+    """pid e todos os descendentes (workers do uvicorn, se houver)."""
+    filhos = {}
+    for stat in Path("/proc").glob("[0-9]*/stat"):
+        try:
+            campos = stat.read_text().rsplit(")", 1)[1].split()
+            filhos.setdefault(int(campos[1]), []).append(int(stat.parent.name))
+        except (OSError, ValueError, IndexError):
+            pass
+    res, pilha = [], [pid]
+    while pilha:
+        p = pilha.pop()
+        res.append(p)
+        pilha.extend(filhos.get(p, []))
+    return res
+
+
+def memoria(pid: int) -> dict:
+    """VmHWM (pico) e VmRSS (atual) em MB, somados na árvore de processos. Só Linux."""
+    total = {"VmHWM": 0, "VmRSS": 0}
+    for p in _processos(pid):
+        try:
+            for linha in Path(f"/proc/{p}/status").read_text().splitlines():
+                chave = linha.split(":", 1)[0]
+                if chave in total:
+                    total[chave] += int(linha.split()[1])
+        except OSError:
+            pass
+    return {"rss_pico_mb": round(total["VmHWM"] / 1024, 1),
+            "rss_atual_mb": round(total["VmRSS"] / 1024, 1)}
+
+
+class ContadorBanco:
+    """Consultas (pg_stat_statements) ou transações (pg_stat_database) dos bancos do app."""
+
+    def __init__(self, urls):
+        self.conns = []
+        for url in dict.fromkeys(urls):       # as duas bases podem ser o mesmo banco
+            conn = psycopg2.connect(url)
+            conn.autocommit = True            # cada leitura vê as estatísticas do momento
+            self.conns.append(conn)
+        with self.conns[0].cursor() as cur:
+            cur.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_stat_statements'")
+            self.fonte = "pg_stat_statements" if cur.fetchone() else "transacoes"
+
+    def ler(self) -> int:
+        time.sleep(1.2)   # o backend só publica os contadores ao ficar ocioso (~1s)
+        total = 0
+        for conn in self.conns:
+            with conn.cursor() as cur:
+                if self.fonte == "pg_stat_statements":
+                    cur.execute("""SELECT COALESCE(SUM(calls), 0) FROM pg_stat_statements
+                                   WHERE dbid = (SELECT oid FROM pg_database
+                                                 WHERE datname = current_database())""")
+                else:
+                    cur.execute("""SELECT xact_commit + xact_rollback FROM pg_stat_database
+                                   WHERE datname = current_database()""")
+                total += int(cur.fetchone()[0])
+        return total
+
+    def delta(self, antes: int) -> int:
+        return self.ler() - antes - len(self.conns)   # desconta a própria leitura de "antes"
+
+    def fechar(self):
+        for conn in self.conns:
+            conn.close()
+
+
+# ── Cenários ────────────────────────────────────────────────────
+def amostras(urls: dict) -> dict:
+    """Valores reais do banco para montar filtros, páginas e threads."""
+    res = {}
+    for base, url in urls.items():
+        tabela = _TABELAS[base]
+        with psycopg2.connect(url) as conn, conn.cursor() as cur:
+            cur.execute(f"""SELECT responsavel FROM {tabela} WHERE responsavel IS NOT NULL
+                            GROUP BY 1 ORDER BY COUNT(*) DESC LIMIT 5""")
+            resp = [r[0] for r in cur.fetchall()]
+            cur.execute(f"SELECT DISTINCT tipo_ticket FROM {tabela} WHERE tipo_ticket IS NOT NULL")
+            tipos = [r[0] for r in cur.fetchall()]
+            cur.execute(f"SELECT MAX(id), MAX(data_abertura) FROM {tabela}")
+            max_id, fim = cur.fetchone()
+            cur.execute(f"""SELECT canal_id, thread_ts FROM {tabela}
+                            WHERE canal_id IS NOT NULL AND thread_ts IS NOT NULL
+                            ORDER BY id DESC LIMIT 40""")
+            threads = cur.fetchall()
+        res[base] = {"resp": resp or ["x"], "tipos": tipos or ["x"], "max_id": max_id or 1,
+                     "fim": fim.date() if fim else None, "threads": threads}
+    return res
+
+
+def _periodo(a: dict, dias: int) -> dict:
+    if not a["fim"]:
+        return {}
+    return {"data_ini": (a["fim"] - timedelta(days=dias)).isoformat(),
+            "data_fim": a["fim"].isoformat()}
+
+
+def _filtros_painel(a: dict) -> list:
+    return [
+        {"status": "Finalizado"},
+        {"responsavel": a["resp"][0]},
+        {"responsavel": a["resp"][-1], "status": "Aberto"},
+        {"tipo": a["tipos"][0], "sla": "fora"},
+        {"mudou_tipo": "sim"},
+        {"capturado": a["resp"][0], "mudou_tipo": "nao"},
+        _periodo(a, 30),
+        dict(_periodo(a, 90), status="Finalizado", tipo=a["tipos"][-1]),
+    ]
+
+
+def _get(rota: str, params: dict = None):
+    return ("GET", f"{rota}?{urlencode(params)}" if params else rota, None)
+
+
+def cenarios(am: dict) -> dict:
+    """nome → (pedidos que se repetem em ciclo, requisições padrão)."""
+    com, fin = am["comercial"], am["financeiro"]
+    passo = max(1, com["max_id"] // 50)
+    return {
+        "painel":            ([_get("/painel")], 200),
+        "painel_filtros":    ([_get("/painel", f) for f in _filtros_painel(com)], 200),
+        "painel_paginas":    ([_get("/painel", {"apos": com["max_id"] - i * passo})
+                               for i in range(1, 50)], 200),
+        "painel_financeiro": ([_get("/painel-financeiro", f)
+                               for f in [{}] + _filtros_painel(fin)], 200),
+        "painel_busca":      ([_get(rota, {"q": q}) for rota in ("/painel", "/painel-financeiro")
+                               for q in ("reaberto", "alteração reserva", "Pessoa 123",
+                                         '"tipo alterado" -reaberto', "inexistente")], 200),
+        "painel_geral":      ([_get("/painel-geral", f) for f in [{}] + _filtros_painel(com)], 200),
+        "dashboards":        ([_get("/dashboards")] +
+                              [_get("/api/dashboards", dict(_periodo(a, d), base=b))
+                               for b, a in (("comercial", com), ("financeiro", fin))
+                               for d in (30, 90, 365)], 100),
+        "thread":            ([("POST", "/thread", {"canal_id": c, "thread_ts": t})
+                               for c, t in com["threads"] + fin["threads"]], 100),
+        "export_csv":        ([_get("/exportar", dict(_periodo(com, 90), tipo="csv")),
+                               _get("/exportar-financeiro", dict(_periodo(fin, 90), tipo="csv"))], 6),
+        "export_xlsx":       ([_get("/exportar", dict(_periodo(com, 90), tipo="xlsx")),
+                               _get("/exportar-financeiro", dict(_periodo(fin, 90), tipo="xlsx"))], 6),
+    }
+
+
+async def _carga(base_url: str, pedidos: list, concorrencia: int, cookies: dict) -> dict:
+    latencias, erros, bytes_ = [], 0, 0
+    fila = asyncio.Queue()
+    for p in pedidos:
+        fila.put_nowait(p)
+
+    async with httpx.AsyncClient(base_url=base_url, cookies=cookies, timeout=300,
+                                 follow_redirects=False) as client:
+        async def worker():
+            nonlocal erros, bytes_
+            while not fila.empty():
+                metodo, rota, corpo = fila.get_nowait()
+                t0 = time.perf_counter()
+                try:
+                    r = await client.request(metodo, rota, data=corpo)
+                    bytes_ += len(r.content)
+                    if r.status_code >= 400:
+                        erros += 1
+                except httpx.HTTPError:
+                    erros += 1
+                latencias.append((time.perf_counter() - t0) * 1000)
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concorrencia)))
+        duracao = time.perf_counter() - t0
+
+    return {
+        "requisicoes": len(pedidos),
+        "concorrencia": concorrencia,
+        "erros": erros,
+        "rps": round(len(pedidos) / duracao, 1),
+        "p50_ms": round(statistics.median(latencias), 1),
+        "p95_ms": round(percentil(latencias, 95), 1),
+        "p99_ms": round(percentil(latencias, 99), 1),
+        "max_ms": round(max(latencias), 1),
+        "kb_medio": round(bytes_ / len(pedidos) / 1024, 1),
+    }
+
+
+def rodar_cenario(nome, pedidos, n, base_url, concorrencia, cookies, banco, stub, pid) -> dict:
+    lista = list(islice(cycle(pedidos), n))
+    stub.zerar()
+    antes = banco.ler()
+    res = asyncio.run(_carga(base_url, lista, min(concorrencia, n), cookies))
+    res["db_" + banco.fonte] = banco.delta(antes)
+    slack = stub.estatisticas()
+    res["slack_chamadas"] = slack["chamadas"]
+    res["slack_limitadas"] = slack["limitadas"]
+    res.update(memoria(pid))
+    return res
+
+
+# ── Comparação ──────────────────────────────────────────────────
+def comparar(anterior: dict, atual: dict):
+    campos = ("p50_ms", "p95_ms", "rps")
+    print(f"{'cenário':<18}" + "".join(f"{c:>22}" for c in campos))
+    for nome, r in atual["cenarios"].items():
+        a = anterior.get("cenarios", {}).get(nome)
+        if not a:
+            continue
+        linha = f"{nome:<18}"
+        for c in campos:
+            delta = (r[c] - a[c]) / a[c] * 100 if a[c] else 0.0
+            linha += f"{a[c]:>9} → {r[c]:<7}{delta:+5.0f}%"
+        print(linha)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--linhas", type=int, help="regenera os dados com N chamados (APAGA as tabelas)")
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--cenarios", help="lista separada por vírgula (padrão: todos)")
+    ap.add_argument("-n", "--requisicoes", type=int, help="por cenário (padrão: o do cenário)")
+    ap.add_argument("-c", "--concorrencia", type=int, default=10)
+    ap.add_argument("--aquecimento", type=int, default=2, help="requisições não medidas por cenário")
+    ap.add_argument("--latencia-ms", type=float, default=50, help="latência do stub do Slack")
+    ap.add_argument("--limite-rps", type=float, default=0, help="limite por método no stub; 0 = sem")
+    ap.add_argument("--saida", default=None, help="arquivo JSON (padrão: bench/resultados/<data>.json)")
+    ap.add_argument("--comparar", help="JSON de uma rodada anterior")
+    a = ap.parse_args()
+
+    urls = {"comercial": os.environ["DATABASE_PUBLIC_URL"],
+            "financeiro": os.environ["DATABASE_PUBLIC_URL_FINANCEIRO"]}
+    geracao = None
+    if a.linhas:
+        geracao = [dados.gerar(urls["comercial"], "comercial", a.linhas, a.seed),
+                   dados.gerar(urls["financeiro"], "financeiro", max(1, a.linhas // 3), a.seed)]
+
+    stub, servidor_slack, slack_url = slack_stub.iniciar(0, a.latencia_ms, a.limite_rps)
+    porta = _porta_livre()
+    t0 = time.monotonic()
+    proc = subir_app(porta, slack_url)
+    partida_s = round(time.monotonic() - t0, 2)
+    banco = ContadorBanco(urls.values())
+    base_url, cookies = f"http://127.0.0.1:{porta}", _cookie_sessao()
+
+    todos = cenarios(amostras(urls))
+    escolhidos = a.cenarios.split(",") if a.cenarios else list(todos)
+    resultados = {}
+    try:
+        for nome in escolhidos:
+            pedidos, n = todos[nome]
+            if a.aquecimento:
+                asyncio.run(_carga(base_url, pedidos[:a.aquecimento], 1, cookies))
+            resultados[nome] = rodar_cenario(nome, pedidos, a.requisicoes or n, base_url,
+                                             a.concorrencia, cookies, banco, stub, proc.pid)
+            print(nome, json.dumps(resultados[nome], ensure_ascii=False), file=sys.stderr)
+    finally:
+        banco.fechar()
+        proc.send_signal(signal.SIGINT)
+        try:
+            proc.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+        servidor_slack.shutdown()
+
+    saida = {
+        "quando": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=RAIZ,
+                                 capture_output=True, text=True).stdout.strip() or None,
+        "parametros": {k: v for k, v in vars(a).items() if k not in ("saida", "comparar")},
+        "geracao": geracao,
+        "partida_s": partida_s,
+        "cenarios": resultados,
+    }
+    caminho = Path(a.saida or RAIZ / "bench" / "resultados" / f"{time.strftime('%Y%m%d-%H%M%S')}.json")
+    caminho.parent.mkdir(parents=True, exist_ok=True)
+    caminho.write_text(json.dumps(saida, indent=2, ensure_ascii=False))
+    print(f"resultados em {caminho}")
+    if a.comparar:
+        comparar(json.loads(Path(a.comparar).read_text()), saida)
+    return 1 if any(r["erros"] for r in resultados.values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,14 +1,20 @@
 # export.py – /exportar?tipo=csv|xlsx&...filtros
-import io
-import pandas as pd
+import io, os, csv, time, tempfile
+from itertools import chain
 from typing import Optional
-from fastapi import APIRouter, Request, Query
-from fastapi.responses import StreamingResponse, HTMLResponse
+from fastapi import APIRouter, Request, Query, Depends
+from fastapi.responses import StreamingResponse, HTMLResponse, FileResponse, JSONResponse
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
 
-from utils.db_helpers import carregar_chamados
-from utils.db_financeiro import carregar_chamados as carregar_chamados_financeiro
+from auth import require_login
+from utils import db_helpers, db_financeiro, export_jobs
+from utils.db_helpers import iterar_chamados
+from utils.db_financeiro import iterar_chamados as iterar_chamados_financeiro
+from utils.db_async import rodar
+from utils.filtros import filtros_painel
 
-export_router = APIRouter()
+export_router = APIRouter(dependencies=[Depends(require_login)])   # dados completos: só logado
 
 # ───────────── Exportar Comercial ───────────────
 @export_router.get("/exportar", response_class=HTMLResponse)
@@ -22,13 +28,11 @@ async def exportar(
     capturado:    Optional[str] = None,
     mudou_tipo:   Optional[str] = None,
     sla:          Optional[str] = None,
+    q:            Optional[str] = None,
 ):
-    dados = carregar_chamados(
-        status=status, resp=responsavel,
-        d_ini=data_ini, d_fim=data_fim,
-        capturado=capturado, mudou_tipo=mudou_tipo, sla=sla
-    )
-    return gerar_export(dados, tipo, nome_arquivo="chamados_comercial")
+    lotes = iterar_chamados(**filtros_painel(
+        "comercial", status, responsavel, capturado, mudou_tipo, data_ini, data_fim, sla, q=q))
+    return await gerar_export(lotes, tipo, nome_arquivo="chamados_comercial")
 
 # ───────────── Exportar Financeiro ───────────────
 @export_router.get("/exportar-financeiro", response_class=HTMLResponse)
@@ -42,50 +46,169 @@ async def exportar_financeiro(
     capturado:    Optional[str] = None,
     mudou_tipo:   Optional[str] = None,
     sla:          Optional[str] = None,
+    q:            Optional[str] = None,
 ):
-    dados = carregar_chamados_financeiro(
-        status=status, resp=responsavel,
-        d_ini=data_ini, d_fim=data_fim,
-        capturado=capturado, mudou_tipo=mudou_tipo, sla=sla
-    )
-    return gerar_export(dados, tipo, nome_arquivo="chamados_financeiro")
+    lotes = iterar_chamados_financeiro(**filtros_painel(
+        "financeiro", status, responsavel, capturado, mudou_tipo, data_ini, data_fim, sla, q=q))
+    return await gerar_export(lotes, tipo, nome_arquivo="chamados_financeiro")
 
-# ───────────── Função auxiliar ───────────────
-def gerar_export(dados, tipo, nome_arquivo="chamados"):
-    if not dados:
-        return HTMLResponse("<h4>Sem chamados para exportar.</h4>")
+# ───────────── Exportação em segundo plano ───────────────
+_BASES = {
+    "comercial":  (db_helpers, "chamados_comercial"),
+    "financeiro": (db_financeiro, "chamados_financeiro"),
+}
 
-    df = pd.DataFrame(dados).rename(columns={
-        "id": "ID",
-        "tipo_ticket": "Tipo",
-        "status": "Status",
-        "responsavel": "Responsável",
-        "abertura": "Abertura",
-        "fechamento": "Encerramento",
-        "sla": "SLA",
-        "capturado_por": "Capturado por",
-        "mudou_tipo": "Mudou Tipo?"
-    })
+def _produtor(db, filtros, tipo):
+    def produzir(caminho, job):
+        job.total = db.contar_chamados(**filtros)
+        def lotes():
+            for lote in db.iterar_chamados(**filtros):
+                job.linhas += len(lote)
+                job.publicar()
+                yield lote
+        if tipo == "csv":
+            with open(caminho, "w", encoding="utf-8", newline="") as f:
+                f.writelines(_csv_stream(lotes()))
+        else:
+            escrever_xlsx(lotes(), caminho)
+    return produzir
 
-    df["Mudou Tipo?"] = df["Mudou Tipo?"].map({True: "Sim", False: "Não"})
+@export_router.post("/exportar/jobs")
+async def criar_job(
+    base:         str  = Query("comercial", pattern="^(comercial|financeiro)$"),
+    tipo:         str  = Query("xlsx", pattern="^(xlsx|csv)$"),
+    status:       Optional[str] = None,
+    responsavel:  Optional[str] = None,
+    data_ini:     Optional[str] = None,
+    data_fim:     Optional[str] = None,
+    capturado:    Optional[str] = None,
+    mudou_tipo:   Optional[str] = None,
+    sla:          Optional[str] = None,
+    q:            Optional[str] = None,
+):
+    db, nome = _BASES[base]
+    filtros = filtros_painel(base, status, responsavel, capturado, mudou_tipo,
+                             data_ini, data_fim, sla, q=q)
+    versao = await rodar(db.versao_dados)
+    chave = export_jobs.chave(base, filtros, tipo, versao or str(time.time()))
+    # submeter/obter leem o estado publicado no SQLite compartilhado: fora do event loop
+    job = await rodar(export_jobs.submeter, chave, tipo, f"{nome}.{tipo}", _produtor(db, filtros, tipo))
+    return JSONResponse(job.como_dict(), status_code=202)
 
-    if tipo == "csv":
-        buf = io.StringIO()
-        df.to_csv(buf, sep=";", index=False)
+@export_router.get("/exportar/jobs/{job_id}")
+async def status_job(job_id: str):
+    job = await rodar(export_jobs.obter, job_id)
+    if not job:
+        return JSONResponse({"erro": "job não encontrado"}, status_code=404)
+    return JSONResponse(job.como_dict())
+
+@export_router.get("/exportar/jobs/{job_id}/arquivo")
+async def baixar_job(job_id: str):
+    job = await rodar(export_jobs.obter, job_id)
+    if not job or job.status != "pronto" or not await rodar(_tocar, job.caminho):
+        return HTMLResponse("<h4>Arquivo não disponível.</h4>", status_code=404)
+    media = "text/csv" if job.formato == "csv" else \
+        "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    return FileResponse(job.caminho, media_type=media, filename=job.nome)
+
+# ───────────── Funções auxiliares ───────────────
+def _tocar(caminho) -> bool:  # marca como usado (despejo LRU); False se já foi despejado
+    try:
+        os.utime(caminho)
+        return True
+    except FileNotFoundError:
+        return False
+
+# chave do chamado → cabeçalho, na ordem das colunas do arquivo
+COLUNAS = [
+    ("id", "ID"),
+    ("tipo_ticket", "Tipo"),
+    ("status", "Status"),
+    ("responsavel_uid", "responsavel_uid"),
+    ("responsavel", "Responsável"),
+    ("canal_id", "canal_id"),
+    ("thread_ts", "thread_ts"),
+    ("abertura", "Abertura"),
+    ("fechamento", "Encerramento"),
+    ("abertura_raw", "abertura_raw"),
+    ("fechamento_raw", "fechamento_raw"),
+    ("captura_raw", "captura_raw"),
+    ("sla", "SLA"),
+    ("capturado_uid", "capturado_uid"),
+    ("capturado_por", "Capturado por"),
+    ("solicitante", "solicitante"),
+    ("mudou_tipo", "Mudou Tipo?"),
+]
+
+def _linha(c: dict) -> list:
+    return [("Sim" if c["mudou_tipo"] else "Não") if k == "mudou_tipo" else c[k]
+            for k, _ in COLUNAS]
+
+def _csv_stream(lotes):
+    """Cabeçalho + um pedaço de CSV por lote, à medida que o cursor entrega."""
+    buf = io.StringIO()
+    w = csv.writer(buf, delimiter=";", lineterminator="\n")
+    w.writerow([t for _, t in COLUNAS])
+    for lote in lotes:
+        w.writerows(_linha(c) for c in lote)
+        yield buf.getvalue()
         buf.seek(0)
+        buf.truncate()
+
+async def gerar_export(lotes, tipo, nome_arquivo="chamados"):
+    try:
+        # primeiro lote espera a cota de fundo do pool: fora das threads do banco
+        primeiro = await run_in_threadpool(next, lotes, None)
+    except Exception:
+        return HTMLResponse("<h4>Erro ao consultar os chamados.</h4>", status_code=500)
+    if not primeiro:
+        return HTMLResponse("<h4>Sem chamados para exportar.</h4>")
+
+    if tipo == "csv":
         return StreamingResponse(
-            buf,
+            _csv_stream(chain([primeiro], lotes)),
             media_type="text/csv",
             headers={"Content-Disposition": f"attachment; filename={nome_arquivo}.csv"}
         )
 
-    # default to xlsx
-    buf = io.BytesIO()
-    with pd.ExcelWriter(buf, engine="openpyxl") as writer:
-        df.to_excel(writer, index=False, sheet_name="Chamados")
-    buf.seek(0)
-    return StreamingResponse(
-        buf,
+    caminho = await run_in_threadpool(_gerar_xlsx, primeiro, lotes)
+    return FileResponse(
+        caminho,
         media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": f"attachment; filename={nome_arquivo}.xlsx"}
+        filename=f"{nome_arquivo}.xlsx",
+        background=BackgroundTask(os.unlink, caminho),
     )
+
+def escrever_xlsx(lotes, destino):
+    """Planilha em modo write-only: linhas vão direto para o disco, lote a lote."""
+    # openpyxl só carrega na primeira exportação xlsx, não na partida do app
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Alignment, Border, Font, Side
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Chamados")
+    # mesmo estilo de cabeçalho que o pandas usava
+    borda = Side(style="thin")
+    cabecalho = []
+    for _, titulo in COLUNAS:
+        cel = WriteOnlyCell(ws, value=titulo)
+        cel.font = Font(bold=True)
+        cel.border = Border(left=borda, right=borda, top=borda, bottom=borda)
+        cel.alignment = Alignment(horizontal="center", vertical="top")
+        cabecalho.append(cel)
+    ws.append(cabecalho)
+    for lote in lotes:
+        for c in lote:
+            ws.append(_linha(c))
+    wb.save(destino)
+
+def _gerar_xlsx(primeiro, lotes) -> str:
+    fd, caminho = tempfile.mkstemp(prefix="chamados_", suffix=".xlsx")
+    os.close(fd)
+    try:
+        escrever_xlsx(chain([primeiro], lotes), caminho)
+    except BaseException:
+        os.unlink(caminho)
+        raise
+    return caminho
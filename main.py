@@ -1,33 +1,37 @@
 # main.py – Painel de Chamados v6 (estável + rápido)
-import os, math, datetime as dt, pytz
+import os, heapq, asyncio
+from contextlib import asynccontextmanager
 from pathlib import Path
 from urllib.parse import urlencode
 
 from fastapi import FastAPI, Request, Depends
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
-from fastapi.templating import Jinja2Templates
-from jinja2 import Environment, FileSystemLoader
+from jinja2 import Environment, FileSystemLoader, select_autoescape
 from starlette.middleware.sessions import SessionMiddleware
-from slack_sdk import WebClient, errors as slack_err
 
-from auth import router as auth_router, require_login
+from auth import router as auth_router, require_login, require_interno
 from export import export_router
-from utils import db_helpers, db_financeiro
-
-from utils.db_helpers import (
-    carregar_chamados,
-    contar_chamados,
-    listar_responsaveis,
-    listar_capturadores,
-    listar_tipos,
-)
-from utils.slack_helpers import get_real_name, formatar_texto_slack
+from utils import db_helpers, db_financeiro, db_pool, instrumentacao, aquecimento
+from utils.db_async import rodar
+from utils.filtros import filtros_painel, filtros_dashboard
+
+from utils.facetas import facetas_comercial, facetas_financeiro
+from utils.cache_painel import cache_painel
+from utils.cache_compartilhado import cache_compartilhado
+from utils.slack_helpers import carregar_thread
 
 # ── App e Middleware ────────────────────────────────────────────
 BASE_DIR = Path(__file__).resolve().parent
 
-app = FastAPI()
+@asynccontextmanager
+async def ciclo_de_vida(app: FastAPI):
+    # aquece em segundo plano: o servidor já atende enquanto isso (ver /pronto)
+    tarefa = asyncio.create_task(aquecimento.aquecer())
+    yield
+    tarefa.cancel()
+
+app = FastAPI(lifespan=ciclo_de_vida)
 
 app.mount("/static", StaticFiles(directory=str(BASE_DIR / "static")), name="static")
 
@@ -35,18 +39,69 @@ app.add_middleware(
     SessionMiddleware,
     secret_key=os.getenv("SESSION_SECRET_KEY", "3fa85f64-5717-4562-b3fc-2c963f66afa6")
 )
+app.add_middleware(instrumentacao.Instrumentacao)   # por fora de tudo: mede a requisição inteira
 
 app.include_router(auth_router)
 app.include_router(export_router)
 
-jinja_env = Environment(loader=FileSystemLoader(str(BASE_DIR / "templates")))
-jinja_env.globals.update(get_real_name=get_real_name, max=max, min=min)
-templates = Jinja2Templates(env=jinja_env)
+# autoescape: filtros da URL (q, datas) voltam nos campos do formulário
+jinja_env = Environment(loader=FileSystemLoader(str(BASE_DIR / "templates")),
+                        autoescape=select_autoescape())
+jinja_env.globals.update(max=max, min=min)
+templates = instrumentacao.TemplatesMedidos(env=jinja_env)
 
 PER_PAGE = 20
 
-# ── Slack client ────────────────────────────────────────────────
-slack_client = WebClient(token=os.getenv("SLACK_BOT_TOKEN", ""))
+# ── Resultados do painel (com cache) ────────────────────────────
+async def _resultados_painel(base: str, db, filtros: dict, apos: str, antes: str, ordem="id"):
+    """(métricas, página) do cache enquanto a versão dos dados não muda."""
+    versao = await rodar(cache_painel.versao, db)
+    chave = cache_painel.chave(base, filtros, apos=apos, antes=antes, ordem=ordem)
+    achou, res = await rodar(cache_painel.get, chave, versao)   # SQLite: pode esperar trava
+    if not achou:
+        res = await asyncio.gather(
+            rodar(db.metricas_chamados, **filtros),
+            rodar(db.carregar_pagina, PER_PAGE, apos=apos, antes=antes, ordem=ordem, **filtros),
+        )
+        await rodar(cache_painel.set, chave, versao, res)
+    return res
+
+# ── Painel geral (as duas bases) ────────────────────────────────
+_BASES = {"comercial": db_helpers, "financeiro": db_financeiro}
+
+def _ler_cursor_geral(valor: str) -> dict:
+    """"c_f" → cursor de página de cada base (o do último chamado já mostrado; None = topo)."""
+    partes = (valor or "").split("_")
+    return {base: parte or None for base, parte in zip(_BASES, partes + [""] * len(_BASES))}
+
+def _escrever_cursor_geral(cursores: dict) -> str:
+    return "_".join(cursores[b] or "" for b in _BASES)
+
+def _juntar_paginas(paginas: dict, cursores: dict, por_pagina: int) -> dict:
+    """Intercala as páginas das bases pela chave em que cada uma veio ordenada.
+
+    Sem busca as bases vêm por abertura (mais recentes primeiro); com busca, por
+    relevância – a mesma expressão nas duas. Cada base trouxe por_pagina chamados
+    a partir do seu cursor, então os por_pagina primeiros da intercalação estão
+    sempre entre eles. O cursor seguinte de cada base é o último chamado dela que
+    entrou na página.
+    """
+    fluxos = [list(zip(p["chaves"], [base] * len(p["chamados"]), p["chamados"], p["cursores"]))
+              for base, p in paginas.items()]
+    todos = list(heapq.merge(*fluxos, key=lambda item: item[0], reverse=True))[:por_pagina]
+    itens = [(base, ch) for _, base, ch, _ in todos]
+
+    proximos = dict(cursores)
+    for _, base, _, cur in todos:
+        proximos[base] = cur
+    usados = {b: sum(1 for base, _ in itens if base == b) for b in paginas}
+    mais = any(usados[b] < len(p["chamados"]) or p["proxima"] is not None
+               for b, p in paginas.items())
+    return {
+        "chamados": itens,
+        "proxima":  _escrever_cursor_geral(proximos) if itens and mais else None,
+        "inicio":   any(v is not None for v in cursores.values()),
+    }
 
 
 # ═════════════════════════ ROTAS ════════════════════════════════
@@ -67,60 +122,23 @@ async def painel(request: Request,
                  data_fim: str = None,
                  sla: str = "Todos",
                  tipo: str = "Todos",
-                 page: int = 1):
-
-    status_map = {
-        "Aberto": "aberto",
-        "Em Atendimento": "em análise",
-        "Finalizado": "fechado",
-        "Cancelado": "cancelado",
-        "Todos": None
-    }
+                 q: str = None,
+                 apos: str = None,
+                 antes: str = None):
 
-    filtros = {
-        "status":      status_map.get(status),
-        "resp":        None if responsavel in ("Todos", "") else responsavel,
-        "capturado":   None if capturado in ("Todos", "") else capturado,
-        "mudou_tipo":  None if mudou_tipo == "Todos" else mudou_tipo,
-        "sla":         None if sla == "Todos" else sla,
-        "tipo_ticket": None if tipo == "Todos" else tipo,
-    }
+    filtros = filtros_painel("comercial", status, responsavel, capturado, mudou_tipo,
+                              data_ini, data_fim, sla, tipo, q)
 
-    if data_ini:
-        try: filtros["d_ini"] = dt.datetime.strptime(data_ini, "%Y-%m-%d")
-        except: filtros["d_ini"] = None
-
-    if data_fim:
-        try: filtros["d_fim"] = dt.datetime.strptime(data_fim, "%Y-%m-%d") + dt.timedelta(days=1)
-        except: filtros["d_fim"] = None
-
-    filtros_sem_status = {k: v for k, v in filtros.items()
-                          if k not in ("status", "sla", "mudou_tipo")}
-
-    total = contar_chamados(**filtros)
-    paginas_totais = max(1, math.ceil(total / PER_PAGE))
-    page = max(1, min(page, paginas_totais))
-    ini, fim = (page - 1) * PER_PAGE, page * PER_PAGE
-    chamados = carregar_chamados(limit=PER_PAGE, offset=ini, **filtros)
-
-    fs = dict(filtros_sem_status)
-    fs.pop("status", None)
-    fs.pop("sla", None)
-    fs.pop("mudou_tipo", None)
-
-    metricas = {
-        "total":          total,
-        "em_atendimento": contar_chamados(status="em análise", **fs),
-        "finalizados":    contar_chamados(**fs, status="fechado"),
-        "fora_sla":       contar_chamados(sla="fora", **fs),
-        "mudaram_tipo":   contar_chamados(**fs, mudou_tipo="sim"),
-    }
+    (metricas, pagina), facetas = await asyncio.gather(
+        _resultados_painel("comercial", db_helpers, filtros, apos, antes),
+        rodar(facetas_comercial.obter),
+    )
 
     filtros_dict = {
         "status": status, "responsavel": responsavel,
         "capturado": capturado, "mudou_tipo": mudou_tipo,
         "data_ini": data_ini, "data_fim": data_fim,
-        "sla": sla, "tipo": tipo
+        "sla": sla, "tipo": tipo, "q": q
     }
     filtros_qs = urlencode({k: v for k, v in filtros_dict.items() if v and v != "Todos"})
 
@@ -128,15 +146,14 @@ async def painel(request: Request,
         request,
         "painel.html",
         {
-            "chamados":       chamados,
+            "chamados":       pagina["chamados"],
             "metricas":       metricas,
-            "pagina_atual":   page,
-            "paginas_totais": paginas_totais,
+            "pagina":         pagina,
             "url_paginacao":  f"/painel?{filtros_qs}",
             "filtros":        filtros_dict,
-            "responsaveis":   listar_responsaveis(),
-            "capturadores":   listar_capturadores(),
-            "tipos":          listar_tipos(),
+            "responsaveis":   facetas["responsaveis"],
+            "capturadores":   facetas["capturadores"],
+            "tipos":          facetas["tipos"],
             "filtros_as_query": filtros_qs,
         },
     )
@@ -152,57 +169,23 @@ async def painel_financeiro(request: Request,
                             data_fim: str = None,
                             sla: str = "Todos",
                             tipo: str = "Todos",
-                            page: int = 1):
-
-    status_map = {
-        "Aberto": "aberto",
-        "Em Atendimento": "em atendimento",
-        "Finalizado": "finalizado",
-        "Cancelado": "cancelado",
-        "Todos": None
-    }
+                            q: str = None,
+                            apos: str = None,
+                            antes: str = None):
 
-    filtros = {
-        "status":      status_map.get(status),
-        "resp":        None if responsavel in ("Todos", "") else responsavel,
-        "capturado":   None if capturado in ("Todos", "") else capturado,
-        "mudou_tipo":  None if mudou_tipo == "Todos" else mudou_tipo,
-        "sla":         None if sla == "Todos" else sla,
-        "tipo_ticket": None if tipo == "Todos" else tipo,
-    }
-
-    if data_ini:
-        try: filtros["d_ini"] = dt.datetime.strptime(data_ini, "%Y-%m-%d")
-        except: filtros["d_ini"] = None
-
-    if data_fim:
-        try: filtros["d_fim"] = dt.datetime.strptime(data_fim, "%Y-%m-%d") + dt.timedelta(days=1)
-        except: filtros["d_fim"] = None
-
-    filtros_sem_status = {k: v for k, v in filtros.items()
-                      if k not in ("status", "sla", "mudou_tipo")}
-
-    total = db_financeiro.contar_chamados(**filtros)
-    paginas_totais = max(1, math.ceil(total / PER_PAGE))
-    page = max(1, min(page, paginas_totais))
-    ini, fim = (page - 1) * PER_PAGE, page * PER_PAGE
-    chamados = db_financeiro.carregar_chamados(limit=PER_PAGE, offset=ini, **filtros)
+    filtros = filtros_painel("financeiro", status, responsavel, capturado, mudou_tipo,
+                              data_ini, data_fim, sla, tipo, q)
 
-    fs = dict(filtros_sem_status)
-
-    metricas = {
-        "total":          db_financeiro.contar_chamados(**filtros),
-        "em_atendimento": db_financeiro.contar_chamados(**fs, status="em atendimento"),
-        "finalizados":    db_financeiro.contar_chamados(**fs, status="finalizado"),
-        "fora_sla":       db_financeiro.contar_chamados(**fs, sla="fora"),
-        "mudaram_tipo":   db_financeiro.contar_chamados(**fs, mudou_tipo="sim"),
-    }
+    (metricas, pagina), facetas = await asyncio.gather(
+        _resultados_painel("financeiro", db_financeiro, filtros, apos, antes),
+        rodar(facetas_financeiro.obter),
+    )
 
     filtros_dict = {
         "status": status, "responsavel": responsavel,
         "capturado": capturado, "mudou_tipo": mudou_tipo,
         "data_ini": data_ini, "data_fim": data_fim,
-        "sla": sla, "tipo": tipo
+        "sla": sla, "tipo": tipo, "q": q
     }
     filtros_qs = urlencode({k: v for k, v in filtros_dict.items() if v and v != "Todos"})
 
@@ -210,83 +193,118 @@ async def painel_financeiro(request: Request,
         request,
         "painel_financeiro.html",
         {
-            "chamados":       chamados,
+            "chamados":       pagina["chamados"],
             "metricas":       metricas,
-            "pagina_atual":   page,
-            "paginas_totais": paginas_totais,
+            "pagina":         pagina,
             "url_paginacao":  f"/painel-financeiro?{filtros_qs}",
             "filtros":        filtros_dict,
-            "responsaveis":   db_financeiro.listar_responsaveis(),
-            "capturadores":   db_financeiro.listar_capturadores(),
-            "tipos":          db_financeiro.listar_tipos(),
+            "responsaveis":   facetas["responsaveis"],
+            "capturadores":   facetas["capturadores"],
+            "tipos":          facetas["tipos"],
             "filtros_as_query": filtros_qs,
         },
     )
 
-@app.get("/dashboards", response_class=HTMLResponse)
-async def dashboards(request: Request, user: dict = Depends(require_login)):
-    import datetime as dt
-
-    data_ini = request.query_params.get("data_ini")
-    data_fim = request.query_params.get("data_fim")
-    responsavel = request.query_params.get("responsavel")
-    status = request.query_params.get("status")
-    tipo = request.query_params.get("tipo")
-
-    filtros = {}
-
-    if data_ini:
-        try:
-            filtros["d_ini"] = dt.datetime.strptime(data_ini, "%Y-%m-%d")
-        except:
-            pass
-
-    if data_fim:
-        try:
-            filtros["d_fim"] = dt.datetime.strptime(data_fim, "%Y-%m-%d") + dt.timedelta(days=1)
-        except:
-            pass
-
-    if responsavel and responsavel != "Todos":
-        filtros["resp"] = responsavel
-
-    if status and status != "Todos":
-        filtros["status"] = status
-
-    if tipo and tipo != "Todos":
-        filtros["tipo_ticket"] = tipo
-
-    filtros_ativos = any([
-        filtros.get("d_ini"),
-        filtros.get("d_fim"),
-        filtros.get("resp"),
-        filtros.get("status"),
-        filtros.get("tipo_ticket")
-    ])
-
-    usar_limit = not filtros_ativos
-    print("usar_limit:", usar_limit)
-
-    dados = carregar_chamados(**({} if usar_limit else filtros))
-
-    for c in dados:
-        for campo in ("abertura_raw", "captura_raw", "fechamento_raw"):
-            valor = c.get(campo)
-            if valor:
-                if isinstance(valor, dt.datetime):
-                    c[campo] = valor.isoformat()
-                elif isinstance(valor, str):
-                    try:
-                        c[campo] = dt.datetime.fromisoformat(valor).isoformat()
-                    except:
-                        c[campo] = None
+@app.get("/painel-geral", response_class=HTMLResponse)
+async def painel_geral(request: Request,
+                       user: dict = Depends(require_login),
+                       status: str = "Todos",
+                       responsavel: str = "Todos",
+                       capturado: str = "Todos",
+                       mudou_tipo: str = "Todos",
+                       data_ini: str = None,
+                       data_fim: str = None,
+                       sla: str = "Todos",
+                       tipo: str = "Todos",
+                       q: str = None,
+                       apos: str = None):
+    # as duas bases em paralelo: o tempo é o da mais lenta, não a soma
+    cursores = _ler_cursor_geral(apos)
+    filtros = {base: filtros_painel(base, status, responsavel, capturado, mudou_tipo,
+                                     data_ini, data_fim, sla, tipo, q) for base in _BASES}
+    (m_com, p_com), (m_fin, p_fin), f_com, f_fin = await asyncio.gather(
+        *(_resultados_painel(base, db, filtros[base], cursores[base], None, ordem="abertura")
+          for base, db in _BASES.items()),
+        rodar(facetas_comercial.obter),
+        rodar(facetas_financeiro.obter),
+    )
+
+    metricas = {"comercial": m_com, "financeiro": m_fin,
+                "total": {k: m_com[k] + m_fin[k] for k in m_com}}
+    pagina = _juntar_paginas({"comercial": p_com, "financeiro": p_fin}, cursores, PER_PAGE)
+
+    def unir(chave):  # (uid, nome) das duas bases, sem repetir
+        return sorted(dict(f_com[chave] + f_fin[chave]).items(), key=lambda p: p[1].lower())
+
+    filtros_dict = {
+        "status": status, "responsavel": responsavel,
+        "capturado": capturado, "mudou_tipo": mudou_tipo,
+        "data_ini": data_ini, "data_fim": data_fim,
+        "sla": sla, "tipo": tipo, "q": q
+    }
+    filtros_qs = urlencode({k: v for k, v in filtros_dict.items() if v and v != "Todos"})
 
     return templates.TemplateResponse(
         request,
-        "dashboards.html",
-        {"dados": dados},
+        "painel_geral.html",
+        {
+            "chamados":       pagina["chamados"],
+            "metricas":       metricas,
+            "pagina":         pagina,
+            "url_paginacao":  f"/painel-geral?{filtros_qs}",
+            "filtros":        filtros_dict,
+            "responsaveis":   unir("responsaveis"),
+            "capturadores":   unir("capturadores"),
+            "tipos":          sorted(set(f_com["tipos"]) | set(f_fin["tipos"])),
+        },
     )
 
+@app.get("/dashboards", response_class=HTMLResponse)
+async def dashboards(request: Request, user: dict = Depends(require_login)):
+    # os gráficos buscam só os agregados em /api/dashboards
+    return templates.TemplateResponse(request, "dashboards.html", {})
+
+@app.get("/api/dashboards")
+async def api_dashboards(user: dict = Depends(require_login),
+                         base: str = "comercial",
+                         data_ini: str = None,
+                         data_fim: str = None,
+                         responsavel: str = None,
+                         status: str = None,
+                         tipo: str = None):
+    filtros = filtros_dashboard(status, responsavel, data_ini, data_fim, tipo)
+
+    if base == "ambas":   # lado a lado, as duas consultas em paralelo
+        res = await asyncio.gather(*(rodar(db.agregados_dashboard, **filtros)
+                                     for db in _BASES.values()))
+        return JSONResponse(dict(zip(_BASES, res)))
+
+    db = db_financeiro if base == "financeiro" else db_helpers
+    return JSONResponse(await rodar(db.agregados_dashboard, **filtros))
+
+# ───────────────────────── STATUS ───────────────────────────────
+@app.get("/status")
+async def status(user: dict = Depends(require_interno)):
+    # pools por base, sem host/banco; as estatísticas do cache leem o SQLite: fora do loop
+    painel, compartilhado = await asyncio.gather(rodar(cache_painel.estatisticas),
+                                                 rodar(cache_compartilhado.estatisticas))
+    return JSONResponse({"db_pool": db_pool.estatisticas({db_helpers._URL: "comercial",
+                                                          db_financeiro._URL: "financeiro"}),
+                         "cache_painel": painel,
+                         "cache_compartilhado": compartilhado,
+                         "aquecimento": aquecimento.estado()})
+
+@app.get("/pronto")
+async def pronto():
+    # healthcheck do deploy: 503 até o aquecimento terminar
+    estado = aquecimento.estado()
+    return JSONResponse(estado, status_code=200 if estado["pronto"] else 503)
+
+@app.get("/metrics")
+async def metrics(user: dict = Depends(require_interno)):
+    return PlainTextResponse(instrumentacao.exposicao(),
+                             media_type="text/plain; version=0.0.4")
+
 # ───────────────────────── THREAD ───────────────────────────────
 @app.post("/thread")
 async def thread(request: Request):
@@ -294,22 +312,7 @@ async def thread(request: Request):
     canal_id  = form["canal_id"]
     thread_ts = form["thread_ts"]
 
-    mensagens = []
-    try:
-        from utils.slack_helpers import get_slack_client
-        client = get_slack_client(canal_id)
-        resp = client.conversations_replies(channel=canal_id, ts=thread_ts, limit=200)
-        tz   = pytz.timezone("America/Sao_Paulo")
-        for i, m in enumerate(resp.get("messages", [])):
-            mensagens.append({
-                "texto": formatar_texto_slack(m.get("text", "")),
-                "ts": dt.datetime.fromtimestamp(float(m["ts"]))
-                      .astimezone(tz).strftime("%d/%m/%Y %H:%M"),
-                "user": get_real_name(m.get("user")) or "<não capturado>",
-                "orig": i == 0
-            })
-    except slack_err.SlackApiError as e:
-        print("Slack API:", e.response["error"])
+    mensagens = await carregar_thread(canal_id, thread_ts)
 
     return templates.TemplateResponse(
         request,
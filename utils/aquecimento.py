@@ -0,0 +1,73 @@
+"""
+Aquecimento na partida: diretórios de usuários e grupos do Slack, facetas do
+painel e rollups dos dashboards em paralelo, antes do primeiro usuário pedir.
+
+Roda em segundo plano a partir do lifespan – o servidor já aceita conexões
+enquanto isso e /pronto responde 503 até terminar (é o healthcheck para o
+deploy só trocar a instância quando as caches estiverem cheias). Etapa que
+falha (Slack fora, banco fora) não segura a partida: fica registrada em
+estado() e a primeira requisição carrega do jeito normal.
+
+AQUECIMENTO=0 desliga (pronto desde o início).
+"""
+import os, time, asyncio
+
+from utils import slack_helpers as sh, db_helpers, db_financeiro
+from utils.facetas import facetas_comercial, facetas_financeiro
+from utils.db_pool import segundo_plano
+
+_ATIVO   = os.getenv("AQUECIMENTO", "1") != "0"
+_TIMEOUT = float(os.getenv("AQUECIMENTO_TIMEOUT", "60"))   # s; depois disso declara pronto
+
+_ETAPAS = {
+    # avisa no log, já na partida, se falta "python -m utils.schema aplicar"
+    "schema_comercial":          db_helpers._consultas.colunas_derivadas,
+    "schema_financeiro":         db_financeiro._consultas.colunas_derivadas,
+    "slack_usuarios_comercial":  sh._diretorio_comercial.prefetch,
+    "slack_usuarios_financeiro": sh._diretorio_financeiro.prefetch,
+    "slack_grupos_comercial":    sh._grupos_comercial.iniciar,
+    "slack_grupos_financeiro":   sh._grupos_financeiro.iniciar,
+    "facetas_comercial":         facetas_comercial.obter,
+    "facetas_financeiro":        facetas_financeiro.obter,
+    "rollups_comercial":         db_helpers._consultas.renovar_rollup,
+    "rollups_financeiro":        db_financeiro._consultas.renovar_rollup,
+}
+
+_estado = {"inicio": None, "fim": None, "etapas": {}}
+
+def pronto() -> bool:
+    return not _ATIVO or _estado["fim"] is not None
+
+def estado() -> dict:
+    inicio, fim = _estado["inicio"], _estado["fim"]
+    return {
+        "pronto":   pronto(),
+        "duracao_s": round((fim or time.monotonic()) - inicio, 2) if inicio else None,
+        "etapas":   dict(_estado["etapas"]),
+    }
+
+async def _etapa(nome: str, fn):
+    t0 = time.monotonic()
+    try:
+        # threads do executor padrão e cota de fundo do pool: as do banco (rodar) e o
+        # resto do pool ficam livres para as requisições que chegarem antes do fim
+        with segundo_plano():
+            await asyncio.to_thread(fn)
+        _estado["etapas"][nome] = {"ok": True, "s": round(time.monotonic() - t0, 2)}
+    except Exception as e:
+        print(f"AQUECIMENTO ERRO ({nome}):", e)
+        _estado["etapas"][nome] = {"ok": False, "s": round(time.monotonic() - t0, 2),
+                                   "erro": str(e)}
+
+async def aquecer():
+    """Roda todas as etapas em paralelo; marca pronto ao fim ou no timeout."""
+    if not _ATIVO:
+        return
+    _estado["inicio"] = time.monotonic()
+    try:
+        await asyncio.wait_for(
+            asyncio.gather(*(_etapa(n, fn) for n, fn in _ETAPAS.items())), _TIMEOUT)
+    except asyncio.TimeoutError:
+        print(f"AQUECIMENTO: timeout de {_TIMEOUT:.0f}s, seguindo sem terminar")
+    finally:
+        _estado["fim"] = time.monotonic()
@@ -0,0 +1,306 @@
+"""
+Cache compartilhado entre os workers do uvicorn no mesmo nó: um arquivo SQLite
+em modo WAL (leituras não bloqueiam escrita nem umas às outras).
+
+Guarda valores pickle por (namespace, chave) com TTL por entrada; cada
+namespace tem um teto de bytes (limitar()), conferido a cada escrita, com
+despejo das entradas lidas há mais tempo (LRU – a hora da última leitura é
+gravada em lote, ver _tocar). travar()/liberar() dão um "lease" com expiração
+para que só um worker renove algo caro (users.list, facetas) enquanto os
+outros esperam ou seguem com o valor atual.
+
+É só cache: qualquer erro de SQLite vira falta/no-op e vai para o log, nunca
+para a requisição. O arquivo (CACHE_COMPARTILHADO, padrão no diretório
+temporário) some com o container; valores que não despicklam mais depois de
+um deploy também contam como falta.
+"""
+import os, time, pickle, sqlite3, tempfile, threading
+from pathlib import Path
+
+_CAMINHO   = os.getenv("CACHE_COMPARTILHADO",
+                       str(Path(tempfile.gettempdir()) / "painel-cache.sqlite3"))
+_MAX_BYTES = int(float(os.getenv("CACHE_COMPARTILHADO_MAX_MB", "128")) * 2**20)  # por namespace
+_LIMPEZA   = 30.0    # s entre varreduras de expirados/excesso (por processo)
+_LOTE_IN   = 500     # chaves por SELECT … IN
+_TOQUES    = 500     # leituras acumuladas antes de gravar a hora do último uso…
+_TOQUES_S  = 5.0     # …ou s desde a última gravação
+
+_DDL = """
+    CREATE TABLE IF NOT EXISTS cache (
+        ns       TEXT    NOT NULL,
+        chave    TEXT    NOT NULL,
+        valor    BLOB    NOT NULL,
+        expira   REAL    NOT NULL,
+        gravado  REAL    NOT NULL,
+        tamanho  INTEGER NOT NULL,
+        lido     REAL    NOT NULL,   -- última leitura (ou a gravação): ordem do despejo
+        PRIMARY KEY (ns, chave)
+    ) WITHOUT ROWID;
+    CREATE TABLE IF NOT EXISTS travas (
+        nome    TEXT PRIMARY KEY,
+        dono    TEXT NOT NULL,
+        expira  REAL NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS despejos (   -- entradas despejadas por namespace, de todos os workers
+        ns  TEXT    PRIMARY KEY,
+        n   INTEGER NOT NULL
+    );"""
+# depois da migração: arquivos de antes do LRU não têm a coluna lido
+_INDICE = "CREATE INDEX IF NOT EXISTS cache_lru ON cache (ns, lido, tamanho)"
+
+
+class CacheCompartilhado:
+    def __init__(self, caminho: str = _CAMINHO):
+        self.caminho = caminho
+        self._local = threading.local()     # uma conexão por thread
+        self._limites = {}                  # ns → max bytes
+        self._limpo_em = time.monotonic()
+        self._lidos = {}                    # (ns, chave) → hora da leitura, ainda não gravada
+        self._tocado_em = time.monotonic()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.escritas = self.despejadas = self.erros = 0
+
+    # ── conexão ──────────────────────────────────────────────
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.caminho, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")   # WAL: perde no máximo o último commit num crash
+            conn.executescript(_DDL)
+            if "lido" not in {c[1] for c in conn.execute("PRAGMA table_info(cache)")}:
+                try:
+                    conn.execute("ALTER TABLE cache ADD COLUMN lido REAL NOT NULL DEFAULT 0")
+                except sqlite3.OperationalError:   # outro worker migrou antes
+                    pass
+            conn.execute(_INDICE)
+            self._local.conn = conn
+        return conn
+
+    def _erro(self, onde: str, e: Exception):
+        self.erros += 1
+        print(f"CACHE ERRO ({onde}):", e)
+
+    @staticmethod
+    def _carregar(blob):
+        try:
+            return True, pickle.loads(blob)
+        except Exception:          # formato de outra versão do código
+            return False, None
+
+    def limitar(self, ns: str, max_bytes: int):
+        self._limites[ns] = max_bytes
+
+    @staticmethod
+    def _transacao(conn, sql: str, linhas):
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(sql, linhas)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    # ── uso (LRU) ────────────────────────────────────────────
+    def _tocar(self, ns: str, chaves):
+        """Anota a leitura; grava em lote (uma transação) a cada _TOQUES leituras ou _TOQUES_S s."""
+        agora = time.time()
+        with self._lock:
+            for chave in chaves:
+                self._lidos[(ns, chave)] = agora
+            if len(self._lidos) < _TOQUES and time.monotonic() - self._tocado_em < _TOQUES_S:
+                return
+        self._gravar_toques()
+
+    def _gravar_toques(self):
+        with self._lock:
+            lidos, self._lidos = self._lidos, {}
+            self._tocado_em = time.monotonic()
+        if not lidos:
+            return
+        try:
+            self._transacao(self._conn(),
+                            "UPDATE cache SET lido = ? WHERE ns = ? AND chave = ? AND lido < ?",
+                            [(t, ns, chave, t) for (ns, chave), t in lidos.items()])
+        except sqlite3.Error as e:
+            self._erro("tocar", e)
+
+    def _despejar(self, conn, ns: str) -> int:
+        """Remove as entradas lidas há mais tempo até o namespace caber no teto."""
+        total = conn.execute("SELECT SUM(tamanho) FROM cache WHERE ns = ?", (ns,)).fetchone()[0]
+        excesso = (total or 0) - self._limites.get(ns, _MAX_BYTES)
+        if excesso <= 0:
+            return 0
+        remover = []
+        for chave, tamanho in conn.execute(
+                "SELECT chave, tamanho FROM cache WHERE ns = ? ORDER BY lido", (ns,)):
+            remover.append((ns, chave))
+            excesso -= tamanho
+            if excesso <= 0:
+                break
+        conn.executemany("DELETE FROM cache WHERE ns = ? AND chave = ?", remover)
+        conn.execute("INSERT INTO despejos VALUES (?, ?) ON CONFLICT (ns) DO UPDATE SET n = n + excluded.n",
+                     (ns, len(remover)))
+        with self._lock:
+            self.despejadas += len(remover)
+        return len(remover)
+
+    # ── leitura ──────────────────────────────────────────────
+    def get(self, ns: str, chave: str):
+        """Retorna (achou, valor)."""
+        try:
+            linha = self._conn().execute(
+                "SELECT valor FROM cache WHERE ns = ? AND chave = ? AND expira > ?",
+                (ns, chave, time.time())).fetchone()
+        except sqlite3.Error as e:
+            self._erro("get", e)
+            linha = None
+        achou, valor = self._carregar(linha[0]) if linha else (False, None)
+        with self._lock:
+            if achou:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if achou:
+            self._tocar(ns, (chave,))
+        return achou, valor
+
+    def get_muitos(self, ns: str, chaves) -> dict:
+        """chave → valor só das chaves presentes (o valor pode ser None)."""
+        chaves, res = list(chaves), {}
+        agora = time.time()
+        try:
+            conn = self._conn()
+            for i in range(0, len(chaves), _LOTE_IN):
+                lote = chaves[i:i + _LOTE_IN]
+                marcas = ",".join("?" * len(lote))
+                for chave, blob in conn.execute(
+                        f"SELECT chave, valor FROM cache WHERE ns = ? AND expira > ? "
+                        f"AND chave IN ({marcas})", (ns, agora, *lote)):
+                    achou, valor = self._carregar(blob)
+                    if achou:
+                        res[chave] = valor
+        except sqlite3.Error as e:
+            self._erro("get_muitos", e)
+        with self._lock:
+            self.hits += len(res)
+            self.misses += len(chaves) - len(res)
+        if res:
+            self._tocar(ns, res)
+        return res
+
+    def itens(self, ns: str) -> dict:
+        """Todas as entradas válidas de um namespace (chave → valor)."""
+        res = {}
+        try:
+            for chave, blob in self._conn().execute(
+                    "SELECT chave, valor FROM cache WHERE ns = ? AND expira > ?", (ns, time.time())):
+                achou, valor = self._carregar(blob)
+                if achou:
+                    res[chave] = valor
+        except sqlite3.Error as e:
+            self._erro("itens", e)
+        return res
+
+    # ── escrita ──────────────────────────────────────────────
+    def set(self, ns: str, chave: str, valor, ttl: float):
+        self.set_muitos(ns, {chave: valor}, ttl)
+
+    def set_muitos(self, ns: str, itens: dict, ttl: float):
+        if not itens:
+            return
+        agora = time.time()
+        linhas = []
+        for chave, valor in itens.items():
+            blob = pickle.dumps(valor, pickle.HIGHEST_PROTOCOL)
+            linhas.append((ns, chave, blob, agora + ttl, agora, len(blob) + len(chave), agora))
+        try:
+            conn = self._conn()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany("INSERT OR REPLACE INTO cache "
+                                 "(ns, chave, valor, expira, gravado, tamanho, lido) "
+                                 "VALUES (?, ?, ?, ?, ?, ?, ?)", linhas)
+                self._despejar(conn, ns)     # o teto vale a cada escrita, não só na limpeza
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        except sqlite3.Error as e:
+            self._erro("set", e)
+            return
+        with self._lock:
+            self.escritas += len(linhas)
+        if time.monotonic() - self._limpo_em > _LIMPEZA:
+            self.limpar()
+
+    def remover(self, ns: str, chave: str):
+        try:
+            self._conn().execute("DELETE FROM cache WHERE ns = ? AND chave = ?", (ns, chave))
+        except sqlite3.Error as e:
+            self._erro("remover", e)
+
+    def limpar(self):
+        """Apaga expirados e, em cada namespace acima do teto, as entradas lidas há mais tempo."""
+        self._limpo_em = time.monotonic()
+        self._gravar_toques()
+        try:
+            conn = self._conn()
+            conn.execute("DELETE FROM cache WHERE expira <= ?", (time.time(),))
+            for (ns,) in conn.execute("SELECT DISTINCT ns FROM cache").fetchall():
+                self._despejar(conn, ns)
+            conn.execute("DELETE FROM travas WHERE expira <= ?", (time.time(),))
+        except sqlite3.Error as e:
+            self._erro("limpar", e)
+
+    # ── travas (renovação por um worker só) ──────────────────
+    @staticmethod
+    def _dono() -> str:
+        return f"{os.getpid()}:{threading.get_ident()}"
+
+    def travar(self, nome: str, ttl: float) -> bool:
+        """True se pegou a trava (ou ela estava vencida). Expira sozinha após ttl."""
+        agora = time.time()
+        try:
+            cur = self._conn().execute(
+                """INSERT INTO travas (nome, dono, expira) VALUES (?, ?, ?)
+                   ON CONFLICT (nome) DO UPDATE SET dono = excluded.dono, expira = excluded.expira
+                   WHERE travas.expira <= ?""", (nome, self._dono(), agora + ttl, agora))
+            return cur.rowcount == 1
+        except sqlite3.Error as e:
+            self._erro("travar", e)
+            return True      # sem cache compartilhado cada worker segue sozinho
+
+    def liberar(self, nome: str):
+        try:
+            self._conn().execute("DELETE FROM travas WHERE nome = ? AND dono = ?",
+                                 (nome, self._dono()))
+        except sqlite3.Error as e:
+            self._erro("liberar", e)
+
+    # ── monitoramento ────────────────────────────────────────
+    def estatisticas(self) -> dict:
+        try:
+            conn = self._conn()
+            por_ns = {ns: {"entradas": n, "bytes": b, "despejadas": 0} for ns, n, b in conn.execute(
+                "SELECT ns, COUNT(*), SUM(tamanho) FROM cache WHERE expira > ? GROUP BY ns",
+                (time.time(),))}
+            for ns, n in conn.execute("SELECT ns, n FROM despejos"):
+                por_ns.setdefault(ns, {"entradas": 0, "bytes": 0})["despejadas"] = n
+        except sqlite3.Error as e:
+            self._erro("estatisticas", e)
+            por_ns = {}
+        total = self.hits + self.misses
+        return {
+            "pid":        os.getpid(),
+            "namespaces": por_ns,
+            "hits":       self.hits,
+            "misses":     self.misses,
+            "taxa_hit":   round(self.hits / total, 3) if total else 0.0,
+            "escritas":   self.escritas,
+            "despejadas": self.despejadas,     # deste worker; por namespace, do nó
+            "erros":      self.erros,
+        }
+
+
+cache_compartilhado = CacheCompartilhado()
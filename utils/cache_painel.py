@@ -0,0 +1,95 @@
+"""
+Cache dos resultados do painel (métricas + página) por base, filtros normalizados e cursor.
+
+Invalidação pela versão dos dados (db.versao_dados – maior id + contador de escritas),
+sondada no máximo a cada PAINEL_CACHE_SONDA s; entradas de outra versão contam como
+falta. O contador do pg_stat chega alguns segundos depois do commit de quem escreveu,
+então o painel pode ficar esse tanto atrasado.
+
+As entradas ficam no cache compartilhado (SQLite, utils.cache_compartilhado): todos os
+workers do nó aproveitam a página que qualquer um deles calculou. Teto de
+PAINEL_CACHE_MAX_MB com despejo das lidas há mais tempo; PAINEL_CACHE_TTL limita a
+vida de uma entrada mesmo sem escrita nova.
+"""
+import os, json, time, threading
+
+from utils.cache_compartilhado import cache_compartilhado
+
+_MAX_BYTES = int(float(os.getenv("PAINEL_CACHE_MAX_MB", "64")) * 2**20)
+_SONDA     = float(os.getenv("PAINEL_CACHE_SONDA", "5"))    # s
+_TTL       = float(os.getenv("PAINEL_CACHE_TTL", "900"))    # s
+_NS        = "painel"
+_FORMATO   = 3    # muda junto com o formato da página (cursores); entradas antigas viram falta
+
+
+class _Versao:
+    """Versão dos dados de uma base, reaproveitada por _SONDA segundos."""
+
+    def __init__(self, db):
+        self.db = db
+        self.valor = ""
+        self._em = 0.0
+        self._lock = threading.Lock()
+
+    def atual(self) -> str:
+        if time.monotonic() - self._em > _SONDA:
+            with self._lock:
+                if time.monotonic() - self._em > _SONDA:
+                    self.valor = self.db.versao_dados()
+                    self._em = time.monotonic()
+        return self.valor
+
+
+class CacheResultados:
+    def __init__(self, max_bytes: int = _MAX_BYTES, loja=cache_compartilhado):
+        self.max_bytes = max_bytes
+        self.loja = loja
+        self.loja.limitar(_NS, max_bytes)
+        self._lock = threading.Lock()
+        self._versoes = {}
+        self.hits = self.misses = self.invalidadas = 0
+
+    def versao(self, db) -> str:
+        v = self._versoes.get(db)
+        if v is None:
+            v = self._versoes.setdefault(db, _Versao(db))
+        return v.atual()
+
+    @staticmethod
+    def chave(base: str, filtros: dict, **extra) -> str:
+        normal = {k: str(v) for k, v in {**filtros, **extra}.items() if v not in (None, "")}
+        return json.dumps([_FORMATO, base, normal], sort_keys=True)
+
+    def get(self, chave: str, versao: str):
+        achou, item = self.loja.get(_NS, chave)
+        with self._lock:
+            if achou and versao and item[0] == versao:
+                self.hits += 1
+                return True, item[1]
+            if achou:
+                self.invalidadas += 1
+            self.misses += 1
+        if achou:
+            self.loja.remover(_NS, chave)
+        return False, None
+
+    def set(self, chave: str, versao: str, valor):
+        if not versao:                   # sem versão (banco fora?) não guarda
+            return
+        self.loja.set(_NS, chave, (versao, valor), _TTL)
+
+    def estatisticas(self) -> dict:
+        total = self.hits + self.misses
+        loja = self.loja.estatisticas()
+        return {
+            # entradas, bytes e despejadas (pelo teto) no nó inteiro
+            **loja["namespaces"].get(_NS, {"entradas": 0, "bytes": 0, "despejadas": 0}),
+            "max_bytes":   self.max_bytes,
+            "hits":        self.hits,             # deste worker
+            "misses":      self.misses,
+            "taxa_hit":    round(self.hits / total, 3) if total else 0.0,
+            "invalidadas": self.invalidadas,
+        }
+
+
+cache_painel = CacheResultados()
@@ -0,0 +1,153 @@
+"""
+Registro compacto de chamado: a linha do banco (tupla) + os nomes do lote.
+
+Os campos de exibição (datas formatadas, ISO, nomes) só são calculados quando
+lidos. Cada projeção seleciona apenas as colunas que os seus campos usam; na
+exportação as datas de abertura/fechamento já chegam convertidas do Postgres
+(fuso de São Paulo via SET LOCAL TIME ZONE + to_char). data_captura é texto
+gravado pelo bot e é lida aqui: valor malformado vira vazio, sem fuso é UTC.
+"""
+import pytz
+from datetime import datetime, timezone
+from dateutil.parser import parse as parse_dt
+
+from utils.slack_helpers import get_real_names
+
+_TZ = pytz.timezone("America/Sao_Paulo")
+_PREPARO_TZ = "SET LOCAL TIME ZONE 'America/Sao_Paulo'"
+
+# campo → coluna da tabela de onde ele sai
+_COLUNA = {
+    "id":              "id",
+    "tipo_ticket":     "tipo_ticket",
+    "status":          "status",
+    "responsavel_uid": "responsavel",
+    "responsavel":     "responsavel",
+    "canal_id":        "canal_id",
+    "thread_ts":       "thread_ts",
+    "abertura":        "data_abertura",
+    "fechamento":      "data_fechamento",
+    "abertura_raw":    "data_abertura",
+    "fechamento_raw":  "data_fechamento",
+    "captura_raw":     "data_captura",
+    "sla":             "sla_status",
+    "capturado_uid":   "capturado_por",
+    "capturado_por":   "capturado_por",
+    "solicitante":     "solicitante",
+    "mudou_tipo":      "mudou_tipo",
+}
+
+def _iso(coluna: str) -> str:  # igual a datetime.isoformat(): sem fração quando ela é zero
+    return f"""replace(to_char({coluna}, 'YYYY-MM-DD"T"HH24:MI:SS.USTZH:TZM'), '.000000', '')"""
+
+# campos convertidos no Postgres: campo → (chave, expressão)
+_COLUNA_SQL = {
+    "abertura":       ("abertura_fmt",   "COALESCE(to_char(data_abertura, 'DD/MM/YYYY HH24:MI'), '-')"),
+    "fechamento":     ("fechamento_fmt", "COALESCE(to_char(data_fechamento, 'DD/MM/YYYY HH24:MI'), '-')"),
+    "abertura_raw":   ("abertura_iso",   _iso("data_abertura")),
+    "fechamento_raw": ("fechamento_iso", _iso("data_fechamento")),
+}
+
+
+class Projecao:
+    def __init__(self, nome: str, campos: tuple, datas_no_sql: bool = False):
+        self.nome = nome
+        self.campos = campos
+        sql = {c: _COLUNA_SQL[c] for c in campos if datas_no_sql and c in _COLUNA_SQL}
+        chaves = dict.fromkeys(sql[c][0] if c in sql else _COLUNA[c] for c in campos)
+        expressoes = dict(sql.values())
+        self.colunas = tuple(chaves)
+        self.select = tuple(f"{expressoes[k]} AS {k}" if k in expressoes else k for k in chaves)
+        self.preparo = _PREPARO_TZ if sql else None   # roda na mesma transação do SELECT
+        self.idx = {c: i for i, c in enumerate(self.colunas)}
+        # só resolve nomes das colunas de UID cujo nome é exibido
+        self.uids = tuple(self.idx[_COLUNA[c]] for c in ("responsavel", "capturado_por",
+                                                          "solicitante") if c in campos)
+
+    def __reduce__(self):  # Chamados no cache compartilhado levam só o nome da projeção
+        return _projecao, (self.nome,)
+
+def _projecao(nome: str) -> "Projecao":
+    return PROJECOES[nome]
+
+
+PROJECOES = {p.nome: p for p in (
+    Projecao("painel", ("id", "tipo_ticket", "status", "responsavel", "canal_id", "thread_ts",
+                        "abertura", "fechamento", "sla", "capturado_por", "solicitante",
+                        "mudou_tipo")),
+    Projecao("export", tuple(_COLUNA), datas_no_sql=True),
+)}
+
+# ── conversões ──────────────────────────────────────────────────
+def _fmt(dt_obj):  # datetime → string local
+    return dt_obj.astimezone(_TZ).strftime("%d/%m/%Y %H:%M") if dt_obj else "-"
+
+def _to_iso(dt):  # sem fuso = UTC (não o fuso do servidor)
+    try:
+        if isinstance(dt, str) and dt:
+            try:
+                dt = datetime.fromisoformat(dt.strip())
+            except ValueError:
+                dt = parse_dt(dt)
+        if isinstance(dt, datetime):
+            if dt.tzinfo is None:
+                dt = dt.replace(tzinfo=timezone.utc)
+            return dt.astimezone(_TZ).isoformat()
+    except:
+        return None
+
+def _user(uid: str, nomes: dict):  # UID → nome real / placeholder
+    nome = nomes.get(uid)
+    return "<não capturado>" if not nome or nome.startswith(("U", "B", "W", "S")) else nome
+
+
+class Chamado:
+    """Acesso por atributo (templates) ou por chave (exportações), como o dict de antes."""
+
+    __slots__ = ("_r", "_p", "_nomes")
+
+    def __init__(self, r: tuple, projecao: Projecao, nomes: dict):
+        self._r, self._p, self._nomes = r, projecao, nomes
+
+    def _c(self, coluna):
+        i = self._p.idx.get(coluna)
+        if i is None:
+            raise AttributeError(f"{coluna} fora da projeção '{self._p.nome}'")
+        return self._r[i]
+
+    def _data(self, pronta, coluna, converter):  # já convertida no SQL ou converte aqui
+        i = self._p.idx.get(pronta)
+        return self._r[i] if i is not None else converter(self._c(coluna))
+
+    id              = property(lambda s: s._c("id"))
+    tipo_ticket     = property(lambda s: s._c("tipo_ticket"))
+    status          = property(lambda s: s._c("status").lower())
+    responsavel_uid = property(lambda s: s._c("responsavel"))
+    responsavel     = property(lambda s: _user(s._c("responsavel"), s._nomes))
+    canal_id        = property(lambda s: s._c("canal_id"))
+    thread_ts       = property(lambda s: s._c("thread_ts"))
+    abertura        = property(lambda s: s._data("abertura_fmt", "data_abertura", _fmt))
+    fechamento      = property(lambda s: s._data("fechamento_fmt", "data_fechamento", _fmt))
+    abertura_raw    = property(lambda s: s._data("abertura_iso", "data_abertura", _to_iso))
+    fechamento_raw  = property(lambda s: s._data("fechamento_iso", "data_fechamento", _to_iso))
+    captura_raw     = property(lambda s: s._data("captura_iso", "data_captura", _to_iso))
+    sla             = property(lambda s: (s._c("sla_status") or "-").lower())
+    capturado_uid   = property(lambda s: s._c("capturado_por"))
+    capturado_por   = property(lambda s: _user(s._c("capturado_por"), s._nomes))
+    solicitante     = property(lambda s: _user(s._c("solicitante"), s._nomes))
+    mudou_tipo      = property(lambda s: bool(s._c("mudou_tipo")))
+
+    def __getitem__(self, campo: str):
+        try:
+            return getattr(self, campo)
+        except AttributeError:
+            raise KeyError(campo) from None
+
+    def __repr__(self):
+        return f"Chamado({self._p.nome}, id={self._r[self._p.idx['id']]})"
+
+
+def registros(rows, projecao: Projecao) -> list:
+    """Linhas do SELECT da projeção → Chamados, com os nomes do lote resolvidos de uma vez."""
+    nomes = get_real_names(r[i] for r in rows for i in projecao.uids) if projecao.uids else {}
+    return [Chamado(r, projecao, nomes) for r in rows]
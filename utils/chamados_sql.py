@@ -0,0 +1,424 @@
+"""
+Consultas de chamados, parametrizadas por tabela: a mesma lógica de filtros, busca,
+métricas, páginas, dashboards e exportação serve as duas bases (db_helpers, comercial;
+db_financeiro, financeiro), como utils.rollups e utils.schema.
+
+As colunas derivadas (mudou_tipo, busca) vêm de "python -m utils.schema aplicar".
+Numa base onde ele ainda não rodou, as consultas usam as expressões equivalentes
+(mesmo resultado, sem índice) e o log avisa – em vez de todo painel vir vazio.
+"""
+import time, datetime as dt
+
+from utils.db_pool import conexao
+from utils import rollups
+from utils.slack_helpers import get_real_names, buscar_usuarios
+from utils.schema import DICIONARIO_BUSCA, DERIVADAS, CAPTURA, garantir_funcoes
+from utils.chamado import PROJECOES, registros
+
+_REVER_DERIVADAS = 300.0   # s até conferir de novo colunas que faltavam
+
+# GROUPING(...) de cada conjunto → nome da série
+_SERIES = {15: "por_status", 23: "por_responsavel", 27: "por_tipo",
+           29: "por_solicitante", 30: "por_mes", 31: "kpis"}
+
+_EPOCA = dt.datetime(1970, 1, 1, tzinfo=dt.timezone.utc)
+_US    = dt.timedelta(microseconds=1)
+
+# Ordens de página: id (padrão), relevância (com busca) e abertura (painel geral,
+# que intercala as bases pela data). Fora a de id, a chave de ordenação vai no
+# cursor – "chave~id" – e o keyset compara com ela, sem reler o chamado do cursor
+# (que pode ter sumido ou deixado de casar com a busca).
+
+def _nome_ordem(busca, ordem: str) -> str:
+    return "relevancia" if busca else ordem
+
+def _ler_cursor(valor, nome: str):
+    """Cursor de página → (chave para o SQL, id); None se não serve para a ordem (→ topo)."""
+    if valor is None:
+        return None
+    chave, sep, id_ = str(valor).rpartition("~")
+    try:
+        if nome == "id":
+            return None, int(id_)
+        if not sep:
+            return None
+        if nome == "relevancia":
+            return float(chave), int(id_)
+        # abertura: µs desde 1970; vazio = sem data (fim da lista)
+        return ("-infinity" if not chave else _EPOCA + int(chave) * _US), int(id_)
+    except ValueError:
+        return None
+
+def _escrever_cursor(nome: str, chave, id_) -> str:
+    if nome == "id":
+        return str(id_)
+    if nome == "relevancia":
+        return f"{chave!r}~{id_}"
+    return f"{'' if chave is None else (chave - _EPOCA) // _US}~{id_}"
+
+def _chave_python(nome: str, chave, id_) -> tuple:  # mesma ordem do SQL, para intercalar
+    if nome == "abertura":
+        return (chave is not None, chave or _EPOCA, id_)
+    return (id_,) if nome == "id" else (chave, id_)
+
+def _instante(d) -> str:
+    """Placeholder de uma data de filtro: sem fuso é horário de São Paulo (o mesmo dia
+    dos rollups), independente do TimeZone da sessão."""
+    return "%s" if d.tzinfo else f"(%s::timestamp AT TIME ZONE '{rollups.FUSO}')"
+
+def _user(uid: str, nomes: dict):  # UID → nome real / placeholder
+    nome = nomes.get(uid)
+    return "<não capturado>" if not nome or nome.startswith(("U", "B", "W", "S")) else nome
+
+
+class ConsultasChamados:
+    """Consultas de uma tabela de chamados (uma instância por base)."""
+
+    def __init__(self, url: str, tabela: str, status_atendimento: str, status_finalizado: str):
+        self.url = url
+        self.tabela = tabela
+        self.status_atendimento = status_atendimento   # status do fluxo da base
+        self.status_finalizado = status_finalizado
+        self._derivadas = None        # colunas derivadas presentes na tabela
+        self._derivadas_em = 0.0
+        self._captura = False         # data_captura_ts criada (utils.schema.FUNCOES)
+
+    # ── colunas derivadas ───────────────────────────────────
+    def colunas_derivadas(self) -> set:
+        """Quais colunas de utils.schema.DERIVADAS a tabela já tem (conferido na partida).
+
+        Cria também as funções de utils.schema.FUNCOES que faltarem.
+        """
+        if self._derivadas is not None and (
+                (self._derivadas >= set(DERIVADAS) and self._captura) or
+                time.monotonic() - self._derivadas_em < _REVER_DERIVADAS):
+            return self._derivadas
+        try:
+            with conexao(self.url) as conn, conn.cursor() as cur:
+                if not self._captura:
+                    try:
+                        garantir_funcoes(cur)
+                        self._captura = True
+                    except Exception as e:   # sem permissão: SLA de captura fica de fora
+                        print("DB ERRO (funções):", e)
+                        conn.rollback()
+                cur.execute("""SELECT column_name FROM information_schema.columns
+                               WHERE table_schema = current_schema() AND table_name = %s
+                                 AND column_name = ANY(%s)""", [self.tabela, list(DERIVADAS)])
+                existentes = {r[0] for r in cur.fetchall()}
+        except Exception as e:
+            print("DB ERRO (colunas):", e)
+            return self._derivadas or set()
+        faltando = sorted(set(DERIVADAS) - existentes)
+        if faltando and existentes != self._derivadas:
+            print(f"SCHEMA AVISO ({self.tabela}): sem a(s) coluna(s) {', '.join(faltando)} – "
+                  "usando as expressões, sem índice. Rode: python -m utils.schema aplicar")
+        self._derivadas, self._derivadas_em = existentes, time.monotonic()
+        return existentes
+
+    def _col_captura(self) -> str:  # instante da captura, se a função de conversão existe
+        self.colunas_derivadas()
+        return CAPTURA if self._captura else "NULL::timestamptz"
+
+    def _col(self, nome: str) -> str:  # coluna derivada ou a expressão equivalente
+        return nome if nome in self.colunas_derivadas() else f"({DERIVADAS[nome][1]})"
+
+    # ── SQL ─────────────────────────────────────────────────
+    def _base_sql(self, projecao: str = "export", extras=()):
+        select = PROJECOES[projecao].select
+        if "mudou_tipo" in select:
+            select = [f"{self._col('mudou_tipo')} AS mudou_tipo" if c == "mudou_tipo" else c
+                      for c in select]
+        return f"SELECT {', '.join([*select, *extras])} FROM {self.tabela} WHERE true"
+
+    def _apply_filters(self, q: str, pr: list,
+                       *, status=None, resp=None, d_ini=None, d_fim=None,
+                       capturado=None, mudou_tipo=None, sla=None, tipo_ticket=None, busca=None):
+        if status:     q += " AND LOWER(status) = %s";  pr.append(status.lower())
+        if resp:       q += " AND responsavel=%s";      pr.append(resp)
+        if d_ini:      q += f" AND data_abertura >= {_instante(d_ini)}"; pr.append(d_ini)
+        if d_fim:      q += f" AND data_abertura < {_instante(d_fim)}";  pr.append(d_fim)
+        if capturado:  q += " AND capturado_por=%s";    pr.append(capturado)
+        if sla == "fora": q += " AND sla_status='fora'"
+        if tipo_ticket: q += " AND tipo_ticket=%s"; pr.append(tipo_ticket)
+        if mudou_tipo == "sim":   q += f" AND {self._col('mudou_tipo')}"   # coluna gerada (utils.schema)
+        elif mudou_tipo == "nao": q += f" AND NOT {self._col('mudou_tipo')}"
+        if busca:  # texto livre: tsvector (índice GIN) ou nome do solicitante no Slack
+            uids = buscar_usuarios(busca)
+            q += f" AND ({self._col('busca')} @@ websearch_to_tsquery('{DICIONARIO_BUSCA}', %s)"; pr.append(busca)
+            if uids: q += " OR solicitante = ANY(%s)"; pr.append(uids)
+            q += ")"
+        return q, pr
+
+    def _relevancia(self, busca: str):
+        """Expressão de relevância da busca (texto + solicitante) e seus parâmetros."""
+        expr = (f"(ts_rank({self._col('busca')}, websearch_to_tsquery('{DICIONARIO_BUSCA}', %s))::float8"
+                " + COALESCE(solicitante = ANY(%s), false)::int)")
+        return expr, [busca, buscar_usuarios(busca)]
+
+    # ── API pública ─────────────────────────────────────────
+    def contar_chamados(self, **filtros) -> int:
+        q = f"SELECT COUNT(*) FROM {self.tabela} WHERE true"
+        q, pr = self._apply_filters(q, [], **filtros)
+        try:
+            with conexao(self.url) as conn, conn.cursor() as cur:
+                cur.execute(q, pr)
+                return cur.fetchone()[0] or 0
+        except Exception as e:
+            print("DB ERRO (contar):", e)
+            return 0
+
+    def versao_dados(self) -> str:
+        """Sonda barata de mudança: maior id + contador de escritas do Postgres na tabela."""
+        q = f"""SELECT (SELECT MAX(id) FROM {self.tabela}),
+                       (SELECT n_tup_ins + n_tup_upd + n_tup_del FROM pg_stat_user_tables
+                        WHERE relid = '{self.tabela}'::regclass)"""
+        try:
+            with conexao(self.url) as conn, conn.cursor() as cur:
+                cur.execute(q)
+                return "%s:%s" % cur.fetchone()
+        except Exception as e:
+            print("DB ERRO (versao):", e)
+            return ""
+
+    def _sql_metricas(self, **filtros):
+        proprios = {k: filtros.pop(k, None) for k in ("status", "sla", "mudou_tipo")}
+        colunas, pr = [], []
+        for nome, f in (("total",          proprios),
+                        ("em_atendimento", {"status": self.status_atendimento}),
+                        ("finalizados",    {"status": self.status_finalizado}),
+                        ("fora_sla",       {"sla": "fora"}),
+                        ("mudaram_tipo",   {"mudou_tipo": "sim"})):
+            cond, pr = self._apply_filters("true", pr, **f)
+            colunas.append(f"COUNT(*) FILTER (WHERE {cond})")
+        q = f"SELECT {', '.join(colunas)} FROM {self.tabela} WHERE true"
+        return self._apply_filters(q, pr, **filtros)
+
+    def metricas_chamados(self, **filtros) -> dict:
+        """Métricas do painel numa única varredura (COUNT(*) FILTER).
+
+        O total respeita todos os filtros; as demais ignoram status, sla e mudou_tipo.
+        """
+        q, pr = self._sql_metricas(**filtros)
+        nomes = ("total", "em_atendimento", "finalizados", "fora_sla", "mudaram_tipo")
+        try:
+            with conexao(self.url) as conn, conn.cursor() as cur:
+                cur.execute(q, pr)
+                return dict(zip(nomes, cur.fetchone()))
+        except Exception as e:
+            print("DB ERRO (metricas):", e)
+            return dict.fromkeys(nomes, 0)
+
+    def _ordenacao(self, busca, ordem: str):
+        """(nome, expressão de ordenação, coluna devolvida como chave, parâmetros)."""
+        nome = _nome_ordem(busca, ordem)
+        if nome == "relevancia":
+            rel, pr = self._relevancia(busca)
+            return nome, rel, rel, pr
+        if nome == "abertura":   # sem data por último, na ida e na volta
+            return nome, "COALESCE(data_abertura, '-infinity')", "data_abertura", []
+        return nome, None, None, []
+
+    def _sql_chamados(self, *, limit=None, offset=None, apos=None, antes=None, projecao="export",
+                      ordem="id", **filtros):
+        """SELECT da projeção em ordem de página; apos/antes são cursores de carregar_pagina.
+
+        Fora a ordem por id, a chave de ordenação vem como última coluna.
+        """
+        nome, expr, coluna, pr_ordem = self._ordenacao(filtros.get("busca"), ordem)
+        apos, antes = _ler_cursor(apos, nome), _ler_cursor(antes, nome)
+        extras = [f"{coluna} AS chave_ordem"] if expr else []
+        q, pr = self._apply_filters(self._base_sql(projecao, extras),
+                                    list(pr_ordem) if expr else [], **filtros)
+        # keyset: (chave, id) ou só id
+        chave, valor = (f"({expr}, id)", "(%s, %s)") if expr else ("id", "%s")
+        ordenar = (lambda d: f" ORDER BY {expr} {d}, id {d}") if expr else (lambda d: f" ORDER BY id {d}")
+        cursor = lambda c: (pr_ordem + list(c)) if expr else [c[1]]
+        if antes is not None:  # página anterior: sobe a partir do cursor e inverte depois
+            q += f" AND {chave} > {valor}" + ordenar("ASC")
+            pr += cursor(antes) + pr_ordem
+        else:
+            if apos is not None:
+                q += f" AND {chave} < {valor}"
+                pr += cursor(apos)
+            q += ordenar("DESC")
+            pr += pr_ordem
+        if limit is not None:
+            q += f" LIMIT {limit}"
+        if offset: q += f" OFFSET {offset}"
+        return q, pr
+
+    def _linhas(self, *, antes=None, projecao="export", ordem="id", **kw):
+        """Linhas da projeção + a chave de ordenação de cada uma (None na ordem por id)."""
+        q, pr = self._sql_chamados(antes=antes, projecao=projecao, ordem=ordem, **kw)
+        preparo = PROJECOES[projecao].preparo
+        try:
+            with conexao(self.url) as conn, conn.cursor() as cur:
+                if preparo:
+                    cur.execute(preparo)
+                cur.execute(q, pr)
+                rows = cur.fetchall()
+        except Exception as e:
+            print("DB ERRO (fetch):", e); return [], []
+
+        nome = _nome_ordem(kw.get("busca"), ordem)
+        if _ler_cursor(antes, nome) is not None:
+            rows.reverse()
+        if nome != "id":
+            return [r[:-1] for r in rows], [r[-1] for r in rows]
+        return rows, [None] * len(rows)
+
+    def carregar_chamados(self, *, limit=None, offset=None, apos=None, antes=None, projecao="export",
+                          ordem="id", **filtros):
+        """Chamados (registros Chamado) com os campos da projeção: painel ou export."""
+        rows, _ = self._linhas(limit=limit, offset=offset, apos=apos, antes=antes,
+                               projecao=projecao, ordem=ordem, **filtros)
+        return registros(rows, PROJECOES[projecao])
+
+    def carregar_pagina(self, por_pagina: int, *, apos=None, antes=None, projecao="painel",
+                        ordem="id", **filtros) -> dict:
+        """Página por cursor (keyset): custo constante em qualquer profundidade.
+
+        apos=X traz os chamados depois do cursor X (próxima página); antes=X, os de antes.
+        A ordem é id desc; com busca, (relevância, id); com ordem="abertura",
+        (data de abertura, id), sem data por último.
+        Retorna os chamados, o cursor e a chave de ordenação de cada um (para intercalar
+        páginas de bases diferentes) e os cursores "anterior"/"proxima" (None quando não há).
+        """
+        nome = _nome_ordem(filtros.get("busca"), ordem)
+        if _ler_cursor(antes, nome) is None: antes = None
+        if _ler_cursor(apos, nome) is None: apos = None
+        rows, chaves = self._linhas(limit=por_pagina + 1, apos=apos, antes=antes,
+                                    projecao=projecao, ordem=ordem, **filtros)
+        chamados = registros(rows, PROJECOES[projecao])
+        cursores = [_escrever_cursor(nome, k, ch.id) for k, ch in zip(chaves, chamados)]
+        chaves = [_chave_python(nome, k, ch.id) for k, ch in zip(chaves, chamados)]
+        mais = len(chamados) > por_pagina
+        fatia = slice(1, None) if antes is not None else slice(None, por_pagina)
+        if antes is not None and not mais:  # voltou até o topo: mostra a primeira página cheia
+            return self.carregar_pagina(por_pagina, projecao=projecao, ordem=ordem, **filtros)
+        chamados, cursores, chaves = chamados[fatia], cursores[fatia], chaves[fatia]
+
+        tem_anterior = apos is not None or antes is not None
+        tem_proxima = antes is not None or mais
+        return {
+            "chamados": chamados,
+            "cursores": cursores,
+            "chaves":   chaves,
+            "anterior": cursores[0] if chamados and tem_anterior else None,
+            "proxima":  cursores[-1] if chamados and tem_proxima else None,
+        }
+
+    def _agregados_crus(self, **filtros):  # GROUPING SETS direto na tabela
+        sub, pr = self._apply_filters(f"""SELECT LOWER(status) AS st, responsavel, tipo_ticket, solicitante,
+                         date_trunc('month', data_abertura AT TIME ZONE '{rollups.FUSO}') AS mes,
+                         EXTRACT(EPOCH FROM {self._col_captura()} - data_abertura) / 3600 AS h_capt,
+                         EXTRACT(EPOCH FROM data_fechamento - data_abertura) / 3600 AS h_enc
+                  FROM {self.tabela} WHERE data_abertura IS NOT NULL""", [], **filtros)
+        q = f"""SELECT GROUPING(st, responsavel, tipo_ticket, solicitante, mes),
+                       st, responsavel, tipo_ticket, solicitante, mes,
+                       COUNT(*),
+                       COUNT(*) FILTER (WHERE st = 'aberto'),
+                       COUNT(*) FILTER (WHERE st = %s),
+                       AVG(h_capt) FILTER (WHERE h_capt BETWEEN 0 AND 336),
+                       AVG(h_enc)  FILTER (WHERE h_enc  BETWEEN 0 AND 336)
+                FROM ({sub}) t
+                GROUP BY GROUPING SETS ((st), (responsavel), (tipo_ticket), (solicitante), (mes), ())"""
+        try:
+            with conexao(self.url) as conn, conn.cursor() as cur:
+                cur.execute(q, [self.status_finalizado] + pr)
+                return cur.fetchall()
+        except Exception as e:
+            print("DB ERRO (dashboard):", e)
+            return None
+
+    def renovar_rollup(self):  # aquecimento: rollup em dia antes do primeiro dashboard
+        rollups.renovar(self.url, self.tabela, self.status_finalizado, esperar=True)
+
+    def agregados_dashboard(self, **filtros) -> dict:
+        """Séries e KPIs dos dashboards calculados no Postgres (GROUPING SETS, uma varredura).
+
+        SLA médio em horas, ignorando durações negativas ou acima de 14 dias.
+        Períodos longos leem os rollups diários (utils.rollups) quando eles existem.
+        """
+        res = {"kpis": {"total": 0, "abertos": 0, "fechados": 0,
+                        "sla_captura_h": 0.0, "sla_encerramento_h": 0.0},
+               "por_status": [], "por_responsavel": [], "por_tipo": [],
+               "por_solicitante": [], "por_mes": []}
+        rows = None
+        if rollups.cobre(**filtros):
+            rows = rollups.consultar(self.url, self.tabela, self.status_finalizado, **filtros)
+        if rows is None:
+            rows = self._agregados_crus(**filtros)
+        if rows is None:
+            return res
+
+        for g, st, resp, tipo, solic, mes, n, abertos, fechados, h_capt, h_enc in rows:
+            serie = _SERIES.get(g)
+            if serie == "kpis":
+                res["kpis"] = {"total": n, "abertos": abertos, "fechados": fechados,
+                               "sla_captura_h": round(float(h_capt or 0), 2),
+                               "sla_encerramento_h": round(float(h_enc or 0), 2)}
+            elif serie == "por_mes":
+                if mes is not None:
+                    res[serie].append({"chave": mes.strftime("%Y-%m"), "total": n})
+            elif serie:
+                chave = {"por_status": st, "por_responsavel": resp,
+                         "por_tipo": tipo, "por_solicitante": solic}[serie]
+                res[serie].append({"chave": chave, "total": n})
+
+        nomes = get_real_names(i["chave"] for s in ("por_responsavel", "por_solicitante")
+                               for i in res[s])
+        for s in ("por_responsavel", "por_solicitante"):
+            for i in res[s]:
+                i["nome"] = _user(i["chave"], nomes)
+        for s in ("por_status", "por_responsavel", "por_tipo", "por_solicitante"):
+            res[s].sort(key=lambda i: (-i["total"], str(i["chave"])))   # empates: mesma ordem no rollup e na tabela
+        res["por_mes"].sort(key=lambda i: i["chave"])
+        return res
+
+    def iterar_chamados(self, lote: int = 2000, projecao: str = "export", **filtros):
+        """Gera os chamados em lotes a partir de um cursor no servidor (memória constante).
+
+        Diferente das outras consultas, erros sobem para quem consome.
+        """
+        q, pr = self._apply_filters(self._base_sql(projecao), [], **filtros)
+        q += " ORDER BY id DESC"
+        preparo = PROJECOES[projecao].preparo
+        try:
+            # exportação: segura a conexão o arquivo inteiro, na cota de fundo do pool
+            with conexao(self.url, fundo=True) as conn, conn.cursor(name="iterar_chamados") as cur:
+                if preparo:
+                    with conn.cursor() as prep:
+                        prep.execute(preparo)
+                cur.itersize = lote
+                cur.execute(q, pr)
+                while True:
+                    rows = cur.fetchmany(lote)
+                    if not rows:
+                        break
+                    yield registros(rows, PROJECOES[projecao])
+        except Exception as e:
+            print("DB ERRO (iterar):", e)
+            raise  # arquivo truncado em silêncio seria pior que a falha
+
+    def listar_facetas(self):
+        """Responsáveis, capturadores e tipos distintos numa única varredura (None em erro)."""
+        q = f"""SELECT GROUPING(responsavel, capturado_por, tipo_ticket),
+                      responsavel, capturado_por, tipo_ticket
+               FROM {self.tabela}
+               GROUP BY GROUPING SETS ((responsavel), (capturado_por), (tipo_ticket))"""
+        res = {"responsaveis": set(), "capturadores": set(), "tipos": set()}
+        try:
+            with conexao(self.url) as conn, conn.cursor() as cur:
+                cur.execute(q)
+                for g, resp, capt, tipo in cur.fetchall():
+                    serie, valor = {3: ("responsaveis", resp),
+                                    5: ("capturadores", capt),
+                                    6: ("tipos", tipo)}[g]
+                    if valor:
+                        res[serie].add(valor)
+        except Exception as e:
+            print("DB ERRO (facetas):", e)
+            return None
+        return {k: sorted(v) for k, v in res.items()}
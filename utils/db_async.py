@@ -0,0 +1,18 @@
+"""
+Consultas síncronas (psycopg2) fora do event loop, num executor limitado.
+"""
+import os, asyncio, contextvars, functools
+from concurrent.futures import ThreadPoolExecutor
+
+# Mesmo tamanho do pool. Exportações, facetas, rollups e aquecimento rodam em threads
+# próprias e usam a cota de fundo do pool (utils.db_pool): com ela cheia, as
+# requisições contam com DB_POOL_MAX - DB_POOL_FUNDO conexões e podem esperar vaga.
+_WORKERS = int(os.getenv("DB_EXECUTOR_WORKERS", os.getenv("DB_POOL_MAX", "10")))
+_executor = ThreadPoolExecutor(max_workers=_WORKERS, thread_name_prefix="db")
+
+async def rodar(fn, *args, **kwargs):
+    """Executa fn(*args, **kwargs) no executor do banco sem bloquear o loop."""
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(
+        _executor, functools.partial(ctx.run, fn, *args, **kwargs))
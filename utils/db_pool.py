@@ -0,0 +1,210 @@
+"""
+Pool de conexões Postgres – um por URL, compartilhado por db_helpers e db_financeiro.
+
+Trabalho de fundo (exportações, renovação de facetas e rollups, aquecimento) pega
+conexão de uma cota de DB_POOL_FUNDO: as outras DB_POOL_MAX - DB_POOL_FUNDO ficam
+sempre para as requisições, por mais exportações que estejam rodando.
+"""
+import os, time, threading, contextvars
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2 import pool as pg_pool
+
+from utils.instrumentacao import CursorMedido
+
+_MIN       = int(os.getenv("DB_POOL_MIN", "1"))
+_MAX       = int(os.getenv("DB_POOL_MAX", "10"))
+_TIMEOUT   = float(os.getenv("DB_POOL_TIMEOUT", "30"))     # s esperando vaga
+_CHECK_IDLE = float(os.getenv("DB_POOL_CHECK_IDLE", "30"))  # ociosa há mais que isso → SELECT 1
+_MAX_AGE   = float(os.getenv("DB_POOL_MAX_AGE", "1800"))    # recicla conexões velhas
+_FUNDO     = max(1, min(_MAX - 1, int(os.getenv("DB_POOL_FUNDO", str(max(1, _MAX // 3))))))
+
+_fundo = contextvars.ContextVar("db_fundo", default=False)
+
+_ERROS_CONEXAO = (psycopg2.OperationalError, psycopg2.InterfaceError)
+
+
+class _Pool:
+    """Até _MAX conexões por URL. As devolvidas ficam ociosas (todas, até _MAX) e são
+    reaproveitadas da mais recente para a mais antiga; só se abre conexão nova quando
+    não há nenhuma ociosa."""
+
+    def __init__(self, url: str):
+        self.url = url
+        self._vagas = threading.BoundedSemaphore(_MAX)
+        self._cota = threading.BoundedSemaphore(_FUNDO)   # das _MAX, as do trabalho de fundo
+        self._lock = threading.Lock()
+        self._ociosas = []       # pilha: a última devolvida sai primeiro
+        self._meta = {}          # conn → [criada_em, devolvida_em] (só das abertas)
+        self.em_uso = 0
+        self.fundo_em_uso = 0
+        self.fundo_esperas = 0
+        self.esperas = 0
+        self.espera_total = 0.0
+        self.abertas = 0
+        self.recicladas = 0
+        for _ in range(min(_MIN, _MAX)):   # aquecidas na criação, como antes
+            self._ociosas.append(self._conectar())
+
+    def _conectar(self):
+        conn = psycopg2.connect(self.url, cursor_factory=CursorMedido)
+        agora = time.monotonic()
+        with self._lock:
+            self._meta[conn] = [agora, agora]
+            self.abertas += 1
+        return conn
+
+    # ── saúde ────────────────────────────────────────────────
+    def _saudavel(self, conn) -> bool:
+        if conn.closed:
+            return False
+        agora = time.monotonic()
+        criada, devolvida = self._meta[conn]
+        if agora - criada > _MAX_AGE:
+            return False
+        if agora - devolvida > _CHECK_IDLE:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT 1")
+                conn.rollback()
+            except _ERROS_CONEXAO:
+                return False
+        return True
+
+    def _descartar(self, conn):
+        with self._lock:
+            self._meta.pop(conn, None)
+            self.recicladas += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    # ── empréstimo ───────────────────────────────────────────
+    def obter(self, fundo: bool = False):
+        if fundo:
+            if not self._cota.acquire(blocking=False):
+                with self._lock:
+                    self.fundo_esperas += 1
+                if not self._cota.acquire(timeout=_TIMEOUT):
+                    raise pg_pool.PoolError("cota de fundo do pool esgotada (timeout)")
+            try:
+                conn = self.obter()
+            except Exception:
+                self._cota.release()
+                raise
+            with self._lock:
+                self.fundo_em_uso += 1
+            return conn
+        if not self._vagas.acquire(blocking=False):
+            t0 = time.monotonic()
+            ok = self._vagas.acquire(timeout=_TIMEOUT)
+            with self._lock:
+                self.esperas += 1
+                self.espera_total += time.monotonic() - t0
+            if not ok:
+                raise pg_pool.PoolError("pool esgotado (timeout)")
+        try:
+            while True:
+                with self._lock:
+                    conn = self._ociosas.pop() if self._ociosas else None
+                if conn is None:
+                    conn = self._conectar()
+                    break
+                if self._saudavel(conn):
+                    break
+                self._descartar(conn)
+        except Exception:
+            self._vagas.release()
+            raise
+        with self._lock:
+            self.em_uso += 1
+        return conn
+
+    def devolver(self, conn, quebrada: bool = False, fundo: bool = False):
+        if fundo:
+            with self._lock:
+                self.fundo_em_uso -= 1
+            self._cota.release()
+        try:
+            if quebrada or conn.closed:
+                self._descartar(conn)
+            else:
+                with self._lock:
+                    self._meta[conn][1] = time.monotonic()
+                    self._ociosas.append(conn)
+        finally:
+            with self._lock:
+                self.em_uso -= 1
+            self._vagas.release()
+
+    def estatisticas(self) -> dict:
+        return {
+            "em_uso":          self.em_uso,
+            "ociosas":         len(self._ociosas),
+            "min":             _MIN,
+            "max":             _MAX,
+            "fundo_em_uso":    self.fundo_em_uso,
+            "fundo_max":       _FUNDO,
+            "fundo_esperas":   self.fundo_esperas,
+            "esperas":         self.esperas,
+            "espera_total_ms": round(self.espera_total * 1000, 1),
+            "abertas":         self.abertas,      # conexões novas desde a partida
+            "recicladas":      self.recicladas,   # fechadas: velhas, quebradas ou sem resposta
+        }
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def _get_pool(url: str) -> _Pool:
+    p = _pools.get(url)
+    if p is None:
+        with _pools_lock:
+            p = _pools.get(url)
+            if p is None:
+                p = _pools[url] = _Pool(url)
+    return p
+
+@contextmanager
+def segundo_plano():
+    """Marca o trabalho que não responde a uma requisição: as conexões que ele pedir
+    (nesta thread/contexto) saem da cota de fundo."""
+    token = _fundo.set(True)
+    try:
+        yield
+    finally:
+        _fundo.reset(token)
+
+@contextmanager
+def conexao(url: str, fundo: bool = False):
+    """Empresta uma conexão do pool: commit no sucesso, rollback no erro.
+
+    Conexões que falham por erro de rede/servidor são descartadas, não devolvidas.
+    fundo=True (ou dentro de segundo_plano()) usa a cota de fundo.
+    """
+    p = _get_pool(url)
+    fundo = fundo or _fundo.get()
+    conn = p.obter(fundo)
+    quebrada = False
+    try:
+        yield conn
+        conn.commit()
+    except BaseException as e:  # inclui GeneratorExit de consumidores que param no meio
+        quebrada = isinstance(e, _ERROS_CONEXAO)
+        if not conn.closed:
+            try:
+                conn.rollback()
+            except _ERROS_CONEXAO:
+                quebrada = True
+        raise
+    finally:
+        p.devolver(conn, quebrada, fundo)
+
+def estatisticas(nomes: dict = None) -> dict:
+    """Estatísticas de cada pool, para monitoramento: pelo nome dado à URL (nomes), nunca
+    por host/banco."""
+    nomes = nomes or {}
+    return {nomes.get(url, f"pool{i}"): p.estatisticas()
+            for i, (url, p) in enumerate(list(_pools.items()), 1)}
@@ -0,0 +1,166 @@
+"""
+Exportações em segundo plano – jobs num pool limitado, arquivos prontos em cache no disco.
+
+O id do job é a chave do cache (base, filtros normalizados, formato, versão dos dados):
+pedidos iguais enquanto os dados não mudam compartilham o mesmo arquivo e o mesmo job.
+
+Com vários workers, o estado de cada job é publicado no cache compartilhado: o
+polling que cai em outro worker enxerga o progresso, e um pedido igual não
+dispara outro job enquanto o primeiro der sinal de vida.
+"""
+import os, json, time, hashlib, tempfile, threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from utils.cache_compartilhado import cache_compartilhado
+from utils.db_pool import segundo_plano
+
+_DIR       = Path(os.getenv("EXPORT_CACHE_DIR", Path(tempfile.gettempdir()) / "painel-exports"))
+_WORKERS   = int(os.getenv("EXPORT_WORKERS", "2"))
+_MAX_BYTES = int(os.getenv("EXPORT_CACHE_MAX_MB", "500")) * 2**20
+_MAX_IDADE = int(os.getenv("EXPORT_CACHE_MAX_IDADE", "86400"))   # s
+# s sem publicar até um job de outro worker ser dado como morto (gerando publica a cada lote)
+_VIDA      = {"fila": 900.0, "gerando": 120.0}
+
+_executor = ThreadPoolExecutor(max_workers=_WORKERS, thread_name_prefix="export")
+_jobs = {}
+_lock = threading.Lock()
+
+
+class Job:
+    def __init__(self, chave: str, formato: str, nome: str):
+        self.id = chave
+        self.formato = formato
+        self.nome = nome                       # nome do arquivo para download
+        self.caminho = _DIR / f"{chave}.{formato}"
+        self.status = "fila"                   # fila → gerando → pronto | erro
+        self.linhas = 0
+        self.total = None
+        self.erro = None
+        self.criado_em = time.time()
+        self._publicado_em = 0.0
+
+    def como_dict(self) -> dict:
+        progresso = 100 if self.status == "pronto" else (
+            min(99, int(100 * self.linhas / self.total)) if self.total else 0)
+        return {"id": self.id, "status": self.status, "linhas": self.linhas,
+                "total": self.total, "progresso": progresso, "erro": self.erro}
+
+    def publicar(self, forcar: bool = False):
+        """Estado para os outros workers; no máximo 1x/s, salvo mudança de status."""
+        agora = time.monotonic()
+        if not forcar and agora - self._publicado_em < 1.0:
+            return
+        self._publicado_em = agora
+        cache_compartilhado.set("export_jobs", self.id,
+                                {"formato": self.formato, "nome": self.nome, "criado_em": self.criado_em,
+                                 **self.como_dict()},
+                                _VIDA.get(self.status, _MAX_IDADE))
+
+    @classmethod
+    def publicado(cls, chave: str):
+        """Job de outro worker, como ele publicou por último (ou None)."""
+        achou, d = cache_compartilhado.get("export_jobs", chave)
+        if not achou:
+            return None
+        job = cls(chave, d["formato"], d["nome"])
+        job.status, job.linhas, job.total, job.erro = d["status"], d["linhas"], d["total"], d["erro"]
+        job.criado_em = d["criado_em"]
+        return job
+
+
+def chave(base: str, filtros: dict, formato: str, versao: str) -> str:
+    normal = {k: str(v) for k, v in filtros.items() if v not in (None, "")}
+    bruto = json.dumps([base, normal, formato, versao], sort_keys=True)
+    return hashlib.sha256(bruto.encode()).hexdigest()[:32]
+
+
+def submeter(chave: str, formato: str, nome: str, produzir) -> Job:
+    """Agenda produzir(caminho, job) – ou devolve o job/arquivo já existente para a chave."""
+    with _lock:
+        job = _jobs.get(chave)
+        if job and (job.status in ("fila", "gerando")
+                    or job.status == "pronto" and job.caminho.exists()):
+            return job
+        outro = Job.publicado(chave)           # em andamento noutro worker (e vivo: ver _VIDA)
+        if outro and outro.status in ("fila", "gerando"):
+            return outro
+        job = _jobs[chave] = Job(chave, formato, nome)
+        if job.caminho.exists():               # gerado antes (outro processo/reinício)
+            os.utime(job.caminho)
+            job.status = "pronto"
+            return job
+    job.publicar(forcar=True)
+    _executor.submit(_rodar, job, produzir)
+    return job
+
+
+def obter(job_id: str):
+    return _jobs.get(job_id) or Job.publicado(job_id)
+
+
+def _rodar(job: Job, produzir):
+    job.status = "gerando"
+    job.publicar(forcar=True)
+    _DIR.mkdir(parents=True, exist_ok=True)
+    # um por processo: se dois workers gerarem a mesma chave, o os.replace final decide
+    parcial = job.caminho.with_name(f"{job.caminho.name}.{os.getpid()}.parcial")
+    try:
+        with segundo_plano():   # cota de fundo do pool: o painel não espera exportação
+            produzir(parcial, job)
+        os.replace(parcial, job.caminho)
+        job.status = "pronto"
+    except Exception as e:
+        print("EXPORT ERRO:", e)
+        job.status, job.erro = "erro", str(e)
+        parcial.unlink(missing_ok=True)
+    finally:
+        job.publicar(forcar=True)
+        _despejar()
+
+
+def _orfao(parcial: Path, st, agora: float) -> bool:
+    """{chave}.{formato}.{pid}.parcial cujo processo não existe mais (ou velho demais)."""
+    if agora - st.st_mtime > _MAX_IDADE:     # pid pode ter sido reaproveitado
+        return True
+    try:
+        os.kill(int(parcial.name.rsplit(".", 2)[-2]), 0)
+    except (ValueError, ProcessLookupError):
+        return True
+    except PermissionError:                  # existe, de outro usuário
+        pass
+    return False
+
+
+def _despejar():
+    """Remove arquivos mais velhos que o limite e, depois, os menos usados até caber no tamanho.
+    Também os .parcial de processos que morreram no meio de um job."""
+    agora = time.time()
+    arquivos = []
+    for p in _DIR.glob("*.*"):
+        if p.suffix not in (".csv", ".xlsx", ".parcial"):
+            continue
+        try:
+            st = p.stat()
+        except FileNotFoundError:
+            continue
+        if p.suffix == ".parcial":
+            if _orfao(p, st, agora):
+                p.unlink(missing_ok=True)
+            continue
+        if agora - st.st_mtime > _MAX_IDADE:
+            p.unlink(missing_ok=True)
+        else:
+            arquivos.append((st.st_mtime, st.st_size, p))
+
+    total = sum(a[1] for a in arquivos)
+    for _, tamanho, p in sorted(arquivos, key=lambda a: a[0]):
+        if total <= _MAX_BYTES:
+            break
+        p.unlink(missing_ok=True)
+        total -= tamanho
+
+    with _lock:
+        for k in [k for k, j in _jobs.items()
+                  if j.status in ("pronto", "erro") and agora - j.criado_em > _MAX_IDADE]:
+            del _jobs[k]
@@ -0,0 +1,102 @@
+"""
+Opções dos filtros do painel (responsáveis, capturadores, tipos) já com os nomes
+do Slack resolvidos – uma instância por base, renovada em segundo plano.
+
+A lista é recarregada quando passa o TTL ou quando a versão dos dados da tabela
+muda (sondada no máximo a cada FACETAS_SONDA s); enquanto isso o painel recebe
+a cópia atual sem tocar no banco nem no Slack.
+
+A lista carregada vai para o cache compartilhado: os outros workers a adotam em
+vez de recarregar, e a renovação fica com quem pegar a trava.
+"""
+import os, time, threading
+
+from utils import db_helpers, db_financeiro
+from utils.cache_compartilhado import cache_compartilhado
+from utils.db_pool import segundo_plano
+from utils.slack_helpers import get_real_names
+
+_TTL   = float(os.getenv("FACETAS_TTL", "600"))    # s
+_SONDA = float(os.getenv("FACETAS_SONDA", "30"))   # s entre sondagens de versão
+
+
+class Facetas:
+    def __init__(self, db):
+        self.db = db
+        self._chave = db.__name__
+        self._dados = None          # {"responsaveis": [(uid, nome)], "capturadores": [...], "tipos": [...]}
+        self._versao = None
+        self._carregado_em = 0.0
+        self._sondado_em = 0.0
+        self._lock = threading.Lock()
+        self._renovando = False
+
+    def carregar(self) -> bool:
+        versao = self.db.versao_dados()
+        brutas = self.db.listar_facetas()
+        if brutas is None:
+            return False
+        nomes = get_real_names(brutas["responsaveis"] + brutas["capturadores"])
+
+        def rotular(uids):
+            pares = [(u, nomes.get(u) if nomes.get(u) != "<não capturado>" else u) for u in uids]
+            return sorted(pares, key=lambda p: p[1].lower())
+
+        self._dados = {                                    # troca atômica
+            "responsaveis": rotular(brutas["responsaveis"]),
+            "capturadores": rotular(brutas["capturadores"]),
+            "tipos":        brutas["tipos"],
+        }
+        self._versao = versao
+        self._carregado_em = self._sondado_em = time.monotonic()
+        cache_compartilhado.set("facetas", self._chave, (versao, self._dados), _TTL)
+        return True
+
+    def _adotar(self, versao=None) -> bool:
+        """Usa a lista de outro worker, se houver (e for da versão pedida)."""
+        achou, item = cache_compartilhado.get("facetas", self._chave)
+        if not achou or versao is not None and item[0] != versao:
+            return False
+        self._versao, self._dados = item
+        self._carregado_em = self._sondado_em = time.monotonic()
+        return True
+
+    def _renovar_fundo(self):  # thread de renovação: cota de fundo do pool
+        with segundo_plano():
+            self._renovar()
+
+    def _renovar(self):
+        try:
+            self._sondado_em = time.monotonic()
+            vencido = self._sondado_em - self._carregado_em > _TTL
+            versao = self.db.versao_dados()
+            if not vencido and versao == self._versao:
+                return
+            if self._adotar(versao):
+                return
+            trava = f"facetas:{self._chave}"
+            if cache_compartilhado.travar(trava, 60):   # os outros adotam na próxima sonda
+                try:
+                    self.carregar()
+                finally:
+                    cache_compartilhado.liberar(trava)
+        finally:
+            self._renovando = False
+
+    def obter(self) -> dict:
+        """Cópia atual; a primeira chamada carrega, as demais só agendam renovação."""
+        if self._dados is None:
+            with self._lock:
+                if self._dados is None and not (self._adotar() or self.carregar()):
+                    return {"responsaveis": [], "capturadores": [], "tipos": []}
+        elif time.monotonic() - self._sondado_em > _SONDA:
+            with self._lock:
+                if self._renovando:
+                    return self._dados
+                self._renovando = True
+            threading.Thread(target=self._renovar_fundo, daemon=True, name="facetas").start()
+        return self._dados
+
+
+facetas_comercial = Facetas(db_helpers)
+facetas_financeiro = Facetas(db_financeiro)
@@ -0,0 +1,67 @@
+"""
+Filtros do painel → argumentos das consultas (status, responsável, datas, busca...).
+
+Um único lugar para a normalização: os painéis e as exportações (diretas e em
+job) recebem os mesmos parâmetros da URL e precisam filtrar exatamente igual;
+/api/dashboards usa as mesmas datas e opções.
+"""
+import datetime as dt
+
+BUSCA_MAX = 200   # caracteres considerados do texto livre
+
+# rótulo da tela → status gravado em cada base
+STATUS = {
+    "comercial":  {"Aberto": "aberto", "Em Atendimento": "em análise",
+                   "Finalizado": "fechado", "Cancelado": "cancelado", "Todos": None},
+    "financeiro": {"Aberto": "aberto", "Em Atendimento": "em atendimento",
+                   "Finalizado": "finalizado", "Cancelado": "cancelado", "Todos": None},
+}
+
+
+def _opcao(valor):
+    return None if valor in (None, "", "Todos") else valor
+
+
+def _data(valor, dias=0):
+    if not valor:
+        return None
+    try:
+        return dt.datetime.strptime(valor, "%Y-%m-%d") + dt.timedelta(days=dias)
+    except ValueError:
+        return None
+
+
+def normalizar_busca(q):
+    """Texto livre aparado e truncado; vazio → None (sem filtro)."""
+    return (q or "").strip()[:BUSCA_MAX] or None
+
+
+def filtros_painel(base: str, status=None, responsavel=None, capturado=None, mudou_tipo=None,
+                   data_ini=None, data_fim=None, sla=None, tipo=None, q=None) -> dict:
+    """Parâmetros da URL → kwargs de db_helpers/db_financeiro (consultas e exportação)."""
+    rotulos = STATUS[base]
+    # aceita o rótulo da tela ou o valor gravado (links antigos de exportação)
+    status = rotulos.get(status, status if status in rotulos.values() else None)
+    return {
+        "status":      status,
+        "resp":        _opcao(responsavel),
+        "capturado":   _opcao(capturado),
+        "mudou_tipo":  _opcao(mudou_tipo),
+        "sla":         _opcao(sla),
+        "tipo_ticket": _opcao(tipo),
+        "busca":       normalizar_busca(q),        # texto livre (tsvector + solicitante)
+        "d_ini":       _data(data_ini),
+        "d_fim":       _data(data_fim, dias=1),    # fim inclusivo
+    }
+
+
+def filtros_dashboard(status=None, responsavel=None, data_ini=None, data_fim=None, tipo=None) -> dict:
+    """Parâmetros de /api/dashboards. O status chega como gravado (a chave dos gráficos),
+    não como rótulo da tela, e vale para qualquer base."""
+    return {
+        "status":      _opcao(status),
+        "resp":        _opcao(responsavel),
+        "tipo_ticket": _opcao(tipo),
+        "d_ini":       _data(data_ini),
+        "d_fim":       _data(data_fim, dias=1),    # fim inclusivo
+    }
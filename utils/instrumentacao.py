@@ -0,0 +1,250 @@
+"""
+Instrumentação por requisição: tempo e número de chamadas ao Postgres, ao Slack e
+à renderização de templates.
+
+O middleware abre um registro por requisição (contextvar, que rodar() e o
+threadpool do Starlette propagam) e o devolve no cabeçalho Server-Timing:
+
+    Server-Timing: db;dur=41.2;desc="6 chamadas", slack;dur=3.0;desc="1 chamadas",
+                   tpl;dur=12.5;desc="1 chamadas", app;dur=61.0
+
+Os tempos de uma categoria são somados – chamadas em paralelo podem passar do
+total. Ao fim da resposta (inclusive corpos em streaming) tudo é agregado por
+rota em /metrics, no formato texto do Prometheus. O que roda fora de requisição
+(threads de renovação de facetas, jobs de exportação) entra na rota
+"(segundo plano)". Consultas acima de DB_CONSULTA_LENTA_MS vão para o log com
+o SQL normalizado. As métricas são por processo.
+"""
+import os, re, time, threading, contextvars
+from contextlib import contextmanager
+
+import psycopg2.extensions
+from fastapi.templating import Jinja2Templates
+
+_LENTA_S = float(os.getenv("DB_CONSULTA_LENTA_MS", "500")) / 1000
+_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+_TIPOS = {"db": "db", "slack": "slack", "template": "tpl"}   # tipo → nome no Server-Timing
+_SEGUNDO_PLANO = "(segundo plano)"
+
+
+class _Requisicao:
+    __slots__ = ("inicio", "scope", "tempos", "chamadas", "_lock")
+
+    def __init__(self, scope):
+        self.inicio = time.perf_counter()
+        self.scope = scope
+        self.tempos = dict.fromkeys(_TIPOS, 0.0)
+        self.chamadas = dict.fromkeys(_TIPOS, 0)
+        self._lock = threading.Lock()      # consultas de um gather() em threads diferentes
+
+    def somar(self, tipo: str, duracao: float):
+        with self._lock:
+            self.tempos[tipo] += duracao
+            self.chamadas[tipo] += 1
+
+    @property
+    def rota(self) -> str:
+        # o template da rota (/exportar/jobs/{job_id}), não o caminho: cardinalidade fixa.
+        # O router do Starlette o grava no scope ao casar a rota.
+        return getattr(self.scope.get("route"), "path", None) or "(sem rota)"
+
+    def server_timing(self) -> str:
+        partes = [f'{_TIPOS[t]};dur={self.tempos[t] * 1000:.1f};desc="{n} chamadas"'
+                  for t, n in self.chamadas.items() if n]
+        partes.append(f"app;dur={(time.perf_counter() - self.inicio) * 1000:.1f}")
+        return ", ".join(partes)
+
+
+_atual = contextvars.ContextVar("instrumentacao", default=None)
+
+
+# ── Agregação ───────────────────────────────────────────────────
+class _Metricas:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.duracao = {}      # (rota, método) → [contagem por bucket, soma, n]
+        self.respostas = {}    # (rota, método, status) → n
+        self.deps = {}         # (rota, tipo) → [segundos, chamadas]
+        self.lentas = {}       # rota → n
+
+    def requisicao(self, rota: str, metodo: str, status: int, duracao: float, req: _Requisicao):
+        with self._lock:
+            h = self.duracao.setdefault((rota, metodo), [[0] * len(_BUCKETS), 0.0, 0])
+            for i, limite in enumerate(_BUCKETS):
+                if duracao <= limite:
+                    h[0][i] += 1
+            h[1] += duracao
+            h[2] += 1
+            chave = (rota, metodo, status)
+            self.respostas[chave] = self.respostas.get(chave, 0) + 1
+            for tipo, n in req.chamadas.items():
+                if n:
+                    d = self.deps.setdefault((rota, tipo), [0.0, 0])
+                    d[0] += req.tempos[tipo]
+                    d[1] += n
+
+    def dependencia(self, rota: str, tipo: str, duracao: float):
+        with self._lock:
+            d = self.deps.setdefault((rota, tipo), [0.0, 0])
+            d[0] += duracao
+            d[1] += 1
+
+    def lenta(self, rota: str):
+        with self._lock:
+            self.lentas[rota] = self.lentas.get(rota, 0) + 1
+
+    def exposicao(self) -> str:
+        with self._lock:
+            duracao = {k: (list(v[0]), v[1], v[2]) for k, v in self.duracao.items()}
+            respostas, deps, lentas = dict(self.respostas), dict(self.deps), dict(self.lentas)
+
+        linhas = ["# HELP painel_http_duracao_segundos Duração das requisições por rota.",
+                  "# TYPE painel_http_duracao_segundos histogram"]
+        for (rota, metodo), (buckets, soma, n) in sorted(duracao.items()):
+            rotulos = f'rota="{_esc(rota)}",metodo="{metodo}"'
+            for limite, c in zip(_BUCKETS, buckets):
+                linhas.append(f'painel_http_duracao_segundos_bucket{{{rotulos},le="{limite}"}} {c}')
+            linhas.append(f'painel_http_duracao_segundos_bucket{{{rotulos},le="+Inf"}} {n}')
+            linhas.append(f"painel_http_duracao_segundos_sum{{{rotulos}}} {soma:.6f}")
+            linhas.append(f"painel_http_duracao_segundos_count{{{rotulos}}} {n}")
+
+        linhas += ["# HELP painel_http_respostas_total Respostas por rota e status.",
+                   "# TYPE painel_http_respostas_total counter"]
+        for (rota, metodo, status), n in sorted(respostas.items()):
+            linhas.append(f'painel_http_respostas_total{{rota="{_esc(rota)}",metodo="{metodo}",'
+                          f'status="{status}"}} {n}')
+
+        linhas += ["# HELP painel_dependencia_segundos_total Tempo somado em db/slack/template por rota.",
+                   "# TYPE painel_dependencia_segundos_total counter"]
+        linhas += [f'painel_dependencia_segundos_total{{rota="{_esc(r)}",tipo="{t}"}} {v[0]:.6f}'
+                   for (r, t), v in sorted(deps.items())]
+        linhas += ["# HELP painel_dependencia_chamadas_total Chamadas a db/slack/template por rota.",
+                   "# TYPE painel_dependencia_chamadas_total counter"]
+        linhas += [f'painel_dependencia_chamadas_total{{rota="{_esc(r)}",tipo="{t}"}} {v[1]}'
+                   for (r, t), v in sorted(deps.items())]
+
+        linhas += ["# HELP painel_db_consultas_lentas_total Consultas acima de DB_CONSULTA_LENTA_MS.",
+                   "# TYPE painel_db_consultas_lentas_total counter"]
+        linhas += [f'painel_db_consultas_lentas_total{{rota="{_esc(r)}"}} {n}'
+                   for r, n in sorted(lentas.items())]
+        return "\n".join(linhas) + "\n"
+
+
+def _esc(valor: str) -> str:
+    return valor.replace("\\", "\\\\").replace('"', '\\"')
+
+
+_metricas = _Metricas()
+
+def exposicao() -> str:
+    """Métricas no formato texto do Prometheus (para /metrics)."""
+    return _metricas.exposicao()
+
+
+# ── Medição ─────────────────────────────────────────────────────
+def registrar(tipo: str, duracao: float):
+    req = _atual.get()
+    if req is not None:
+        req.somar(tipo, duracao)
+    else:
+        _metricas.dependencia(_SEGUNDO_PLANO, tipo, duracao)
+
+@contextmanager
+def medir(tipo: str):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        registrar(tipo, time.perf_counter() - t0)
+
+
+_RE_LITERAIS = re.compile(r"'(?:[^']|'')*'|%\(\w+\)s|%s|\b\d+(?:\.\d+)?\b")
+
+def normalizar(sql: str) -> str:
+    """SQL numa linha, com literais e parâmetros trocados por '?'."""
+    return _RE_LITERAIS.sub("?", " ".join(sql.split()))
+
+
+class CursorMedido(psycopg2.extensions.cursor):
+    """Cursor que mede cada ida ao banco (cursor_factory das conexões do pool).
+
+    Em cursores nomeados (server-side) o trabalho acontece nos fetch*, que também contam.
+    """
+
+    def _medir(self, fn, sql, *args):
+        t0 = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            duracao = time.perf_counter() - t0
+            registrar("db", duracao)
+            if duracao >= _LENTA_S:
+                self._lenta(sql, duracao)
+
+    def _lenta(self, sql, duracao):
+        sql = sql or self.query        # fetch* de cursor nomeado: o DECLARE
+        if not isinstance(sql, str):
+            sql = sql.decode() if isinstance(sql, bytes) else sql.as_string(self.connection)
+        req = _atual.get()
+        rota = req.rota if req else _SEGUNDO_PLANO
+        _metricas.lenta(rota)
+        print(f"DB LENTA ({duracao * 1000:.0f} ms, {rota}):", normalizar(sql))
+
+    def execute(self, query, vars=None):
+        return self._medir(super().execute, query, query, vars)
+
+    def executemany(self, query, vars_list):
+        return self._medir(super().executemany, query, query, vars_list)
+
+    def fetchone(self):
+        if not self.name:
+            return super().fetchone()
+        return self._medir(super().fetchone, None)
+
+    def fetchmany(self, size=None):
+        fetch = super().fetchmany
+        if not self.name:
+            return fetch() if size is None else fetch(size)
+        return self._medir(fetch, None, *(() if size is None else (size,)))
+
+    def fetchall(self):
+        if not self.name:
+            return super().fetchall()
+        return self._medir(super().fetchall, None)
+
+
+class TemplatesMedidos(Jinja2Templates):
+    def TemplateResponse(self, *args, **kwargs):
+        with medir("template"):
+            return super().TemplateResponse(*args, **kwargs)
+
+
+# ── Middleware ──────────────────────────────────────────────────
+class Instrumentacao:
+    """Middleware ASGI: Server-Timing em cada resposta e agregação por rota."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        req = _Requisicao(scope)
+        token = _atual.set(req)
+        status = 500
+
+        async def enviar(msg):
+            nonlocal status
+            if msg["type"] == "http.response.start":
+                status = msg["status"]
+                msg = dict(msg, headers=[*msg.get("headers", []),
+                                         (b"server-timing", req.server_timing().encode())])
+            await send(msg)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            _atual.reset(token)
+            _metricas.requisicao(req.rota, scope["method"], status,
+                                 time.perf_counter() - req.inicio, req)
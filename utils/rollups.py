@@ -0,0 +1,383 @@
+"""
+Rollups diários dos chamados – contagens e somas de SLA por dia/status/responsável/tipo/solicitante.
+
+Cada base (comercial, financeiro) guarda no próprio banco:
+  <tabela>_rollup_diario   uma linha por combinação de dimensões e dia de abertura (horário local)
+  <tabela>_rollup_estado   marca d'água: maior id e data_fechamento já consolidados
+
+A atualização incremental recalcula só os dias tocados desde a marca d'água (mais uma
+janela fixa dos últimos dias, para mudanças de status e capturas sem data própria).
+Cada condição é uma consulta sobre o seu índice (id, data_fechamento, data_abertura),
+unidas – nada de varrer a tabela. Roda em segundo plano, a cada ROLLUP_INTERVALO s,
+por um worker do nó de cada vez; o dashboard só lê. Chamados sem data_abertura ficam
+de fora dos rollups.
+
+O que a marca d'água não enxerga – chamados apagados, status/SLA/captura editados
+depois da janela – é corrigido pela verificação periódica (a cada ROLLUP_VERIFICACAO
+s, junto da atualização): compara o rollup inteiro com a tabela crua e recalcula
+só os dias divergentes.
+
+    python -m utils.rollups rebuild   [comercial|financeiro]
+    python -m utils.rollups atualizar [comercial|financeiro]
+    python -m utils.rollups verificar [comercial|financeiro]
+    python -m utils.rollups corrigir  [comercial|financeiro]
+"""
+import os, sys, time, threading
+from datetime import timedelta
+
+from utils.db_pool import conexao, segundo_plano
+from utils.schema import CAPTURA, garantir_funcoes
+from utils.cache_compartilhado import cache_compartilhado
+
+_JANELA_DIAS = int(os.getenv("ROLLUP_JANELA_DIAS", "7"))    # sempre recalculados
+_INTERVALO   = float(os.getenv("ROLLUP_INTERVALO", "60"))    # s entre atualizações (segundo plano)
+_MIN_DIAS    = int(os.getenv("ROLLUP_MIN_DIAS", "31"))       # períodos menores vão direto na tabela
+_MARGEM_MIN  = int(os.getenv("ROLLUP_MARGEM_MIN", "5"))      # recuo das marcas de data
+_VERIFICACAO = float(os.getenv("ROLLUP_VERIFICACAO", "21600"))  # s entre verificações completas
+
+# Filtros que as dimensões do rollup conseguem atender
+_FILTROS_ROLLUP = {"status", "resp", "tipo_ticket", "d_ini", "d_fim"}
+
+# Dia = dia civil de São Paulo, aqui e nas consultas cruas (chamados_sql): datas de
+# filtro sem fuso são meia-noite local, e os rollups só atendem dias inteiros.
+FUSO   = "America/Sao_Paulo"
+_LOCAL = f"AT TIME ZONE '{FUSO}'"
+
+def _ddl(tabela: str) -> str:
+    return f"""
+        CREATE TABLE IF NOT EXISTS {tabela}_rollup_diario (
+            dia          date    NOT NULL,
+            status       text,
+            responsavel  text,
+            tipo_ticket  text,
+            solicitante  text,
+            total        integer NOT NULL,
+            abertos      integer NOT NULL,
+            fechados     integer NOT NULL,
+            capt_soma_h  double precision NOT NULL,
+            capt_n       integer NOT NULL,
+            enc_soma_h   double precision NOT NULL,
+            enc_n        integer NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS {tabela}_rollup_diario_dia
+            ON {tabela}_rollup_diario (dia);
+        CREATE TABLE IF NOT EXISTS {tabela}_rollup_estado (
+            id              boolean PRIMARY KEY DEFAULT true CHECK (id),
+            max_id          bigint,
+            max_fechamento  timestamptz,
+            max_captura     timestamptz,    -- não usada: capturas entram pela janela
+            atualizado_em   timestamptz NOT NULL DEFAULT now(),
+            verificado_em   timestamptz
+        );"""
+
+def _migrar(cur, tabela: str):  # estado criado antes da verificação periódica; data_captura_ts
+    garantir_funcoes(cur)
+    cur.execute("""SELECT 1 FROM information_schema.columns
+                   WHERE table_schema = current_schema() AND table_name = %s
+                     AND column_name = 'verificado_em'""", [f"{tabela}_rollup_estado"])
+    if cur.fetchone() is None:
+        cur.execute(f"ALTER TABLE {tabela}_rollup_estado ADD COLUMN IF NOT EXISTS verificado_em timestamptz")
+
+def _agregar_sql(tabela: str, where: str) -> str:
+    """SELECT que produz as linhas do rollup a partir da tabela crua."""
+    return f"""
+        SELECT dia, st, responsavel, tipo_ticket, solicitante,
+               COUNT(*),
+               COUNT(*) FILTER (WHERE st = 'aberto'),
+               COUNT(*) FILTER (WHERE st = %s),
+               COALESCE(SUM(h_capt) FILTER (WHERE h_capt BETWEEN 0 AND 336), 0),
+               COUNT(*) FILTER (WHERE h_capt BETWEEN 0 AND 336),
+               COALESCE(SUM(h_enc) FILTER (WHERE h_enc BETWEEN 0 AND 336), 0),
+               COUNT(*) FILTER (WHERE h_enc BETWEEN 0 AND 336)
+        FROM (SELECT (data_abertura {_LOCAL})::date AS dia,
+                     LOWER(status) AS st, responsavel, tipo_ticket, solicitante,
+                     EXTRACT(EPOCH FROM {CAPTURA} - data_abertura) / 3600 AS h_capt,
+                     EXTRACT(EPOCH FROM data_fechamento - data_abertura) / 3600 AS h_enc
+              FROM {tabela}
+              WHERE data_abertura IS NOT NULL {where}) t
+        GROUP BY 1, 2, 3, 4, 5"""
+
+_COLUNAS = ("dia, status, responsavel, tipo_ticket, solicitante, total, abertos, fechados, "
+            "capt_soma_h, capt_n, enc_soma_h, enc_n")
+
+def _marcas_sql(tabela: str) -> str:
+    # Datas limitadas a now() (datas futuras não travam a marca) e recuadas uma margem,
+    # para pegar transações que gravaram antes de nós mas commitaram depois.
+    # MAX de coluna indexada: leitura da ponta do índice, sem varredura.
+    # Tabela vazia (ou sem fechamento): 0 / -infinity, para a marca seguinte pegar tudo.
+    margem = f"interval '{_MARGEM_MIN} minutes'"
+    return f"""SELECT COALESCE(MAX(id), 0),
+                      LEAST(COALESCE(MAX(data_fechamento), '-infinity'), now()) - {margem}
+               FROM {tabela}"""
+
+def _tocados_sql(tabela: str) -> str:
+    """Dias com algo novo desde a marca: um ramo por índice, em vez de um OR que varre tudo.
+    Marca NULL (estado gravado antes do COALESCE em _marcas_sql) vale como "desde o início"."""
+    return f"""SELECT DISTINCT (data_abertura {_LOCAL})::date
+               FROM (SELECT data_abertura FROM {tabela} WHERE id > COALESCE(%s, 0)
+                     UNION ALL
+                     SELECT data_abertura FROM {tabela}
+                     WHERE data_fechamento > COALESCE(%s::timestamptz, '-infinity')
+                     UNION ALL
+                     SELECT data_abertura FROM {tabela} WHERE data_abertura >= now() - %s) t
+               WHERE data_abertura IS NOT NULL"""
+
+_ARRED = ("dia, status, responsavel, tipo_ticket, solicitante, total, abertos, fechados, "
+          "ROUND(capt_soma_h::numeric, 4), capt_n, ROUND(enc_soma_h::numeric, 4), enc_n")
+
+def _divergencias_sql(tabela: str) -> str:
+    """('faltando'|'sobrando', linha) entre a agregação da tabela crua e o rollup."""
+    arred = _ARRED
+    return f"""WITH cru ({_COLUNAS}) AS ({_agregar_sql(tabela, "")}),
+                    a AS (SELECT {arred} FROM cru),
+                    b AS (SELECT {arred} FROM {tabela}_rollup_diario)
+               (SELECT 'faltando', * FROM (SELECT * FROM a EXCEPT ALL SELECT * FROM b) x)
+               UNION ALL
+               (SELECT 'sobrando', * FROM (SELECT * FROM b EXCEPT ALL SELECT * FROM a) y)"""
+
+def _dias_divergentes_sql(tabela: str) -> str:
+    """Dias em que rollup e tabela crua diferem, por resumo do dia (linhas + soma dos
+    hashes) – agregação por hash dos dois lados, sem ordenar as linhas como o EXCEPT."""
+    resumo = f"COUNT(*) AS n, SUM(hashtextextended(ROW({_ARRED})::text, 0)::numeric) AS h"
+    return f"""WITH cru ({_COLUNAS}) AS ({_agregar_sql(tabela, "")}),
+                    a AS (SELECT dia, {resumo} FROM cru GROUP BY dia),
+                    b AS (SELECT dia, {resumo} FROM {tabela}_rollup_diario GROUP BY dia)
+               SELECT dia FROM a FULL JOIN b USING (dia)
+               WHERE a.n IS DISTINCT FROM b.n OR a.h IS DISTINCT FROM b.h"""
+
+# ── escrita ─────────────────────────────────────────────────────
+def _recalcular(cur, tabela: str, status_finalizado: str, dias: list):
+    """Troca as linhas desses dias pela agregação atual da tabela crua."""
+    if not dias:
+        return
+    cur.execute(f"DELETE FROM {tabela}_rollup_diario WHERE dia = ANY(%s)", [dias])
+    where = f"""AND data_abertura >= (%s::date)::timestamp {_LOCAL}
+                AND data_abertura <  (%s::date + 1)::timestamp {_LOCAL}
+                AND (data_abertura {_LOCAL})::date = ANY(%s)"""
+    cur.execute(f"INSERT INTO {tabela}_rollup_diario ({_COLUNAS}) "
+                + _agregar_sql(tabela, where),
+                [status_finalizado, dias[0], dias[-1], dias])
+
+def rebuild(url: str, tabela: str, status_finalizado: str) -> int:
+    """Recria o rollup inteiro. Retorna o número de linhas gravadas."""
+    with conexao(url) as conn, conn.cursor() as cur:
+        cur.execute(_ddl(tabela))
+        _migrar(cur, tabela)
+        cur.execute(f"LOCK TABLE {tabela}_rollup_estado IN EXCLUSIVE MODE")
+        cur.execute(_marcas_sql(tabela))
+        max_id, max_fech = cur.fetchone()
+        cur.execute(f"TRUNCATE {tabela}_rollup_diario")
+        cur.execute(f"INSERT INTO {tabela}_rollup_diario ({_COLUNAS}) "
+                    + _agregar_sql(tabela, ""), [status_finalizado])
+        n = cur.rowcount
+        cur.execute(f"""INSERT INTO {tabela}_rollup_estado
+                            (id, max_id, max_fechamento, atualizado_em, verificado_em)
+                        VALUES (true, %s, %s, now(), now())
+                        ON CONFLICT (id) DO UPDATE SET
+                            max_id = EXCLUDED.max_id, max_fechamento = EXCLUDED.max_fechamento,
+                            atualizado_em = now(), verificado_em = now()""",
+                    [max_id, max_fech])
+    return n
+
+def atualizar(url: str, tabela: str, status_finalizado: str):
+    """Recalcula só os dias tocados desde a marca d'água. Retorna os dias ou None sem estado."""
+    with conexao(url) as conn, conn.cursor() as cur:
+        cur.execute("SELECT to_regclass(%s)", [f"{tabela}_rollup_estado"])
+        if cur.fetchone()[0] is None:
+            return None
+        _migrar(cur, tabela)
+        cur.execute(f"""SELECT max_id, max_fechamento
+                        FROM {tabela}_rollup_estado FOR UPDATE""")
+        estado = cur.fetchone()
+        if estado is None:
+            return None
+        max_id, max_fech = estado
+
+        cur.execute(_marcas_sql(tabela))
+        novo_id, novo_fech = cur.fetchone()
+
+        cur.execute(_tocados_sql(tabela), [max_id, max_fech, timedelta(days=_JANELA_DIAS)])
+        dias = sorted(r[0] for r in cur.fetchall())
+
+        _recalcular(cur, tabela, status_finalizado, dias)
+
+        cur.execute(f"""UPDATE {tabela}_rollup_estado
+                        SET max_id = %s, max_fechamento = %s, atualizado_em = now()""",
+                    [novo_id, novo_fech])
+    return dias
+
+def corrigir(url: str, tabela: str, status_finalizado: str, intervalo: float = None):
+    """Confere o rollup inteiro com a tabela crua e recalcula os dias divergentes.
+
+    Varre a tabela: em segundo plano só roda se a última verificação tiver mais de
+    intervalo s (a marca fica no estado, então vale para todos os nós). Retorna os
+    dias corrigidos, [] se não estava vencida, ou None sem estado.
+    """
+    with conexao(url) as conn, conn.cursor() as cur:
+        cur.execute("SELECT to_regclass(%s)", [f"{tabela}_rollup_estado"])
+        if cur.fetchone()[0] is None:
+            return None
+        _migrar(cur, tabela)
+        cur.execute(f"""SELECT verificado_em IS NULL OR verificado_em < now() - %s
+                        FROM {tabela}_rollup_estado FOR UPDATE""",
+                    [timedelta(seconds=intervalo or 0)])
+        vencida = cur.fetchone()
+        if vencida is None:
+            return None
+        if not vencida[0]:
+            return []
+        cur.execute(_dias_divergentes_sql(tabela), [status_finalizado])
+        dias = sorted(r[0] for r in cur.fetchall())
+        _recalcular(cur, tabela, status_finalizado, dias)
+        cur.execute(f"UPDATE {tabela}_rollup_estado SET verificado_em = now()")
+    return dias
+
+def verificar(url: str, tabela: str, status_finalizado: str) -> list:
+    """Compara o rollup com a agregação da tabela crua. Retorna as divergências."""
+    with conexao(url) as conn, conn.cursor() as cur:
+        cur.execute(_divergencias_sql(tabela) + " ORDER BY 2, 1", [status_finalizado])
+        return cur.fetchall()
+
+# ── leitura (dashboards) ────────────────────────────────────────
+_ultima_atualizacao = {}
+_construido = {}       # tabela → rollup existe (descoberto na última atualização)
+_rodando = set()
+_lock = threading.Lock()
+
+def _existe(url: str, tabela: str) -> bool:
+    with conexao(url) as conn, conn.cursor() as cur:
+        cur.execute("SELECT to_regclass(%s)", [f"{tabela}_rollup_estado"])
+        if cur.fetchone()[0] is None:
+            return False
+        cur.execute(f"SELECT 1 FROM {tabela}_rollup_estado")
+        return cur.fetchone() is not None
+
+def _renovar(url: str, tabela: str, status_finalizado: str):
+    trava = f"rollup:{tabela}"
+    try:
+        with segundo_plano():   # cota de fundo do pool
+            if cache_compartilhado.travar(trava, 600):   # um worker do nó por vez
+                try:
+                    _construido[tabela] = atualizar(url, tabela, status_finalizado) is not None
+                    if _construido[tabela]:
+                        dias = corrigir(url, tabela, status_finalizado, _VERIFICACAO)
+                        if dias:
+                            print(f"ROLLUP ({tabela}): {len(dias)} dia(s) corrigido(s) na verificação")
+                finally:
+                    cache_compartilhado.liberar(trava)
+            elif tabela not in _construido:
+                _construido[tabela] = _existe(url, tabela)
+    except Exception as e:
+        print("DB ERRO (rollup):", e)
+    finally:
+        with _lock:
+            _rodando.discard(tabela)
+
+def renovar(url: str, tabela: str, status_finalizado: str, esperar: bool = False):
+    """Atualização incremental se passou _INTERVALO s – numa thread, salvo esperar=True."""
+    with _lock:
+        if tabela in _rodando or \
+                time.monotonic() - _ultima_atualizacao.get(tabela, -_INTERVALO) < _INTERVALO:
+            return
+        _rodando.add(tabela)
+        _ultima_atualizacao[tabela] = time.monotonic()
+    if esperar:
+        _renovar(url, tabela, status_finalizado)
+    else:
+        threading.Thread(target=_renovar, args=(url, tabela, status_finalizado),
+                         daemon=True, name="rollup").start()
+
+def _dia_inteiro(d) -> bool:  # meia-noite sem fuso = início de um dia local
+    return d.tzinfo is None and (d.hour, d.minute, d.second, d.microsecond) == (0, 0, 0, 0)
+
+def cobre(**filtros) -> bool:
+    """O rollup atende esses filtros e o período é longo o bastante para valer a pena?"""
+    ativos = {k for k, v in filtros.items() if v}
+    if not ativos <= _FILTROS_ROLLUP:
+        return False
+    d_ini, d_fim = filtros.get("d_ini"), filtros.get("d_fim")
+    if not all(_dia_inteiro(d) for d in (d_ini, d_fim) if d):
+        return False
+    if d_ini and d_fim:
+        return (d_fim - d_ini).days >= _MIN_DIAS
+    return True
+
+def consultar(url: str, tabela: str, status_finalizado: str, **filtros):
+    """Linhas no mesmo formato do GROUPING SETS de agregados_dashboard, ou None
+    se o rollup ainda não foi construído (a chamada cai na tabela crua).
+
+    Só lê: a atualização vencida é agendada em segundo plano e o dashboard segue
+    com o rollup como está (atrasado no máximo ROLLUP_INTERVALO s e a duração dela).
+    """
+    renovar(url, tabela, status_finalizado)
+    if not _construido.get(tabela):
+        return None
+
+    q = f"""SELECT dia, status, responsavel, tipo_ticket, solicitante,
+                   total, abertos, fechados, capt_soma_h, capt_n, enc_soma_h, enc_n,
+                   date_trunc('month', dia)::date AS mes
+            FROM {tabela}_rollup_diario WHERE true"""
+    pr = []
+    if filtros.get("status"):      q += " AND status = LOWER(%s)"; pr.append(filtros["status"])
+    if filtros.get("resp"):        q += " AND responsavel = %s";   pr.append(filtros["resp"])
+    if filtros.get("tipo_ticket"): q += " AND tipo_ticket = %s";   pr.append(filtros["tipo_ticket"])
+    if filtros.get("d_ini"):       q += " AND dia >= %s";          pr.append(filtros["d_ini"].date())
+    if filtros.get("d_fim"):       q += " AND dia < %s";           pr.append(filtros["d_fim"].date())
+
+    q = f"""SELECT GROUPING(status, responsavel, tipo_ticket, solicitante, mes),
+                   status, responsavel, tipo_ticket, solicitante, mes,
+                   SUM(total), SUM(abertos), SUM(fechados),
+                   SUM(capt_soma_h) / NULLIF(SUM(capt_n), 0),
+                   SUM(enc_soma_h)  / NULLIF(SUM(enc_n), 0)
+            FROM ({q}) t
+            GROUP BY GROUPING SETS ((status), (responsavel), (tipo_ticket),
+                                    (solicitante), (mes), ())"""
+    try:
+        with conexao(url) as conn, conn.cursor() as cur:
+            cur.execute(q, pr)
+            return cur.fetchall()
+    except Exception as e:
+        print("DB ERRO (rollup):", e)
+        return None
+
+# ── CLI ─────────────────────────────────────────────────────────
+def _bases() -> dict:
+    from utils import db_helpers, db_financeiro
+    return {
+        "comercial":  (db_helpers._URL, "ordens_servico", db_helpers._STATUS_FINALIZADO),
+        "financeiro": (db_financeiro._URL, "ordens_servico_financeiro",
+                       db_financeiro._STATUS_FINALIZADO),
+    }
+
+def main(argv=None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] not in ("rebuild", "atualizar", "verificar", "corrigir"):
+        print(__doc__)
+        return 2
+    comando, nomes = argv[0], argv[1:]
+    bases = _bases()
+    falhou = False
+    for nome in nomes or list(bases):
+        url, tabela, status_fin = bases[nome]
+        t0 = time.monotonic()
+        if comando == "rebuild":
+            print(f"{nome}: {rebuild(url, tabela, status_fin)} linhas")
+        elif comando == "atualizar":
+            dias = atualizar(url, tabela, status_fin)
+            print(f"{nome}: sem estado, rode rebuild" if dias is None
+                  else f"{nome}: {len(dias)} dia(s) recalculado(s)")
+        elif comando == "corrigir":
+            dias = corrigir(url, tabela, status_fin)
+            print(f"{nome}: sem estado, rode rebuild" if dias is None
+                  else f"{nome}: {len(dias)} dia(s) corrigido(s)")
+        else:
+            diferencas = verificar(url, tabela, status_fin)
+            for d in diferencas[:50]:
+                print(f"{nome}:", *d)
+            print(f"{nome}: {len(diferencas)} divergência(s)")
+            falhou |= bool(diferencas)
+        print(f"{nome}: {time.monotonic() - t0:.1f}s")
+    return 1 if falhou else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,247 @@
+"""
+Índices das tabelas de chamados e verificação dos planos das consultas do painel.
+
+Cada predicado de _apply_filters tem um índice que o atende: expressão para
+LOWER(status), parciais para sla 'fora' e mudou_tipo, compostos com id DESC para
+as igualdades (a página do painel é ORDER BY id DESC LIMIT).
+
+mudou_tipo é uma coluna gerada (STORED) a partir de log_edicoes e
+historico_reaberturas: o Postgres a mantém em todo INSERT/UPDATE e o ALTER que
+a cria já preenche as linhas existentes. Ninguém precisa mais ler os textos.
+Do mesmo jeito, busca (tsvector dos dois textos, dicionário DICIONARIO_BUSCA)
+atende o filtro de texto livre do painel por um índice GIN.
+
+    python -m utils.schema aplicar   [comercial|financeiro]
+    python -m utils.schema verificar [comercial|financeiro]
+
+"verificar" roda EXPLAIN da página e das métricas para cada combinação de
+filtros que o painel gera e lista as varreduras sequenciais com filtro em
+tabelas com mais de SCHEMA_LIMITE_LINHAS linhas (saída 1 se houver alguma).
+Seq Scan sem filtro – ler a tabela inteira de propósito – não conta.
+"""
+import os, sys, time, itertools
+from datetime import timedelta
+
+import psycopg2
+
+from utils.db_pool import conexao
+
+_LIMITE_LINHAS = int(os.getenv("SCHEMA_LIMITE_LINHAS", "10000"))
+DICIONARIO_BUSCA = "portuguese"   # o mesmo na coluna e no websearch_to_tsquery das consultas
+
+# coluna derivada → (tipo, expressão). As consultas usam a expressão no lugar da
+# coluna enquanto "aplicar" não rodou na base (utils.chamados_sql).
+DERIVADAS = {
+    "mudou_tipo": ("boolean",
+                   "COALESCE(log_edicoes, '') <> '' OR COALESCE(historico_reaberturas, '') <> ''"),
+    "busca":      ("tsvector",
+                   f"setweight(to_tsvector('{DICIONARIO_BUSCA}'::regconfig, COALESCE(log_edicoes, '')), 'A') || "
+                   f"setweight(to_tsvector('{DICIONARIO_BUSCA}'::regconfig, "
+                   "COALESCE(historico_reaberturas, '')), 'B')"),
+}
+
+# data_captura é texto gravado pelo bot. A conversão não pode abortar a consulta inteira
+# por um valor malformado (vira NULL) e horário sem fuso é UTC, não o TimeZone da sessão.
+# O bloco EXCEPTION abre uma subtransação por linha: a função não é PARALLEL SAFE.
+FUNCOES = {
+    "data_captura_ts(text)": r"""
+        CREATE OR REPLACE FUNCTION data_captura_ts(valor text) RETURNS timestamptz
+        LANGUAGE plpgsql IMMUTABLE SET TimeZone = 'UTC' AS $$
+        BEGIN
+            RETURN valor::timestamptz;
+        EXCEPTION WHEN others THEN
+            RETURN NULL;
+        END $$""",
+}
+CAPTURA = "data_captura_ts(data_captura::text)"   # instante da captura nas agregações
+
+def garantir_funcoes(cur) -> list:
+    """Cria as funções de FUNCOES que faltam no schema atual. Retorna as criadas."""
+    criadas = []
+    for assinatura, ddl in FUNCOES.items():
+        cur.execute("SELECT to_regprocedure(%s)", [assinatura])
+        if cur.fetchone()[0]:
+            continue
+        cur.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", [assinatura])   # workers juntos
+        cur.execute("SELECT to_regprocedure(%s)", [assinatura])
+        if not cur.fetchone()[0]:
+            cur.execute(ddl)
+            criadas.append(assinatura)
+    return criadas
+
+def colunas(tabela: str) -> list:
+    """(nome, definição) das colunas derivadas."""
+    return [(nome, f"{tipo} GENERATED ALWAYS AS ({expr}) STORED")
+            for nome, (tipo, expr) in DERIVADAS.items()]
+
+def indices(tabela: str) -> list:
+    """(nome, definição) dos índices que os filtros do painel precisam."""
+    return [
+        (f"{tabela}_status_idx",      "(LOWER(status), id DESC)"),
+        (f"{tabela}_abertura_idx",    "(data_abertura)"),
+        (f"{tabela}_fechamento_idx",  "(data_fechamento)"),   # marca d'água dos rollups
+        # ordem do painel geral: abertura desc, sem data por último
+        (f"{tabela}_abertura_ordem_idx", "(COALESCE(data_abertura, '-infinity') DESC, id DESC)"),
+        (f"{tabela}_responsavel_idx", "(responsavel, id DESC)"),
+        (f"{tabela}_capturado_idx",   "(capturado_por, id DESC)"),
+        (f"{tabela}_tipo_idx",        "(tipo_ticket, id DESC)"),
+        (f"{tabela}_sla_fora_idx",    "(id DESC) WHERE sla_status = 'fora'"),
+        (f"{tabela}_mudou_tipo_flag_idx", "(id DESC) WHERE mudou_tipo"),
+        (f"{tabela}_busca_idx",       "USING gin (busca)"),
+        (f"{tabela}_solicitante_idx", "(solicitante)"),   # busca pelo nome do solicitante
+    ]
+
+def obsoletos(tabela: str) -> list:
+    """Índices de versões anteriores que nenhuma consulta usa mais."""
+    return [f"{tabela}_mudou_tipo_idx"]   # predicado antigo sobre os textos
+
+# ── Aplicação ───────────────────────────────────────────────────
+def _indice_valido(cur, nome: str):
+    """True/False conforme pg_index.indisvalid, None se o índice não existe."""
+    cur.execute("""SELECT i.indisvalid FROM pg_index i
+                   WHERE i.indexrelid = to_regclass(%s)""", [nome])
+    r = cur.fetchone()
+    return r[0] if r else None
+
+def aplicar(url: str, tabela: str) -> list:
+    """Cria colunas e índices que faltam, recria os inválidos e remove os obsoletos.
+    Retorna o que mudou.
+
+    Índices vão com CONCURRENTLY (sem travar escrita); a coluna gerada reescreve a
+    tabela uma vez, sob lock exclusivo – rode fora do horário de pico.
+    """
+    conn = psycopg2.connect(url)
+    conn.autocommit = True   # CREATE INDEX CONCURRENTLY não roda em transação
+    alteracoes = []
+    try:
+        with conn.cursor() as cur:
+            for assinatura, ddl in FUNCOES.items():   # sempre: leva mudanças da definição
+                cur.execute(ddl)
+            # Sobra de um CONCURRENTLY que falhou: o planner não usa, mas toda escrita (e a
+            # reescrita da coluna gerada) ainda o mantém. Sai antes de tudo e é recriado abaixo.
+            for nome, _ in indices(tabela):
+                if _indice_valido(cur, nome) is False:
+                    cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {nome}")
+                    alteracoes.append(f"-{nome} (inválido)")
+            for nome, definicao in colunas(tabela):
+                cur.execute("""SELECT 1 FROM information_schema.columns
+                               WHERE table_schema = current_schema() AND table_name = %s
+                                 AND column_name = %s""", [tabela, nome])
+                if cur.fetchone():
+                    continue
+                cur.execute(f"ALTER TABLE {tabela} ADD COLUMN {nome} {definicao}")
+                alteracoes.append(f"{tabela}.{nome}")
+            for nome in obsoletos(tabela):
+                cur.execute("SELECT to_regclass(%s)", [nome])
+                if cur.fetchone()[0]:
+                    cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {nome}")
+                    alteracoes.append(f"-{nome}")
+            for nome, definicao in indices(tabela):
+                if _indice_valido(cur, nome) is not None:
+                    continue
+                cur.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {nome} ON {tabela} {definicao}")
+                alteracoes.append(nome)
+            if alteracoes:
+                cur.execute(f"ANALYZE {tabela}")
+    finally:
+        conn.close()
+    return alteracoes
+
+# ── Verificação dos planos ──────────────────────────────────────
+def _amostras(url: str, tabela: str) -> dict:
+    """Valores reais mais frequentes de cada filtro, para o planner estimar como em produção."""
+    amostras = {}
+    with conexao(url) as conn, conn.cursor() as cur:
+        for filtro, coluna in (("resp", "responsavel"), ("capturado", "capturado_por"),
+                               ("tipo_ticket", "tipo_ticket"), ("status", "LOWER(status)")):
+            cur.execute(f"""SELECT {coluna} FROM {tabela} WHERE {coluna} IS NOT NULL
+                            GROUP BY 1 ORDER BY COUNT(*) DESC LIMIT 1""")
+            r = cur.fetchone()
+            amostras[filtro] = r[0] if r else "x"
+        # palavra mais comum numa amostra: o pior caso da busca
+        cur.execute(f"""SELECT word FROM ts_stat('SELECT busca FROM {tabela} WHERE length(busca) > 0 LIMIT 1000')
+                        ORDER BY ndoc DESC LIMIT 1""")
+        r = cur.fetchone()
+        amostras["busca"] = r[0] if r else "x"
+        cur.execute(f"SELECT MAX(data_abertura) FROM {tabela}")
+        fim = cur.fetchone()[0]
+    if fim is not None:
+        amostras["periodo"] = (fim - timedelta(days=30), fim)
+    return amostras
+
+def combinacoes(amostras: dict):
+    """Todas as combinações de filtros que o formulário do painel consegue gerar."""
+    simples = [("status", amostras.get("status")), ("resp", amostras.get("resp")),
+               ("capturado", amostras.get("capturado")), ("sla", "fora"),
+               ("tipo_ticket", amostras.get("tipo_ticket")), ("busca", amostras.get("busca"))]
+    periodo = amostras.get("periodo")
+    for marcados in itertools.product((False, True), repeat=len(simples) + 1):
+        base = {k: v for (k, v), m in zip(simples, marcados) if m}
+        if marcados[-1]:
+            if periodo is None:
+                continue
+            base["d_ini"], base["d_fim"] = periodo
+        for mudou in (None, "sim", "nao"):
+            yield dict(base, mudou_tipo=mudou) if mudou else base
+
+def _seq_scans(plano: dict, tabela: str):
+    if plano.get("Node Type") == "Seq Scan" and plano.get("Relation Name") == tabela \
+            and plano.get("Filter"):
+        yield plano
+    for filho in plano.get("Plans", []):
+        yield from _seq_scans(filho, tabela)
+
+def verificar(url: str, tabela: str, db, por_pagina: int = 20) -> list:
+    """[(consulta, filtros, linhas estimadas, filtro)] de cada Seq Scan com filtro."""
+    with conexao(url) as conn, conn.cursor() as cur:
+        cur.execute("SELECT reltuples FROM pg_class WHERE oid = %s::regclass", [tabela])
+        if cur.fetchone()[0] < _LIMITE_LINHAS:
+            return []
+    achados = []
+    with conexao(url) as conn, conn.cursor() as cur:
+        for filtros in combinacoes(_amostras(url, tabela)):
+            pagina = db._sql_chamados(limit=por_pagina + 1, projecao="painel", **filtros)
+            for consulta, (q, pr) in (("pagina", pagina), ("metricas", db._sql_metricas(**filtros))):
+                cur.execute("EXPLAIN (FORMAT JSON) " + q, pr)
+                plano = cur.fetchone()[0][0]["Plan"]
+                for no in _seq_scans(plano, tabela):
+                    achados.append((consulta, filtros, no.get("Plan Rows"), no["Filter"]))
+    return achados
+
+# ── CLI ─────────────────────────────────────────────────────────
+def _bases() -> dict:
+    from utils import db_helpers, db_financeiro
+    return {
+        "comercial":  (db_helpers._URL, "ordens_servico", db_helpers),
+        "financeiro": (db_financeiro._URL, "ordens_servico_financeiro", db_financeiro),
+    }
+
+def _rotulo(filtros: dict) -> str:
+    return ", ".join(f"{k}={'…' if k in ('d_ini', 'd_fim') else v}"
+                     for k, v in filtros.items()) or "(sem filtros)"
+
+def main(argv=None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] not in ("aplicar", "verificar"):
+        print(__doc__)
+        return 2
+    comando, nomes = argv[0], argv[1:]
+    bases = _bases()
+    falhou = False
+    for nome in nomes or list(bases):
+        url, tabela, db = bases[nome]
+        t0 = time.monotonic()
+        if comando == "aplicar":
+            alteracoes = aplicar(url, tabela)
+            print(f"{nome}: {len(alteracoes)} alteração(ões)", *alteracoes)
+        else:
+            achados = verificar(url, tabela, db)
+            for consulta, filtros, linhas, filtro in achados:
+                print(f"{nome}: Seq Scan em {consulta} [{_rotulo(filtros)}] ~{linhas} linhas – {filtro}")
+            print(f"{nome}: {len(achados)} varredura(s) sequencial(is)")
+            falhou |= bool(achados)
+        print(f"{nome}: {time.monotonic() - t0:.1f}s")
+    return 1 if falhou else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,14 +1,40 @@
-import os, re
+import os, re, time, asyncio, threading, functools, unicodedata
+import datetime as dt, pytz
+from collections import OrderedDict
 from slack_sdk import WebClient
 from slack_sdk.errors import SlackApiError
 
+from utils.instrumentacao import medir
+from utils.cache_compartilhado import cache_compartilhado
+
 # Tokens de ambos os bots
 SLACK_BOT_TOKEN_COMERCIAL = os.getenv("SLACK_BOT_TOKEN", "")
 SLACK_BOT_TOKEN_FINANCEIRO = os.getenv("SLACK_BOT_TOKEN_FINANCEIRO", "")
 
+# API do Slack (troca por um stub local nos benchmarks: bench/slack_stub.py)
+SLACK_API_URL = os.getenv("SLACK_API_URL", WebClient.BASE_URL)
+
+# Toda chamada à API passa por api_call: mede tempo e contagem por requisição
+class _WebClientMedido(WebClient):
+    def api_call(self, api_method, **kwargs):
+        with medir("slack"):
+            return super().api_call(api_method, **kwargs)
+
+@functools.lru_cache(maxsize=None)
+def _classe_async():
+    # importada no primeiro uso: aiohttp pesa na partida e só /thread precisa dele
+    from slack_sdk.web.async_client import AsyncWebClient
+
+    class _AsyncWebClientMedido(AsyncWebClient):
+        async def api_call(self, api_method, **kwargs):
+            with medir("slack"):
+                return await super().api_call(api_method, **kwargs)
+
+    return _AsyncWebClientMedido
+
 # Clientes separados
-slack_client_comercial = WebClient(token=SLACK_BOT_TOKEN_COMERCIAL)
-slack_client_financeiro = WebClient(token=SLACK_BOT_TOKEN_FINANCEIRO)
+slack_client_comercial = _WebClientMedido(token=SLACK_BOT_TOKEN_COMERCIAL, base_url=SLACK_API_URL)
+slack_client_financeiro = _WebClientMedido(token=SLACK_BOT_TOKEN_FINANCEIRO, base_url=SLACK_API_URL)
 
 # ────── Grupos nomeados manualmente ──────
 GRUPO_MAP = {
@@ -44,60 +70,389 @@ def get_slack_client(canal_id: str = None) -> WebClient:
         return slack_client_financeiro
     return slack_client_comercial
 
+# ────── Cache de diretório (nomes de usuários) ──────
+_CACHE_TTL     = int(os.getenv("SLACK_CACHE_TTL", "21600"))   # 6h
+_CACHE_NEG_TTL = int(os.getenv("SLACK_CACHE_NEG_TTL", "600"))  # IDs desconhecidos
+_CACHE_MAX     = int(os.getenv("SLACK_CACHE_MAX", "5000"))
+_CACHE_L1_TTL  = int(os.getenv("SLACK_CACHE_L1_TTL", "60"))      # cópia local na frente do compartilhado
+_ESPERA_LISTA  = 30.0   # s esperando o users.list de outro worker
+_USUARIO_INEXISTENTE = {"user_not_found", "user_not_visible"}   # só esses vão ao cache negativo
+
+class _CacheLRU:
+    """LRU com TTL; ausências (valor None) também são guardadas, por menos tempo."""
+
+    def __init__(self, maxsize: int, ttl: int, ttl_neg: int):
+        self.maxsize, self.ttl, self.ttl_neg = maxsize, ttl, ttl_neg
+        self._d = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, chave):
+        """Retorna (achou, valor)."""
+        with self._lock:
+            item = self._d.get(chave)
+            if item is None:
+                return False, None
+            valor, expira = item
+            if expira < time.monotonic():
+                del self._d[chave]
+                return False, None
+            self._d.move_to_end(chave)
+            return True, valor
+
+    def set(self, chave, valor):
+        ttl = self.ttl if valor is not None else self.ttl_neg
+        with self._lock:
+            self._d[chave] = (valor, time.monotonic() + ttl)
+            self._d.move_to_end(chave)
+            while len(self._d) > self.maxsize:
+                self._d.popitem(last=False)
+
+def _nome_usuario(u: dict):
+    nome = (
+        u.get("real_name") or
+        u.get("profile", {}).get("real_name_normalized") or
+        u.get("name")
+    )
+    return nome if nome and not nome.startswith("U") else None  # Evita ID cru
+
+def _normalizar(texto: str) -> str:  # sem acento nem caixa, para comparar nomes
+    decomposto = unicodedata.normalize("NFKD", texto)
+    return "".join(c for c in decomposto if not unicodedata.combining(c)).lower()
+
+class _DiretorioUsuarios:
+    """Nomes de usuários de um bot: users.list em lote + users.info só para o que faltar.
+
+    Os nomes ficam no cache compartilhado entre os workers (um users.list por nó, não
+    por processo), com uma cópia local de vida curta na frente (SLACK_CACHE_L1_TTL).
+    """
+
+    def __init__(self, client: WebClient, bot: str):
+        self.client = client
+        self.bot = bot
+        self._ns = f"slack_nomes:{bot}"
+        self.cache = _CacheLRU(_CACHE_MAX, _CACHE_L1_TTL, _CACHE_L1_TTL)
+        self._lock = threading.Lock()
+        self._carregado_em = None   # monotonic da última vez que este processo viu a lista carregada
+        self._indice = None         # [(uid, palavras do nome normalizadas)] para buscar()
+        self._indice_em = 0.0
+
+    def _listar(self) -> int:
+        n, cursor, nomes = 0, None, {}
+        try:
+            while True:
+                resp = self.client.users_list(limit=500, cursor=cursor)
+                for u in resp.get("members", []):
+                    nomes[u["id"]] = _nome_usuario(u)
+                    self.cache.set(u["id"], nomes[u["id"]])
+                    n += 1
+                cursor = (resp.get("response_metadata") or {}).get("next_cursor")
+                if not cursor:
+                    break
+        except (SlackApiError, OSError) as e:
+            print("Slack API (users.list):",
+                  e.response["error"] if isinstance(e, SlackApiError) else e)
+            # tenta de novo depois do TTL negativo, não do TTL cheio
+            cache_compartilhado.set("slack_lista", self.bot, False, _CACHE_NEG_TTL)
+            return n
+        finally:
+            cache_compartilhado.set_muitos(self._ns, nomes, _CACHE_TTL)
+        cache_compartilhado.set("slack_lista", self.bot, True, _CACHE_TTL)
+        return n
+
+    def prefetch(self, forcar: bool = False) -> int:
+        """Carrega o diretório inteiro (paginado). Não repete antes do TTL – em nenhum worker."""
+        with self._lock:
+            agora = time.monotonic()
+            if not forcar and self._carregado_em is not None \
+                    and agora - self._carregado_em < _CACHE_L1_TTL:
+                return 0
+            if not forcar and cache_compartilhado.get("slack_lista", self.bot)[0]:
+                self._carregado_em = agora
+                return 0
+            trava = f"slack_lista:{self.bot}"
+            if not cache_compartilhado.travar(trava, _ESPERA_LISTA):
+                # outro worker está listando: espera ele gravar em vez de repetir
+                limite = time.monotonic() + _ESPERA_LISTA
+                while time.monotonic() < limite:
+                    time.sleep(0.1)
+                    if cache_compartilhado.get("slack_lista", self.bot)[0]:
+                        break
+                self._carregado_em = agora
+                return 0
+            try:
+                self._carregado_em = agora
+                return self._listar()
+            finally:
+                cache_compartilhado.liberar(trava)
+
+    def _do_cache(self, uids, res: dict) -> list:
+        """Preenche res com o que estiver na cópia local ou no compartilhado; devolve o resto."""
+        faltando = []
+        for uid in uids:
+            achou, nome = self.cache.get(uid)
+            if achou:
+                res[uid] = nome
+            else:
+                faltando.append(uid)
+        if faltando:
+            for uid, nome in cache_compartilhado.get_muitos(self._ns, faltando).items():
+                self.cache.set(uid, nome)
+                res[uid] = nome
+            faltando = [u for u in faltando if u not in res]
+        return faltando
+
+    def nomes(self, uids) -> dict:
+        """UID → nome (ou None) para todos os UIDs, sem repetir consultas."""
+        res = {}
+        faltando = self._do_cache(set(uids), res)
+
+        # confere o cache de novo mesmo se prefetch() não carregou nada: pode ter
+        # sido outra thread (ou worker), que carregou enquanto esta esperava
+        if faltando:
+            self.prefetch()
+            faltando = self._do_cache(faltando, res)
+
+        # quem não veio no users.list (novo, bot, removido…) vai um a um
+        novos = {}
+        for uid in faltando:
+            nome = None
+            try:
+                nome = _nome_usuario(self.client.users_info(user=uid).get("user", {}))
+            except SlackApiError as e:
+                if e.response["error"] not in _USUARIO_INEXISTENTE:
+                    # ratelimited, internal_error…: sem nome agora, sem guardar o negativo
+                    print("Slack API (users.info):", e.response["error"])
+                    res.update((u, None) for u in faltando if u not in res)
+                    break
+            except OSError as e:  # rede fora: não insiste um a um nem guarda o negativo
+                print("Slack API (users.info):", e)
+                res.update((u, None) for u in faltando if u not in res)
+                break
+            self.cache.set(uid, nome)
+            novos[uid] = res[uid] = nome
+        cache_compartilhado.set_muitos(self._ns, {u: n for u, n in novos.items() if n},
+                                       _CACHE_TTL)
+        cache_compartilhado.set_muitos(self._ns, {u: n for u, n in novos.items() if not n},
+                                       _CACHE_NEG_TTL)
+        return res
+
+    def buscar(self, texto: str) -> list:
+        """UIDs cujo nome tem, para cada palavra de texto, uma palavra que começa com ela."""
+        termos = _normalizar(texto).split()
+        if not termos:
+            return []
+        if self._indice is None or time.monotonic() - self._indice_em > _CACHE_L1_TTL:
+            self.prefetch()
+            nomes = cache_compartilhado.itens(self._ns)
+            self._indice = [(uid, _normalizar(nome).split()) for uid, nome in nomes.items() if nome]
+            self._indice_em = time.monotonic()
+        return sorted(uid for uid, palavras in self._indice
+                      if all(any(p.startswith(t) for p in palavras) for t in termos))
+
+_diretorio_comercial = _DiretorioUsuarios(slack_client_comercial, "comercial")
+_diretorio_financeiro = _DiretorioUsuarios(slack_client_financeiro, "financeiro")
+
+def get_diretorio(canal_id: str = None) -> _DiretorioUsuarios:
+    if get_slack_client(canal_id) is slack_client_financeiro:
+        return _diretorio_financeiro
+    return _diretorio_comercial
+
+# ────── Índice de grupos (usergroups.list) ──────
+_GRUPOS_REFRESH = int(os.getenv("SLACK_GRUPOS_REFRESH", "900"))   # 15 min
+
+class _IndiceGrupos:
+    """ID → nome dos grupos de um bot: carregado uma vez e renovado em segundo plano.
+
+    A lista fica no cache compartilhado: o worker que chega depois usa a do primeiro.
+    """
+
+    def __init__(self, client: WebClient, bot: str):
+        self.client = client
+        self.bot = bot
+        self._grupos = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def carregar(self) -> bool:
+        achou, grupos = cache_compartilhado.get("slack_grupos", self.bot)
+        if achou:
+            self._grupos = grupos
+            return True
+        try:
+            resp = self.client.usergroups_list().get("usergroups", [])
+        except (SlackApiError, OSError) as e:
+            print("Slack API (usergroups.list):",
+                  e.response["error"] if isinstance(e, SlackApiError) else e)
+            return False
+        self._grupos = {g["id"]: g.get("name") for g in resp}  # troca atômica
+        # vence um pouco antes da próxima renovação, para ela buscar de novo
+        cache_compartilhado.set("slack_grupos", self.bot, self._grupos, _GRUPOS_REFRESH * 0.9)
+        return True
+
+    def _renovar(self):
+        while True:
+            time.sleep(_GRUPOS_REFRESH)
+            self.carregar()
+
+    def iniciar(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self.carregar()
+            self._thread = threading.Thread(target=self._renovar, daemon=True,
+                                            name="slack-grupos")
+            self._thread.start()
+
+    def nome(self, group_id: str) -> str:
+        if self._thread is None:
+            self.iniciar()
+        return self._grupos.get(group_id) or GRUPO_MAP.get(group_id, f"<grupo:{group_id}>")
+
+_grupos_comercial = _IndiceGrupos(slack_client_comercial, "comercial")
+_grupos_financeiro = _IndiceGrupos(slack_client_financeiro, "financeiro")
+
+def get_indice_grupos(canal_id: str = None) -> _IndiceGrupos:
+    if get_slack_client(canal_id) is slack_client_financeiro:
+        return _grupos_financeiro
+    return _grupos_comercial
+
 # ────── Buscar nome real do usuário ──────
 def get_real_name(user_id: str, canal_id: str = None) -> str:
     if not user_id or not isinstance(user_id, str):
         return "<não capturado>"
 
-    client = get_slack_client(canal_id)
-
     # Grupos (começam com “S”)
     if user_id.startswith("S"):
-        try:
-            grupos = client.usergroups_list().get("usergroups", [])
-            for g in grupos:
-                if g["id"] == user_id:
-                    return g.get("name", GRUPO_MAP.get(user_id, f"<grupo:{user_id}>"))
-        except SlackApiError:
-            pass
-        return GRUPO_MAP.get(user_id, f"<grupo:{user_id}>")
+        return get_indice_grupos(canal_id).nome(user_id)
 
     # Usuário comum
-    try:
-        user_info = client.users_info(user=user_id).get("user", {})
-        nome = (
-            user_info.get("real_name") or
-            user_info.get("profile", {}).get("real_name_normalized") or
-            user_info.get("name")
-        )
-        if nome and not nome.startswith("U"):  # Evita ID cru
-            return nome
-    except SlackApiError:
-        pass
-
-    return "<não capturado>"
+    return get_diretorio(canal_id).nomes([user_id]).get(user_id) or "<não capturado>"
+
+def get_real_names(user_ids, canal_id: str = None) -> dict:
+    """Versão em lote de get_real_name: deduplica os IDs e resolve tudo de uma vez."""
+    ids = {u for u in user_ids if u and isinstance(u, str)}
+    grupos = get_indice_grupos(canal_id)
+    res = {g: grupos.nome(g) for g in ids if g.startswith("S")}
+    usuarios = [u for u in ids if not u.startswith("S")]
+    for uid, nome in get_diretorio(canal_id).nomes(usuarios).items():
+        res[uid] = nome or "<não capturado>"
+    return res
+
+def buscar_usuarios(texto: str, canal_id: str = None) -> list:
+    """UIDs dos usuários cujo nome casa com as palavras de texto (busca do painel)."""
+    return get_diretorio(canal_id).buscar(texto)
 
 # ────── Formatar mensagens Slack para exibição ──────
-def formatar_texto_slack(texto: str, canal_id: str = None) -> str:
+# emoji, <@U123> e <!subteam^S123> numa única alternação: o texto é varrido uma vez
+_RE_TOKENS = re.compile("|".join(map(re.escape, EMOJI_MAP))
+                        + r"|<@([A-Z0-9]+)>|<!subteam\^([A-Z0-9]+)>")
+
+def formatar_texto_slack(texto: str, canal_id: str = None, nomes: dict = None) -> str:
+    """Troca emojis, menções a usuários e a grupos numa passada só.
+
+    nomes: UID → nome já resolvido (get_real_names); os UIDs que faltarem são
+    resolvidos juntos, numa única chamada, depois da varredura.
+    """
     if not texto:
         return ""
 
-    # Emojis :emoji: → unicode
-    for e, uni in EMOJI_MAP.items():
-        texto = texto.replace(e, uni)
+    partes, mencoes, grupos, pos = [], [], None, 0
+    for m in _RE_TOKENS.finditer(texto):
+        partes.append(texto[pos:m.start()])
+        uid, sid = m.group(1), m.group(2)
+        if uid:
+            mencoes.append(len(partes))
+            partes.append(uid)
+        elif sid:
+            grupos = grupos or get_indice_grupos(canal_id)
+            partes.append(grupos.nome(sid))
+        else:
+            partes.append(EMOJI_MAP[m.group(0)])
+        pos = m.end()
+    if not partes:
+        return texto
+    partes.append(texto[pos:])
 
-    # Substitui usuários <@U123>
-    texto = re.sub(
-        r"<@([A-Z0-9]+)>",
-        lambda m: get_real_name(m.group(1), canal_id),
-        texto,
-    )
+    if mencoes:
+        nomes = nomes or {}
+        faltando = {partes[i] for i in mencoes} - nomes.keys()
+        if faltando:
+            nomes = {**nomes, **get_real_names(faltando, canal_id)}
+        for i in mencoes:
+            partes[i] = nomes.get(partes[i]) or "<não capturado>"
+    return "".join(partes)
 
-    # Substitui grupos <!subteam^SID>
-    texto = re.sub(
-        r"<!subteam\^([A-Z0-9]+)>",
-        lambda m: GRUPO_MAP.get(m.group(1), f"<grupo:{m.group(1)}>"),
-        texto,
-    )
+# ────── Threads (conversations.replies assíncrono + cache) ──────
+_THREAD_TTL  = int(os.getenv("SLACK_THREAD_TTL", "60"))
+_THREAD_MAX  = int(os.getenv("SLACK_THREAD_CACHE_MAX", "500"))
+_THREAD_MSGS = int(os.getenv("SLACK_THREAD_MAX_MSGS", "2000"))   # teto por thread
+
+_TZ = pytz.timezone("America/Sao_Paulo")
+_RE_MENCAO = re.compile(r"<@([A-Z0-9]+)>")
+
+_threads = _CacheLRU(_THREAD_MAX, _THREAD_TTL, 0)
+_threads_em_andamento = {}
+_async_clients = {}
+
+def get_async_client(canal_id: str = None) -> "AsyncWebClient":
+    """Mesmo token de get_slack_client, criado no primeiro uso (precisa de aiohttp)."""
+    token = get_slack_client(canal_id).token
+    client = _async_clients.get(token)
+    if client is None:
+        client = _async_clients[token] = _classe_async()(token=token, base_url=SLACK_API_URL)
+    return client
+
+async def _buscar_replies(canal_id: str, thread_ts: str) -> list:
+    client = get_async_client(canal_id)
+    mensagens, cursor = [], None
+    while len(mensagens) < _THREAD_MSGS:
+        resp = await client.conversations_replies(channel=canal_id, ts=thread_ts,
+                                                  limit=200, cursor=cursor)
+        mensagens.extend(resp.get("messages", []))
+        cursor = (resp.get("response_metadata") or {}).get("next_cursor")
+        if not cursor:
+            break
+    return mensagens[:_THREAD_MSGS]
+
+def _renderizar(mensagens: list, canal_id: str) -> list:
+    # autores e menções de todas as mensagens numa única resolução
+    uids = {m.get("user") for m in mensagens}
+    uids.update(u for m in mensagens for u in _RE_MENCAO.findall(m.get("text") or ""))
+    nomes = get_real_names(uids, canal_id)
+    return [{
+        "texto": formatar_texto_slack(m.get("text", ""), canal_id, nomes),
+        "ts": dt.datetime.fromtimestamp(float(m["ts"])).astimezone(_TZ).strftime("%d/%m/%Y %H:%M"),
+        "user": nomes.get(m.get("user")) or "<não capturado>",
+        "orig": i == 0,
+    } for i, m in enumerate(mensagens)]
+
+async def _carregar_thread(canal_id: str, thread_ts: str) -> list:
+    chave = f"{canal_id}:{thread_ts}"
+    achou, res = await asyncio.to_thread(cache_compartilhado.get, "slack_thread", chave)
+    if not achou:                           # nem outro worker abriu esta thread há pouco
+        try:
+            mensagens = await _buscar_replies(canal_id, thread_ts)
+        except Exception as e:
+            print("Slack API (conversations.replies):",
+                  e.response["error"] if isinstance(e, SlackApiError) else e)
+            return []
+        res = await asyncio.to_thread(_renderizar, mensagens, canal_id)
+        await asyncio.to_thread(cache_compartilhado.set, "slack_thread", chave, res, _THREAD_TTL)
+    _threads.set((canal_id, thread_ts), res)
+    return res
+
+async def carregar_thread(canal_id: str, thread_ts: str) -> list:
+    """Mensagens da thread já formatadas para o thread.html, em cache por _THREAD_TTL s.
 
-    return texto
+    Aberturas simultâneas da mesma thread compartilham uma única busca.
+    """
+    chave = (canal_id, thread_ts)
+    achou, res = _threads.get(chave)
+    if achou:
+        return res
+    tarefa = _threads_em_andamento.get(chave)
+    if tarefa is None:
+        tarefa = _threads_em_andamento[chave] = asyncio.ensure_future(
+            _carregar_thread(canal_id, thread_ts))
+        tarefa.add_done_callback(lambda _: _threads_em_andamento.pop(chave, None))
+    return await tarefa